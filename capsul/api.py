@@ -1,5 +1,5 @@
 '''
-The high-level capsul.api module pre-imports the main objects from several sub-modules:
+The high-level capsul.api module gives access to the main objects from several sub-modules:
 
 Classes
 -------
@@ -25,20 +25,54 @@ Functions
 * :func:`~capsul.study_config.process_instance.get_process_instance`
 * :func:`~capsul.utils.finder.find_processes`
 
+Sub-modules are imported when one of their objects is first used, so that
+importing capsul.api is fast (with Python 3.7 and later: older versions
+import everything at once).
 '''
 
-from capsul.process.process import (Process, NipypeProcess, ProcessResult,
-                                    FileCopyProcess, InteractiveProcess)
-from capsul.pipeline.pipeline import Pipeline
-from capsul.pipeline.pipeline_nodes import Plug
-from capsul.pipeline.pipeline_nodes import Node
-from capsul.pipeline.pipeline_nodes import ProcessNode
-from capsul.pipeline.pipeline_nodes import PipelineNode
-from capsul.pipeline.pipeline_nodes import Switch
-from capsul.pipeline.pipeline_nodes import OptionalOutputSwitch
-from capsul.engine import capsul_engine
-from capsul.study_config.process_instance import get_process_instance
-from capsul.study_config.study_config import StudyConfig
-from capsul.utils.finder import find_processes
+import importlib
+import sys
 
+# name -> module defining it
+_api_objects = {
+    'Process': 'capsul.process.process',
+    'NipypeProcess': 'capsul.process.process',
+    'ProcessResult': 'capsul.process.process',
+    'FileCopyProcess': 'capsul.process.process',
+    'InteractiveProcess': 'capsul.process.process',
+    'Pipeline': 'capsul.pipeline.pipeline',
+    'Plug': 'capsul.pipeline.pipeline_nodes',
+    'Node': 'capsul.pipeline.pipeline_nodes',
+    'ProcessNode': 'capsul.pipeline.pipeline_nodes',
+    'PipelineNode': 'capsul.pipeline.pipeline_nodes',
+    'Switch': 'capsul.pipeline.pipeline_nodes',
+    'OptionalOutputSwitch': 'capsul.pipeline.pipeline_nodes',
+    'capsul_engine': 'capsul.engine',
+    'get_process_instance': 'capsul.study_config.process_instance',
+    'StudyConfig': 'capsul.study_config.study_config',
+    'find_processes': 'capsul.utils.finder',
+}
 
+__all__ = sorted(_api_objects)
+
+
+def __getattr__(name):
+    module_name = _api_objects.get(name)
+    if module_name is None:
+        raise AttributeError("module '%s' has no attribute '%s'"
+                             % (__name__, name))
+    value = getattr(importlib.import_module(module_name), name)
+    # later accesses do not go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_api_objects))
+
+
+if sys.version_info[:2] < (3, 7):
+    # no module __getattr__: import everything now
+    for _name in __all__:
+        __getattr__(_name)
+    del _name
@@ -32,12 +32,34 @@ from soma.controller import Controller, controller_to_dict
 from soma.serialization import to_json, from_json
 from soma.sorted_dictionary import SortedDictionary
 
-from .database_json import JSONDBEngine
-from .database_populse import PopulseDBEngine
-
-from .settings import Settings
 from .module import default_modules
 
+# Sub-modules objects which are imported when they are first used: the
+# database engines need populse_db, which is long to import.
+_lazy_objects = {
+    'JSONDBEngine': 'capsul.engine.database_json',
+    'PopulseDBEngine': 'capsul.engine.database_populse',
+    'ExecutionHistory': 'capsul.engine.history',
+    'Settings': 'capsul.engine.settings',
+}
+
+
+def __getattr__(name):
+    module_name = _lazy_objects.get(name)
+    if module_name is None:
+        raise AttributeError("module '%s' has no attribute '%s'"
+                             % (__name__, name))
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+if sys.version_info[:2] < (3, 7):
+    # no module __getattr__: import everything now
+    for _name in _lazy_objects:
+        __getattr__(_name)
+    del _name
+
 class CapsulEngine(Controller):
     '''
     A CapsulEngine is the mandatory entry point of all software using Capsul. It contains objects to store configuration and metadata, define execution environment(s) (possibly remote) and perform pipelines execution.
@@ -132,6 +154,8 @@ class CapsulEngine(Controller):
     @property
     def settings(self):
         if self._settings is None:
+            from .settings import Settings
+
             self._settings = Settings(self.database.db)
         return self._settings
 
@@ -142,6 +166,16 @@ class CapsulEngine(Controller):
     @property
     def database_location(self):
         return self._database_location
+
+    @property
+    def execution_history(self):
+        '''
+        :class:`~capsul.engine.history.ExecutionHistory` object giving access
+        to the history of process executions stored in the database.
+        '''
+        from .history import ExecutionHistory
+
+        return ExecutionHistory(self.database)
         
     
     @property
@@ -256,11 +290,15 @@ class CapsulEngine(Controller):
         process execution and can be used to get the status of the 
         execution or wait for its termination.
         
-        if history is True, an entry of the process execution is stored in
-        the database. The content of this entry is to be defined but it will
-        contain the process parameters (to restart the process) and will be 
-        updated on process termination (for instance to store execution time
-        if possible).
+        This method is not implemented yet, the history parameter is
+        reserved for it. For now, only
+        :meth:`capsul.study_config.study_config.StudyConfig.run` (called
+        with history=True) stores an entry of the process execution in the
+        database. This entry contains the process parameters (to restart
+        the process) and, for each executed node, its start and end times,
+        CPU time, peak memory, exit status and input/output files sizes (see
+        :py:mod:`capsul.engine.history`). It can be queried with
+        self.execution_history.
         '''
         raise NotImplementedError()
 
@@ -420,7 +458,9 @@ def database_factory(database_location):
     '''
     Create a DatabaseEngine from its location string. This location can be
     either a sqlite file path (ending with '.sqlite' or ':memory:' for an 
-    in memory database for testing) or a populse_db URL, or None.
+    in memory database for testing), a populse_db URL, a JSON file path
+    (ending with '.json', stored with
+    :py:class:`capsul.engine.database_json.JournaledJSONDBEngine`) or None.
     '''
     global _populsedb_url_re 
     
@@ -440,10 +480,20 @@ def database_factory(database_location):
         engine_directory = osp.abspath(osp.dirname(database_location))
     elif database_location == ':memory:':
         populse_db = 'sqlite:///:memory:'
+    elif database_location.endswith('.json'):
+        populse_db = None
+        engine_directory = osp.abspath(osp.dirname(database_location))
     else:
         raise ValueError('Invalid database location: %s' % database_location)
     
-    engine = PopulseDBEngine(populse_db)
+    if populse_db is None:
+        from .database_json import JournaledJSONDBEngine
+
+        engine = JournaledJSONDBEngine(database_location)
+    else:
+        from .database_populse import PopulseDBEngine
+
+        engine = PopulseDBEngine(populse_db)
     if engine_directory:
         engine.set_named_directory('capsul_engine', engine_directory)
     return engine
@@ -10,7 +10,9 @@ class DatabaseEngine:
     To instanciate a :py:class:`DatabaseEngine` one must use the factory 
     To date, two concrete :py:class:`DatabaseEngine` implementations exist:
 
-    - :py:class:`capsul.engine.database_json.JSONDBEngine`
+    - :py:class:`capsul.engine.database_json.JSONDBEngine` (and its
+      journaled variant
+      :py:class:`capsul.engine.database_json.JournaledJSONDBEngine`)
     - :py:class:`capsul.engine.database_populse.PopulseDBEngine`
     
     '''
@@ -121,3 +123,26 @@ class DatabaseEngine:
         '''
         raise NotImplementedError()
 
+
+    def set_execution_history(self, execution_id, entry):
+        '''
+        Store the history entry of a process execution (see
+        :py:mod:`capsul.engine.history`). entry is a JSON compatible
+        dictionary. An existing entry with the same execution_id is
+        replaced.
+        '''
+        raise NotImplementedError()
+
+    def execution_history(self, execution_id):
+        '''
+        Return the history entry of a process execution or None if it does
+        not exist.
+        '''
+        raise NotImplementedError()
+
+    def execution_histories(self):
+        '''
+        Iterate over all process execution history entries. This method may
+        return any iterable value (list, generator, etc.)
+        '''
+        raise NotImplementedError()
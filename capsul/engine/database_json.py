@@ -37,17 +37,42 @@ class JSONDBEngine(DatabaseEngine):
         self.read_json()
     
     
+    def set_item(self, keys, value):
+        '''
+        Set a value in self.json_dict. keys is a list of keys giving the
+        path of the value in nested dictionaries. Intermediate dictionaries
+        are created if necessary. All modifications of the database content
+        go through this method or :meth:`del_item`.
+        '''
+        d = self.json_dict
+        for key in keys[:-1]:
+            d = d.setdefault(key, {})
+        d[keys[-1]] = value
+        self.modified = True
+    
+    def del_item(self, keys):
+        '''
+        Remove a value from self.json_dict. keys is a list of keys giving the
+        path of the value in nested dictionaries. Nothing is done if the
+        value does not exist.
+        '''
+        d = self.json_dict
+        for key in keys[:-1]:
+            d = d.get(key)
+            if d is None:
+                return
+        if keys[-1] in d:
+            del d[keys[-1]]
+            self.modified = True
+    
+    
     def set_named_directory(self, name, path):
         if path:
             path = osp.normpath(osp.abspath(path))
-            self.json_dict.setdefault('named_directory', {})[name] = {'name': name,
-                                                                      'path': path}
-            self.modified = True
+            self.set_item(['named_directory', name], {'name': name,
+                                                      'path': path})
         else:
-            named_directory = self.json_dict.get('named_directory')
-            if named_directory is not None:
-                named_directory.pop(name, None)
-                self.modified = True
+            self.del_item(['named_directory', name])
 
     def named_directory(self, name):
         return self.json_dict.get('named_directory', {}).get(name, {}).get('path')
@@ -57,22 +82,177 @@ class JSONDBEngine(DatabaseEngine):
     
         
     def set_json_value(self, name, json_value):
-        self.json_dict.setdefault('json_value', {})[name] = json_value
-        self.modified = True
+        self.set_item(['json_value', name], json_value)
 
     def json_value(self, name):
         return self.json_dict.get('json_value', {}).get(name)
     
     
     def set_path_metadata(self, path, metadata, named_directory=None):
-        metadata = self.check_metadata(path, metadata, named_directory)
-        path = metadata['path']
-        named_directory = metadata['named_directory']
+        doc = self.check_path_metadata(path, metadata, named_directory)
+        path = doc['path']
+        named_directory = doc['named_directory']
         
-        self.json_dict.setdefault('path_metadata', {})[(named_directory, path)] = doc
-        self.modified = True
+        self.set_item(['path_metadata', named_directory, path], doc)
             
 
     def path_metadata(self, path, named_directory=None):
         named_directory, path = self.check_path(path, named_directory)
-        return self.json_dict.get('path_metadata', {}).get((named_directory, path))
+        return self.json_dict.get('path_metadata', {}).get(
+            named_directory, {}).get(path)
+
+
+    def set_execution_history(self, execution_id, entry):
+        self.set_item(['execution_history', execution_id], entry)
+
+    def execution_history(self, execution_id):
+        return self.json_dict.get('execution_history', {}).get(execution_id)
+
+    def execution_histories(self):
+        return self.json_dict.get('execution_history', {}).values()
+
+
+class JournaledJSONDBEngine(JSONDBEngine):
+    '''
+    A crash safe variant of :py:class:`JSONDBEngine` that does not rewrite
+    the whole database on each commit.
+
+    The database is stored in two files: a snapshot (the JSON file whose
+    name is given to the constructor, with the same format as
+    :py:class:`JSONDBEngine`) and an append-only journal (the same file name
+    with the ``.journal`` extension added). Each commit appends the
+    modifications done since the previous commit to the journal, one JSON
+    operation per line, so its cost only depends on the size of the changes.
+    When the database is read, the snapshot is loaded and the journal
+    operations are replayed on top of it.
+
+    When the journal contains more than ``compaction_threshold`` operations,
+    the commit is followed by a compaction: a new snapshot is written in a
+    temporary file that atomically replaces the previous one, then the
+    journal is emptied. An interruption during a commit can therefore only
+    lose the operations of this commit: a partially written journal line
+    is ignored and removed from the journal on reading, and a snapshot
+    being written is never visible until it is complete.
+    '''
+    journal_extension = '.journal'
+    
+    def __init__(self, json_filename, compaction_threshold=1000):
+        self.compaction_threshold = compaction_threshold
+        self._pending_operations = []
+        self._journal_size = 0
+        super(JournaledJSONDBEngine, self).__init__(json_filename)
+    
+    @property
+    def journal_filename(self):
+        if self.json_filename is None:
+            return None
+        return self.json_filename + self.journal_extension
+    
+    def read_json(self):
+        super(JournaledJSONDBEngine, self).read_json()
+        self._pending_operations = []
+        self._journal_size = 0
+        journal = self.journal_filename
+        if journal is not None and osp.exists(journal):
+            offset = 0
+            torn = False
+            with open(journal, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('incomplete line')
+                        operation = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        # Incomplete last line written during a crash: the
+                        # corresponding commit never completed.
+                        torn = True
+                        break
+                    self._apply_operation(operation)
+                    self._journal_size += 1
+                    offset += len(line)
+            if torn:
+                # Remove the partial line, otherwise the next commit would
+                # append its first operation to it.
+                with open(journal, 'r+b') as f:
+                    f.truncate(offset)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.modified = False
+    
+    def _apply_operation(self, operation):
+        action, keys = operation[:2]
+        if action == 'set':
+            super(JournaledJSONDBEngine, self).set_item(keys, operation[2])
+        elif action == 'del':
+            super(JournaledJSONDBEngine, self).del_item(keys)
+        else:
+            raise ValueError('Invalid journal operation: %s' % repr(action))
+    
+    def set_item(self, keys, value):
+        super(JournaledJSONDBEngine, self).set_item(keys, value)
+        self._pending_operations.append(['set', list(keys), value])
+    
+    def del_item(self, keys):
+        super(JournaledJSONDBEngine, self).del_item(keys)
+        self._pending_operations.append(['del', list(keys)])
+    
+    def commit(self):
+        if self.json_filename is None:
+            self._pending_operations = []
+            self.modified = False
+            return
+        if not self.modified and not self._pending_operations:
+            return
+        parent = osp.dirname(self.json_filename)
+        if not osp.exists(parent):
+            os.makedirs(parent)
+        if self._pending_operations:
+            lines = ''.join(json.dumps(operation) + '\n'
+                            for operation in self._pending_operations)
+            with open(self.journal_filename, 'a') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_size += len(self._pending_operations)
+            self._pending_operations = []
+        if (self._journal_size > self.compaction_threshold
+                or not osp.exists(self.json_filename)):
+            self.compact()
+        self.modified = False
+    
+    def compact(self):
+        '''
+        Write a new snapshot containing the whole database content and empty
+        the journal. The snapshot is first written in a temporary file that
+        replaces the previous snapshot only once it is complete. Pending
+        (not committed) modifications are not written.
+        '''
+        if self.json_filename is None:
+            return
+        if self._pending_operations:
+            raise RuntimeError('Cannot compact a database with uncommitted '
+                               'modifications')
+        tmp = '%s.%s.tmp' % (self.json_filename, uuid.uuid4().hex)
+        with open(tmp, 'w') as f:
+            json.dump(self.json_dict, f)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(tmp, self.json_filename)
+        # If a crash happens before the journal is emptied, replaying it on
+        # the new snapshot gives the same result since it only contains
+        # "set" and "del" operations.
+        open(self.journal_filename, 'w').close()
+        self._journal_size = 0
+    
+    def rollback(self):
+        self._pending_operations = []
+        self.read_json()
+
+
+if six.PY3:
+    _replace = os.replace
+else:
+    def _replace(src, dst):
+        if os.name == 'nt' and osp.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
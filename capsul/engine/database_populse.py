@@ -23,6 +23,9 @@ class PopulseDBEngine(DatabaseEngine):
                 dbs.add_field('path_metadata', 'named_directory', 'string', 
                               description='Reference to a base directory whose '
                               'path is stored in named_directory collection')
+            if not dbs.get_collection('execution_history'):
+                dbs.add_collection('execution_history', 'execution_id')
+                dbs.add_field('execution_history', 'entry', 'json')
         self.dbs = self.db.__enter__()
             
     
@@ -81,6 +84,24 @@ class PopulseDBEngine(DatabaseEngine):
         return None
     
     
+    def set_execution_history(self, execution_id, entry):
+        doc = self.dbs.get_document('execution_history', execution_id)
+        if doc is None:
+            self.dbs.add_document('execution_history',
+                                  {'execution_id': execution_id,
+                                   'entry': entry})
+        else:
+            self.dbs.set_value('execution_history', execution_id, 'entry',
+                               entry)
+
+    def execution_history(self, execution_id):
+        return self.dbs.get_value('execution_history', execution_id, 'entry')
+
+    def execution_histories(self):
+        for doc in self.dbs.filter_documents('execution_history', 'all'):
+            yield doc['entry']
+
+
     def set_path_metadata(self, path, metadata, named_directory=None):
         metadata = self.check_metadata(path, metadata, named_directory)
         path = metadata['path']
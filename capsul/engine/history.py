@@ -0,0 +1,463 @@
+'''
+Storage and query of process executions history in a CapsulEngine database.
+
+Each execution of a process or a pipeline can be recorded in the database
+of a :class:`~capsul.engine.CapsulEngine`. An execution entry is a JSON
+compatible dictionary containing the process identifier, its parameters,
+its global start and end time, its final status and a list of node entries.
+A node entry contains, for each executed node, start and end times, CPU
+time, peak resident memory size (RSS) during the node execution, exit
+status and the total size of input and output files. This information can be queried to find the most
+time consuming processes or the distribution of execution times of a given
+process (for capacity planning or scheduling decisions).
+
+Classes
+=======
+:class:`NodeExecutionMonitor`
+-----------------------------
+:class:`ExecutionRecord`
+------------------------
+:class:`ExecutionHistory`
+-------------------------
+'''
+
+from __future__ import print_function
+
+import json
+import os
+import os.path as osp
+import sys
+import threading
+import time
+import uuid
+
+import six
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+def _children_maxrss():
+    '''
+    Return the peak resident memory size (in bytes) of the largest
+    terminated child process of the current process, or None if this
+    information is not available on this system.
+    '''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform != 'darwin':
+        # ru_maxrss is given in kilobytes except on MacOS
+        rss *= 1024
+    return rss
+
+
+try:
+    _page_size = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _page_size = 4096
+
+
+def _process_rss(pid='self'):
+    # current resident memory size of a process from /proc (Linux)
+    try:
+        with open('/proc/%s/statm' % pid) as f:
+            return int(f.read().split()[1]) * _page_size
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def _process_children(pid):
+    # direct children of a process from /proc (Linux)
+    children = []
+    try:
+        tasks = os.listdir('/proc/%s/task' % pid)
+    except OSError:
+        return children
+    for task in tasks:
+        try:
+            with open('/proc/%s/task/%s/children' % (pid, task)) as f:
+                children += f.read().split()
+        except (IOError, OSError):
+            pass
+    return children
+
+
+def _current_rss():
+    '''
+    Return the current resident memory size (in bytes) of the current
+    process and of its running descendant processes, or None if this
+    information is not available on this system. psutil is used if it is
+    installed, otherwise /proc is read (Linux).
+    '''
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            process = psutil.Process()
+            rss = process.memory_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    # terminated in the meantime
+                    pass
+            return rss
+        except psutil.Error:
+            return None
+    rss = _process_rss()
+    if rss is None:
+        return None
+    todo = _process_children(os.getpid())
+    while todo:
+        pid = todo.pop()
+        rss += _process_rss(pid) or 0
+        todo += _process_children(pid)
+    return rss
+
+
+class _RSSSampler(object):
+    '''
+    Record the peak of :func:`_current_rss` while a node runs, sampling it
+    in a thread.
+    '''
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        rss = _current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.sample()
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample()
+        return self.peak
+
+
+def _cpu_time():
+    '''
+    Return the CPU time (user + system) used by the current process and its
+    terminated children.
+    '''
+    t = os.times()
+    return t[0] + t[1] + t[2] + t[3]
+
+
+def _path_size(value):
+    '''
+    Return the size in bytes of existing files referenced in a parameter
+    value (a path or a list of paths).
+    '''
+    if isinstance(value, six.string_types):
+        if osp.isfile(value):
+            return osp.getsize(value)
+        return 0
+    if isinstance(value, (list, tuple)):
+        return sum(_path_size(item) for item in value)
+    return 0
+
+
+def parameters_size(process, output):
+    '''
+    Return the total size in bytes of the existing files used as input
+    (if output is False) or output (if output is True) parameters of a
+    process.
+    '''
+    from soma.controller.trait_utils import is_trait_pathname
+
+    size = 0
+    for name, trait in six.iteritems(process.user_traits()):
+        if bool(trait.output) != bool(output):
+            continue
+        if is_trait_pathname(trait) or (
+                trait.inner_traits
+                and is_trait_pathname(trait.inner_traits[0])):
+            size += _path_size(getattr(process, name, None))
+    return size
+
+
+def json_parameters(process):
+    '''
+    Return a JSON compatible dictionary of process parameters. Undefined
+    values are excluded and values that cannot be converted to JSON are
+    replaced by their repr().
+    '''
+    from traits.api import Undefined
+
+    result = {}
+    for name in process.user_traits():
+        value = getattr(process, name, Undefined)
+        if value is Undefined:
+            continue
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            value = repr(value)
+        result[name] = value
+    return result
+
+
+class NodeExecutionMonitor(object):
+    '''
+    Collect execution metrics of a single node. It is used as a context
+    manager around the execution of a process::
+
+        monitor = NodeExecutionMonitor('node_name', process)
+        with monitor:
+            process()
+        print(monitor.entry)
+
+    If an exception is raised during the execution, the exit status is set
+    to 'failed' and the error message is recorded (the exception is not
+    caught). If a nodes list is given, the node entry is appended to it at
+    the end of the execution.
+
+    The peak resident memory size (peak_rss) of the node is the maximum of
+    the memory used by the current process and its running children,
+    sampled every rss_interval seconds during the execution, and of the
+    peak of child processes which have terminated during the execution, if
+    it is higher than the one of previous children. Memory used before the
+    node by the current process is included. peak_rss is None when it
+    cannot be measured on this system.
+    '''
+
+    rss_interval = 0.1
+
+    def __init__(self, node_name, process, nodes=None):
+        self.node_name = node_name
+        self.process = process
+        self.nodes = nodes
+        self.entry = None
+
+    def __enter__(self):
+        self.entry = {
+            'node_name': self.node_name,
+            'process_id': getattr(self.process, 'id', None),
+            'start_time': time.time(),
+            'input_size': parameters_size(self.process, output=False),
+        }
+        self._cpu_start = _cpu_time()
+        self._children_maxrss = _children_maxrss()
+        self._rss_sampler = _RSSSampler(self.rss_interval)
+        self._rss_sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end_time = time.time()
+        entry = self.entry
+        entry['end_time'] = end_time
+        entry['duration'] = end_time - entry['start_time']
+        entry['cpu_time'] = _cpu_time() - self._cpu_start
+        peak_rss = self._rss_sampler.stop()
+        children_maxrss = _children_maxrss()
+        if children_maxrss is not None \
+                and children_maxrss > self._children_maxrss:
+            # a child which terminated during the node reached a new
+            # high-water mark
+            peak_rss = max(peak_rss or 0, children_maxrss)
+        entry['peak_rss'] = peak_rss
+        entry['output_size'] = parameters_size(self.process, output=True)
+        if exc_type is None:
+            entry['exit_status'] = 'done'
+        else:
+            entry['exit_status'] = 'failed'
+            entry['error'] = '%s: %s' % (exc_type.__name__, exc_value)
+        if self.nodes is not None:
+            self.nodes.append(entry)
+
+
+class ExecutionRecord(object):
+    '''
+    History entry of one execution of a process or pipeline, under
+    construction. Node entries are added with :meth:`monitor`, and the
+    record is stored in the database with :meth:`ExecutionHistory.store`.
+    '''
+
+    def __init__(self, process, execution_id=None):
+        if execution_id is None:
+            execution_id = str(uuid.uuid4())
+        self.entry = {
+            'execution_id': execution_id,
+            'process_id': getattr(process, 'id', None),
+            'parameters': json_parameters(process),
+            'start_time': time.time(),
+            'end_time': None,
+            'status': 'running',
+            'nodes': [],
+        }
+
+    @property
+    def execution_id(self):
+        return self.entry['execution_id']
+
+    def monitor(self, node_name, process):
+        '''
+        Return a :class:`NodeExecutionMonitor` whose node entry is added to
+        this execution record.
+        '''
+        return NodeExecutionMonitor(node_name, process, self.entry['nodes'])
+
+    def finish(self, status='done', error=None):
+        '''
+        Set the final status and end time of the execution.
+        '''
+        self.entry['end_time'] = time.time()
+        self.entry['duration'] = (self.entry['end_time']
+                                  - self.entry['start_time'])
+        self.entry['status'] = status
+        if error is not None:
+            self.entry['error'] = error
+
+
+def _statistics(values):
+    values = sorted(values)
+    count = len(values)
+
+    def percentile(p):
+        # linear interpolation between closest ranks
+        rank = p * (count - 1)
+        low = int(rank)
+        high = min(low + 1, count - 1)
+        return values[low] + (values[high] - values[low]) * (rank - low)
+
+    return {
+        'count': count,
+        'min': values[0],
+        'max': values[-1],
+        'mean': sum(values) / float(count),
+        'median': percentile(0.5),
+        'p90': percentile(0.9),
+    }
+
+
+class ExecutionHistory(object):
+    '''
+    Access to the executions history stored in a
+    :class:`~capsul.engine.database.DatabaseEngine`.
+    '''
+
+    def __init__(self, database):
+        self.database = database
+
+    def new_execution(self, process, execution_id=None):
+        '''
+        Create a new :class:`ExecutionRecord` for the given process. It is
+        not stored in the database until :meth:`store` is called.
+        '''
+        return ExecutionRecord(process, execution_id)
+
+    def store(self, record, commit=True):
+        '''
+        Store an execution record (or entry dictionary) in the database.
+        '''
+        entry = getattr(record, 'entry', record)
+        self.database.set_execution_history(entry['execution_id'], entry)
+        if commit:
+            self.database.commit()
+
+    def execution(self, execution_id):
+        '''
+        Return the history entry of an execution or None if it is unknown.
+        '''
+        return self.database.execution_history(execution_id)
+
+    def executions(self, process_id=None):
+        '''
+        Iterate over history entries, sorted by start time. If process_id
+        is given, only executions of this process are returned.
+        '''
+        entries = [entry for entry in self.database.execution_histories()
+                   if process_id is None
+                   or entry.get('process_id') == process_id]
+        return sorted(entries, key=lambda e: e.get('start_time') or 0)
+
+    def node_runs(self, process_id=None, status='done'):
+        '''
+        Iterate over node entries of all stored executions. If process_id
+        is given, only nodes running this process are returned. If status
+        is not None, only nodes with this exit status are returned.
+        '''
+        for entry in self.executions():
+            for node in entry.get('nodes', []):
+                if process_id is not None \
+                        and node.get('process_id') != process_id:
+                    continue
+                if status is not None and node.get('exit_status') != status:
+                    continue
+                yield node
+
+    def slowest_nodes(self, count=10, process_id=None):
+        '''
+        Return the `count` node entries with the longest duration.
+        '''
+        nodes = sorted(self.node_runs(process_id),
+                       key=lambda n: n.get('duration') or 0, reverse=True)
+        return nodes[:count]
+
+    def duration_distribution(self, process_id=None, field='duration'):
+        '''
+        Return statistics about node executions grouped by process
+        identifier. The result is a dictionary whose keys are process
+        identifiers and values are dictionaries with count, min, max,
+        mean, median and p90 (90th percentile) values of the given node
+        entry field ('duration', 'cpu_time', 'peak_rss', etc.)
+        '''
+        values = {}
+        for node in self.node_runs(process_id):
+            value = node.get(field)
+            if value is not None:
+                values.setdefault(node.get('process_id'), []).append(value)
+        return dict((pid, _statistics(v)) for pid, v in six.iteritems(values))
+
+    def estimated_costs(self, process_id=None):
+        '''
+        Return estimated execution costs of processes, based on previous
+        executions. The result is a dictionary whose keys are process
+        identifiers and values are dictionaries with the following items:
+
+        duration
+            median of node execution durations (in seconds)
+        cpu_time
+            median of node CPU times (in seconds)
+        peak_rss
+            maximum peak memory (in bytes) or None if unknown
+
+        It can be given to
+        :meth:`~capsul.pipeline.pipeline.Pipeline.workflow_ordered_nodes` or
+        :func:`~capsul.pipeline.pipeline_workflow.workflow_from_pipeline` to
+        prioritize the critical path of a pipeline.
+        '''
+        durations = self.duration_distribution(process_id)
+        cpu_times = self.duration_distribution(process_id, 'cpu_time')
+        rss = self.duration_distribution(process_id, 'peak_rss')
+        costs = {}
+        for pid, stats in six.iteritems(durations):
+            costs[pid] = {
+                'duration': stats['median'],
+                'cpu_time': cpu_times.get(pid, {}).get('median'),
+                'peak_rss': rss.get(pid, {}).get('max'),
+            }
+        return costs
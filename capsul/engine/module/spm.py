@@ -25,7 +25,22 @@ def init_settings(capsul_engine):
             dict(name='standalone',
                 type='boolean',
                 description='If this parameter is set to True, use the '
-                            'standalone SPM version, otherwise use Matlab.')
+                            'standalone SPM version, otherwise use Matlab.'),
+            dict(name='persistent_session',
+                type='boolean',
+                description='If this parameter is set to True, SPM batches '
+                            'are run in long-lived SPM (or Matlab) '
+                            'processes (SPM_PERSISTENT_SESSION environment '
+                            'variable), instead of starting SPM for each '
+                            'batch. Each process runs one batch at a time: '
+                            'concurrent batches wait for a free process.'),
+            dict(name='persistent_sessions',
+                type='int',
+                description='Maximum number of long-lived SPM processes '
+                            'started to run concurrent batches when '
+                            'persistent_session is True '
+                            '(SPM_PERSISTENT_SESSIONS environment variable, '
+                            '1 by default).')
             ])
         settings
 
@@ -34,6 +49,19 @@ def config_dependencies(config):
         if not config['standalone']:
             return {'matlab': 'any'}
 
+
+def set_environ(config, environ):
+    '''
+    Set the environment variables of the SPM configuration used by
+    :mod:`capsul.in_context.spm_session`.
+    '''
+    spm_config = config.get('spm', {})
+    if spm_config.get('persistent_session'):
+        environ['SPM_PERSISTENT_SESSION'] = 'yes'
+        if spm_config.get('persistent_sessions'):
+            environ['SPM_PERSISTENT_SESSIONS'] \
+                = str(spm_config['persistent_sessions'])
+
 #def set_environ(config, environ):
     #spm_config = config.get('spm', {})
     #use = spm_config.get('use')
@@ -0,0 +1,84 @@
+'''
+Benchmark of the per-call overhead of FSL commands configured with fsl.sh.
+
+The same command is run many times, either through a shell sourcing fsl.sh
+on each call (as :func:`capsul.in_context.fsl.fsl_command_with_environment`
+does), or directly with the cached FSL environment (as
+:func:`capsul.in_context.fsl.fsl_call` does).
+
+A fake FSL install with a trivial command is used by default; a real one
+may be given::
+
+    python -m capsul.engine.test.benchmark_fsl_environment -n 200
+    python -m capsul.engine.test.benchmark_fsl_environment \\
+        --fsl-config /usr/local/fsl/etc/fslconf/fsl.sh --command fslversion
+'''
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import soma.subprocess
+
+from capsul.in_context import fsl
+from capsul.engine.test.test_fsl_environment import make_fake_fsl
+
+
+def time_calls(ncalls, run):
+    tic = timeit.default_timer()
+    for i in range(ncalls):
+        run()
+    return (timeit.default_timer() - tic) / ncalls
+
+
+def benchmark(fsl_config, command, ncalls):
+    os.environ['FSL_CONFIG'] = fsl_config
+    with open(os.devnull, 'w') as devnull:
+        shell_cmd = fsl.fsl_command_with_environment(command)
+        shell_time = time_calls(
+            ncalls, lambda: soma.subprocess.call(shell_cmd, stdout=devnull))
+        tic = timeit.default_timer()
+        fsl.fsl_environment(fsl_config)
+        resolve_time = timeit.default_timer() - tic
+        cached_time = time_calls(
+            ncalls, lambda: fsl.fsl_call(command, stdout=devnull))
+    print('%d calls of %s' % (ncalls, ' '.join(command)))
+    print('sourcing fsl.sh on each call: %.1f ms per call'
+          % (shell_time * 1000))
+    print('environment resolution (once): %.1f ms' % (resolve_time * 1000))
+    print('cached environment:           %.1f ms per call'
+          % (cached_time * 1000))
+    return shell_time, cached_time
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Measure the per-call overhead of FSL commands')
+    parser.add_argument('-n', '--ncalls', type=int, default=100,
+                        help='number of calls of the command')
+    parser.add_argument('--fsl-config',
+                        help='fsl.sh of a real FSL install (default: a '
+                        'fake FSL install is created)')
+    parser.add_argument('--command', default='fslecho',
+                        help='FSL command to call (default: fslecho, the '
+                        'command of the fake install)')
+    options = parser.parse_args(argv)
+    fsldir = None
+    fsl_config = options.fsl_config
+    if not fsl_config:
+        fsldir = tempfile.mkdtemp(prefix='capsul_fsl_benchmark')
+        fsl_config = make_fake_fsl(fsldir)
+    try:
+        benchmark(fsl_config, options.command.split(), options.ncalls)
+    finally:
+        if fsldir:
+            shutil.rmtree(fsldir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from capsul.engine import database_factory
+from capsul.engine.database_json import JSONDBEngine, JournaledJSONDBEngine
+
+
+class TestJournaledJSONDBEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='capsul_test_db')
+        self.json_file = os.path.join(self.tmp_dir, 'db.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_journal_replay(self):
+        db = JournaledJSONDBEngine(self.json_file)
+        db.set_json_value('a', {'x': 1})
+        db.set_named_directory('data', self.tmp_dir)
+        db.commit()
+        db.set_json_value('b', [1, 2])
+        db.set_named_directory('data', None)
+        db.commit()
+        # The snapshot is only written on the first commit, other commits
+        # are in the journal
+        self.assertEqual(json.load(open(self.json_file)).get('json_value'),
+                         {'a': {'x': 1}})
+        with open(db.journal_filename) as f:
+            self.assertEqual(len(f.readlines()), 2)
+        db2 = JournaledJSONDBEngine(self.json_file)
+        self.assertEqual(db2.json_value('a'), {'x': 1})
+        self.assertEqual(db2.json_value('b'), [1, 2])
+        self.assertEqual(db2.named_directory('data'), None)
+        # The snapshot can still be read by the non journaled engine
+        self.assertEqual(JSONDBEngine(self.json_file).json_value('a'),
+                         {'x': 1})
+
+    def test_rollback(self):
+        db = JournaledJSONDBEngine(self.json_file)
+        db.set_json_value('a', 1)
+        db.commit()
+        db.set_json_value('a', 2)
+        db.rollback()
+        self.assertEqual(db.json_value('a'), 1)
+        db.commit()
+        self.assertEqual(JournaledJSONDBEngine(self.json_file).json_value('a'),
+                         1)
+
+    def test_compaction(self):
+        db = JournaledJSONDBEngine(self.json_file, compaction_threshold=3)
+        for i in range(5):
+            db.set_json_value('v%d' % i, i)
+            db.commit()
+        self.assertTrue(os.path.getsize(db.journal_filename) <
+                        os.path.getsize(self.json_file))
+        db2 = JournaledJSONDBEngine(self.json_file)
+        self.assertEqual([db2.json_value('v%d' % i) for i in range(5)],
+                         list(range(5)))
+
+    def test_truncated_journal(self):
+        db = JournaledJSONDBEngine(self.json_file)
+        db.set_json_value('a', 1)
+        db.commit()
+        db.set_json_value('a', 2)
+        db.commit()
+        # Simulate a crash during the write of a journal line
+        with open(db.journal_filename, 'a') as f:
+            f.write('["set", ["json_value", "a"], ')
+        db2 = JournaledJSONDBEngine(self.json_file)
+        self.assertEqual(db2.json_value('a'), 2)
+
+    def test_commit_after_truncated_journal(self):
+        db = JournaledJSONDBEngine(self.json_file)
+        db.set_json_value('a', 1)
+        db.commit()
+        db.set_json_value('a', 2)
+        db.commit()
+        # crash during the write of a journal line
+        with open(db.journal_filename, 'a') as f:
+            f.write('["set", ["json_value", "a"], 3]')
+        # reopen, commit more operations, then reopen again
+        db2 = JournaledJSONDBEngine(self.json_file)
+        self.assertEqual(db2.json_value('a'), 2)
+        db2.set_json_value('b', 4)
+        db2.set_json_value('c', 5)
+        db2.commit()
+        db3 = JournaledJSONDBEngine(self.json_file)
+        self.assertEqual(db3.json_value('a'), 2)
+        self.assertEqual(db3.json_value('b'), 4)
+        self.assertEqual(db3.json_value('c'), 5)
+
+    def test_database_factory(self):
+        db = database_factory(self.json_file)
+        self.assertTrue(isinstance(db, JournaledJSONDBEngine))
+        self.assertEqual(db.json_filename, self.json_file)
+        self.assertEqual(db.named_directory('capsul_engine'), self.tmp_dir)
+        db.set_json_value('a', 1)
+        db.commit()
+        self.assertEqual(database_factory(self.json_file).json_value('a'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
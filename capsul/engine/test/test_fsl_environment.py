@@ -0,0 +1,123 @@
+from __future__ import print_function
+
+import unittest
+import os
+import os.path as osp
+import shutil
+import stat
+import sys
+import tempfile
+from capsul.in_context import fsl
+
+
+def make_fake_fsl(fsldir):
+    ''' Create a minimal FSL install in fsldir: an fsl.sh script logging
+    each time it is sourced and prepending FSL bin directory to PATH, an
+    "fslecho" command printing FSLOUTPUTTYPE, and an "fslpath" command
+    printing PATH '''
+    conf_dir = osp.join(fsldir, 'etc', 'fslconf')
+    bin_dir = osp.join(fsldir, 'bin')
+    os.makedirs(conf_dir)
+    os.makedirs(bin_dir)
+    fsl_sh = osp.join(conf_dir, 'fsl.sh')
+    with open(fsl_sh, 'w') as f:
+        f.write('echo sourced >> "%s"\n'
+                'FSLOUTPUTTYPE=NIFTI_GZ\n'
+                'PATH="$FSLDIR/bin:$PATH"\n'
+                'export FSLOUTPUTTYPE PATH\n'
+                % osp.join(fsldir, 'sourced.log'))
+    with open(osp.join(conf_dir, 'fsl.csh'), 'w') as f:
+        f.write('echo sourced >> "%s"\n'
+                'setenv FSLOUTPUTTYPE NIFTI_GZ\n'
+                'setenv PATH "$FSLDIR/bin:$PATH"\n'
+                % osp.join(fsldir, 'sourced.log'))
+    for name, script in (('fslecho', 'echo "$FSLOUTPUTTYPE $@"'),
+                         ('fslpath', 'echo "$PATH"')):
+        command = osp.join(bin_dir, name)
+        with open(command, 'w') as f:
+            f.write('#!/bin/sh\n%s\n' % script)
+        os.chmod(command, stat.S_IRWXU)
+    return fsl_sh
+
+
+class TestFSLEnvironment(unittest.TestCase):
+
+    def setUp(self):
+        self.fsldir = tempfile.mkdtemp(prefix='capsul_test_fsl')
+        self.fsl_config = make_fake_fsl(self.fsldir)
+        self.environ = dict((name, os.environ.get(name))
+                            for name in ('FSL_CONFIG', 'FSL_PREFIX',
+                                         'FSLOUTPUTTYPE', 'FSLDIR'))
+        os.environ['FSL_CONFIG'] = self.fsl_config
+        os.environ.pop('FSL_PREFIX', None)
+        os.environ.pop('FSLOUTPUTTYPE', None)
+        os.environ.pop('FSLDIR', None)
+
+    def tearDown(self):
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(self.fsldir)
+
+    def sourced(self):
+        log = osp.join(self.fsldir, 'sourced.log')
+        if not osp.exists(log):
+            return 0
+        return len(open(log).readlines())
+
+    def test_path(self):
+        environment = fsl.fsl_environment(self.fsl_config)
+        bin_dir = osp.join(self.fsldir, 'bin')
+        self.assertEqual(environment['PATH'], [bin_dir])
+        # FSL entries are added to the PATH commands are called with
+        env = dict(os.environ, PATH='/capsul_test_path')
+        output = fsl.fsl_check_output(['fslpath'], env=env)
+        if not isinstance(output, str):
+            output = output.decode()
+        self.assertEqual(output.strip(),
+                         os.pathsep.join([bin_dir, '/capsul_test_path']))
+
+    def test_environment_cache(self):
+        environment = fsl.fsl_environment(self.fsl_config)
+        self.assertEqual(environment.get('FSLOUTPUTTYPE'), 'NIFTI_GZ')
+        self.assertEqual(environment.get('FSLDIR'), self.fsldir)
+        self.assertFalse('SHLVL' in environment)
+        for i in range(3):
+            output = fsl.fsl_check_output(['fslecho', str(i)])
+            if not isinstance(output, str):
+                output = output.decode()
+            self.assertEqual(output.strip(), 'NIFTI_GZ %d' % i)
+        sourced = self.sourced()
+        self.assertTrue(sourced > 0)
+        # a modified configuration is sourced again
+        stat_info = os.stat(self.fsl_config)
+        os.utime(self.fsl_config, (stat_info.st_atime,
+                                   stat_info.st_mtime + 10))
+        fsl.fsl_check_call(['fslecho'])
+        self.assertEqual(self.sourced(), 2 * sourced)
+
+    def test_unchanged_variables(self):
+        # variables the script sets to the value they already have
+        os.environ['FSLOUTPUTTYPE'] = 'NIFTI_GZ'
+        os.environ['FSLDIR'] = self.fsldir
+        environment = fsl.fsl_environment(self.fsl_config)
+        self.assertEqual(environment.get('FSLOUTPUTTYPE'), 'NIFTI_GZ')
+        self.assertEqual(environment.get('FSLDIR'), self.fsldir)
+        self.assertFalse('HOME' in environment)
+        env = fsl.fsl_subprocess_environment(
+            environment, {'FSLOUTPUTTYPE': 'NIFTI'})
+        self.assertEqual(env['FSLOUTPUTTYPE'], 'NIFTI_GZ')
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestFSLEnvironment)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -0,0 +1,96 @@
+from __future__ import print_function
+
+import subprocess
+import sys
+import unittest
+
+from capsul.engine.database_json import JSONDBEngine
+from capsul.engine.history import ExecutionHistory, NodeExecutionMonitor
+from capsul.engine import history
+
+
+def node_entry(node_name, process_id, duration, exit_status='done'):
+    return {'node_name': node_name,
+            'process_id': process_id,
+            'start_time': 0.,
+            'end_time': duration,
+            'duration': duration,
+            'cpu_time': duration / 2.,
+            'peak_rss': 1000,
+            'exit_status': exit_status,
+            'input_size': 0,
+            'output_size': 0}
+
+
+class TestExecutionHistory(unittest.TestCase):
+    def setUp(self):
+        self.history = ExecutionHistory(JSONDBEngine(None))
+        self.history.store({'execution_id': 'e1',
+                            'process_id': 'my.pipeline',
+                            'start_time': 1.,
+                            'status': 'done',
+                            'nodes': [node_entry('a', 'my.proc_a', 10.),
+                                      node_entry('b', 'my.proc_b', 2.)]})
+        self.history.store({'execution_id': 'e2',
+                            'process_id': 'my.pipeline',
+                            'start_time': 2.,
+                            'status': 'failed',
+                            'nodes': [node_entry('a', 'my.proc_a', 20.),
+                                      node_entry('b', 'my.proc_b', 50.,
+                                                 'failed')]})
+
+    def test_executions(self):
+        self.assertEqual([e['execution_id']
+                          for e in self.history.executions()],
+                         ['e1', 'e2'])
+        self.assertEqual(self.history.execution('e2')['status'], 'failed')
+        self.assertEqual(self.history.execution('unknown'), None)
+
+    def test_slowest_nodes(self):
+        slowest = self.history.slowest_nodes(2)
+        self.assertEqual([(n['process_id'], n['duration']) for n in slowest],
+                         [('my.proc_a', 20.), ('my.proc_a', 10.)])
+
+    def test_duration_distribution(self):
+        distribution = self.history.duration_distribution()
+        self.assertEqual(sorted(distribution.keys()),
+                         ['my.proc_a', 'my.proc_b'])
+        self.assertEqual(distribution['my.proc_a']['count'], 2)
+        self.assertEqual(distribution['my.proc_a']['mean'], 15.)
+        self.assertEqual(distribution['my.proc_b']['max'], 2.)
+
+    def test_estimated_costs(self):
+        costs = self.history.estimated_costs()
+        self.assertEqual(costs['my.proc_a']['duration'], 15.)
+        self.assertEqual(costs['my.proc_a']['peak_rss'], 1000)
+        self.assertEqual(costs['my.proc_b']['duration'], 2.)
+
+
+class DummyProcess(object):
+    id = 'my.dummy'
+
+    def user_traits(self):
+        return {}
+
+
+@unittest.skipIf(history._current_rss() is None,
+                 'memory cannot be measured on this system')
+class TestNodeExecutionMonitor(unittest.TestCase):
+    def test_peak_rss_per_node(self):
+        nodes = []
+        # a child process using 200 MB
+        with NodeExecutionMonitor('big', DummyProcess(), nodes):
+            subprocess.check_call(
+                [sys.executable, '-c',
+                 'import time; b = bytearray(200 * 1024 * 1024); '
+                 'time.sleep(0.3)'])
+        with NodeExecutionMonitor('small', DummyProcess(), nodes):
+            pass
+        big, small = nodes
+        self.assertTrue(big['peak_rss'] >= 200 * 1024 * 1024)
+        # the peak of a previous node is not reported
+        self.assertTrue(small['peak_rss'] < 200 * 1024 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+from __future__ import print_function
+
+import unittest
+import os
+import os.path as osp
+import shutil
+import stat
+import sys
+import tempfile
+from capsul.in_context.spm import spm_call_batches, SPMBatchExecutor
+
+
+# stub of the SPM standalone script: it "runs" the batches listed in the
+# script, and fails the ones calling error()
+stub_run_spm = '''#!%s
+import re
+import sys
+log = sys.argv[0] + '.log'
+with open(log, 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\\n')
+script = open(sys.argv[3]).read()
+batches = re.findall(r"fileread\\('(.*)'\\)", script)
+statuses = re.findall(r"fopen\\('(.*)', 'w'\\)", script)
+for batch, status in zip(batches, statuses):
+    with open(status, 'w') as f:
+        if 'error(' in open(batch).read():
+            f.write('1\\nbatch failed')
+        else:
+            f.write('0')
+'''
+
+
+class TestSPMBatches(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_spm')
+        self.run_spm = osp.join(self.tmpdir, 'run_spm12.sh')
+        with open(self.run_spm, 'w') as f:
+            f.write(stub_run_spm % sys.executable)
+        os.chmod(self.run_spm, stat.S_IRWXU)
+        os.makedirs(osp.join(self.tmpdir, 'mcr', 'v713'))
+        self.environ = dict((name, os.environ.get(name))
+                            for name in ('SPM_DIRECTORY', 'SPM_VERSION',
+                                         'SPM_STANDALONE'))
+        os.environ.update({'SPM_DIRECTORY': self.tmpdir,
+                           'SPM_VERSION': '12',
+                           'SPM_STANDALONE': 'yes'})
+        self.batches = []
+        for i in range(5):
+            batch = osp.join(self.tmpdir, 'batch_%d.m' % i)
+            with open(batch, 'w') as f:
+                if i == 2:
+                    f.write("error('failure');\n")
+                else:
+                    f.write("matlabbatch{1}.spm.util.disp.data = {};\n")
+            self.batches.append(batch)
+
+    def tearDown(self):
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(self.tmpdir)
+
+    def spm_sessions(self):
+        log = self.run_spm + '.log'
+        if not osp.exists(log):
+            return 0
+        return len(open(log).readlines())
+
+    def test_call_batches(self):
+        statuses = spm_call_batches(self.batches)
+        self.assertEqual(self.spm_sessions(), 1)
+        self.assertEqual([s[0] for s in statuses], [0, 0, 1, 0, 0])
+        self.assertEqual(statuses[2][1], 'batch failed')
+
+    def test_executor(self):
+        with SPMBatchExecutor(max_batches=3) as executor:
+            jobs = [executor.submit(batch) for batch in self.batches]
+            self.assertEqual(self.spm_sessions(), 1)
+            self.assertEqual(jobs[4].returncode, None)
+        self.assertEqual(self.spm_sessions(), 2)
+        self.assertEqual([job.wait() for job in jobs], [0, 0, 1, 0, 0])
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSPMBatches)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
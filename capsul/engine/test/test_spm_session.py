@@ -0,0 +1,179 @@
+from __future__ import print_function
+
+import unittest
+import os
+import os.path as osp
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+from capsul.in_context import spm_session
+from capsul.in_context.spm import spm_check_call
+from capsul.in_context.spm_session import SPMSession
+
+
+# stub of the SPM standalone script running a session: it reads requests on
+# stdin, fails the batches calling error(), exits on batches calling exit,
+# and waits on batches calling pause
+stub_run_spm = '''#!%s
+import re
+import sys
+import time
+with open(sys.argv[0] + '.log', 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\\n')
+for request in iter(sys.stdin.readline, ''):
+    request = request.strip()
+    if request in ('', 'exit'):
+        break
+    batch, status = request.split('\\t')
+    content = open(batch).read()
+    if re.search(r'(^|[;,])\\s*exit\\b', content, re.M):
+        sys.exit(3)
+    print('running', batch)
+    if 'pause(' in content:
+        time.sleep(0.5)
+    with open(status, 'w') as f:
+        if 'error(' in content:
+            f.write('1\\nbatch failed')
+        else:
+            f.write('0')
+    print('\\n' + 'capsul_spm_batch_done')
+    sys.stdout.flush()
+'''
+
+
+class TestSPMSession(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_spm')
+        self.run_spm = osp.join(self.tmpdir, 'run_spm12.sh')
+        with open(self.run_spm, 'w') as f:
+            f.write(stub_run_spm % sys.executable)
+        os.chmod(self.run_spm, stat.S_IRWXU)
+        os.makedirs(osp.join(self.tmpdir, 'mcr', 'v713'))
+        self.environ = dict((name, os.environ.get(name))
+                            for name in ('SPM_DIRECTORY', 'SPM_VERSION',
+                                         'SPM_STANDALONE',
+                                         'SPM_PERSISTENT_SESSION',
+                                         'SPM_PERSISTENT_SESSIONS'))
+        os.environ.update({'SPM_DIRECTORY': self.tmpdir,
+                           'SPM_VERSION': '12',
+                           'SPM_STANDALONE': 'yes'})
+        self.batches = {}
+        for name, content in (('ok', "disp('ok');\n"),
+                              ('error', "error('failure');\n"),
+                              ('exit', "exit(3);\n"),
+                              ('pause', "pause(0.5);\n"),
+                              ('nipype', "fprintf(1, 'NIPYPE');\nexit;\n")):
+            batch = osp.join(self.tmpdir, 'batch_%s.m' % name)
+            with open(batch, 'w') as f:
+                f.write(content)
+            self.batches[name] = batch
+
+    def tearDown(self):
+        if spm_session._shared_session is not None:
+            spm_session._shared_session.close()
+            spm_session._shared_session = None
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(self.tmpdir)
+
+    def spm_sessions(self):
+        log = self.run_spm + '.log'
+        if not osp.exists(log):
+            return 0
+        return len(open(log).readlines())
+
+    def test_session(self):
+        with SPMSession() as session:
+            for i in range(3):
+                returncode, message, output = session.run_batch(
+                    self.batches['ok'])
+                self.assertEqual(returncode, 0)
+                self.assertTrue(self.batches['ok'] in output)
+            self.assertEqual(session.run_batch(self.batches['error'])[:2],
+                             (1, 'batch failed'))
+            self.assertEqual(self.spm_sessions(), 1)
+            # a dying session is reported, then restarted
+            self.assertEqual(session.run_batch(self.batches['exit'])[0], 3)
+            self.assertEqual(session.run_batch(self.batches['ok'])[0], 0)
+            self.assertEqual(self.spm_sessions(), 2)
+
+    def run_concurrent_batches(self, session, count):
+        results = []
+        threads = [threading.Thread(
+                       target=lambda: results.append(
+                           session.run_batch(self.batches['pause'])[0]))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_batches(self):
+        # concurrent batches wait for the single process
+        with SPMSession() as session:
+            self.assertEqual(self.run_concurrent_batches(session, 3),
+                             [0, 0, 0])
+            self.assertEqual(self.spm_sessions(), 1)
+        # or are run in parallel processes
+        with SPMSession(max_processes=2) as session:
+            self.assertEqual(self.run_concurrent_batches(session, 3),
+                             [0, 0, 0])
+            self.assertEqual(self.spm_sessions(), 3)
+            self.assertEqual(session.run_batch(self.batches['ok'])[0], 0)
+            self.assertEqual(self.spm_sessions(), 3)
+
+    def test_served_session(self):
+        os.environ['SPM_PERSISTENT_SESSION'] = 'yes'
+        spm_check_call(self.batches['ok'])
+        spm_session.shared_session().serve()
+        self.assertEqual(spm_session.main([self.batches['ok']]), 0)
+        self.assertEqual(spm_session.main([self.batches['error']]), 1)
+        self.assertEqual(self.spm_sessions(), 1)
+
+    def test_served_session_exit(self):
+        os.environ['SPM_PERSISTENT_SESSION'] = 'yes'
+        spm_session.shared_session().serve()
+        # forwarded scripts calling exit do not end the session
+        self.assertEqual(spm_session.main([self.batches['nipype']]), 0)
+        self.assertEqual(spm_session.main([self.batches['ok']]), 0)
+        self.assertEqual(self.spm_sessions(), 1)
+        self.assertEqual(
+            spm_session.remove_exit_statements(
+                "disp('exit');\nif a, exit(1), end\nquit force;\n"),
+            "disp('exit');\nif a, , end\n;\n")
+
+    def test_engine_environ(self):
+        from capsul.engine.module import spm
+
+        environ = {}
+        spm.set_environ({'spm': {'persistent_session': True}}, environ)
+        self.assertEqual(environ, {'SPM_PERSISTENT_SESSION': 'yes'})
+        environ = {}
+        spm.set_environ({'spm': {'persistent_session': True,
+                                 'persistent_sessions': 4}}, environ)
+        self.assertEqual(environ, {'SPM_PERSISTENT_SESSION': 'yes',
+                                   'SPM_PERSISTENT_SESSIONS': '4'})
+        os.environ['SPM_PERSISTENT_SESSIONS'] = '4'
+        self.assertEqual(spm_session.shared_session().max_processes, 4)
+        environ = {}
+        spm.set_environ({'spm': {'persistent_session': False}}, environ)
+        self.assertEqual(environ, {})
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSPMSession)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -17,12 +17,24 @@ Prefix are used in Neurodebian install. For instance on Ubuntu 16.04
 Neurodebian FSL commands are prefixed with "fsl5.0-".
 The appropriate path and eventualy prefix are added from the configuration
 of the ExecutionContext.
+
+When FSL is configured with its fsl.sh script, the script is only sourced
+when a configuration is first used, and the environment variables it sets
+(including the ones it sets to the value they already have) are cached and
+given to the FSL commands (see :func:`fsl_environment`), instead of running
+each command through a shell sourcing fsl.sh. Entries the script prepends
+to path variables (such as PATH) are added to the value these variables
+have when each command is run.
 '''
 
 from __future__ import absolute_import
 
+import json
 import os
 import os.path as osp
+import re
+import sys
+import threading
 import soma.subprocess
 
 from traits.api import Undefined
@@ -62,26 +74,160 @@ def fsl_command_with_environment(command):
                            command[0])] + command[1:]
     return cmd
 
+_fsl_environments = {}
+_fsl_environments_lock = threading.Lock()
+_variable_name_re = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _shell_environment(shell, script):
+    '''
+    Environment variables of a Python command run by the shell after the
+    script (shell code)
+    '''
+    dump = ("exec '%s' -c "
+            "'import json, os; print(json.dumps(dict(os.environ)))'"
+            % sys.executable)
+    output = soma.subprocess.check_output([shell, '-c', script + dump])
+    if not isinstance(output, str):
+        output = output.decode()
+    # the script may print things: the dump is the last line
+    return json.loads(output.strip().split('\n')[-1])
+
+
+def _environment_changes(before, after):
+    # variables set by a script, given the environment before and after it
+    environment = {}
+    for name, value in after.items():
+        old_value = before.get(name)
+        if old_value == value:
+            continue
+        if old_value and value.endswith(os.pathsep + old_value):
+            # path entries prepended to the variable
+            environment[name] = \
+                value[:-len(old_value) - 1].split(os.pathsep)
+        else:
+            environment[name] = value
+    return environment
+
+
+def fsl_environment(fsl_config):
+    '''
+    Environment variables set by the FSL configuration script fsl_config
+    (fsl.sh, or fsl.csh next to it for csh users). The variables are cached
+    for a given configuration script, shell and script modification date,
+    so the script is only sourced the first time. It is sourced twice
+    then: the second time without the variables that have the same value
+    before and after the script, to find the ones the script sets to the
+    value they already have.
+
+    Returns a {name: value} dict. value is a string for variables the script
+    sets, or a list of entries for path variables the script prepends
+    entries to (see :func:`fsl_subprocess_environment`).
+    '''
+    fsldir = osp.dirname(osp.dirname(osp.dirname(fsl_config)))
+    shell = os.environ.get('SHELL', '/bin/sh')
+    if shell.endswith('csh'):
+        script = osp.join(fsldir, 'etc', 'fslconf', 'fsl.csh')
+        source = 'setenv FSLDIR "%s";source %s;' % (fsldir, script)
+    else:
+        script = osp.join(fsldir, 'etc', 'fslconf', 'fsl.sh')
+        source = 'export FSLDIR="%s";. %s;' % (fsldir, script)
+    try:
+        mtime = os.stat(script).st_mtime
+    except OSError:
+        mtime = None
+    key = (fsldir, shell, mtime)
+    with _fsl_environments_lock:
+        environment = _fsl_environments.get(key)
+        if environment is None:
+            # keep only variables set by the script, not by the shell itself
+            before = _shell_environment(shell, '')
+            after = _shell_environment(shell, source)
+            environment = _environment_changes(before, after)
+            # a variable the script sets to its current value only shows
+            # up when it is not set before the script. PATH is kept for
+            # the commands the script may call.
+            unchanged = [name for name in after
+                         if name not in environment and name != 'PATH'
+                         and _variable_name_re.match(name)]
+            if unchanged:
+                if shell.endswith('csh'):
+                    unset = 'unsetenv %s;'
+                else:
+                    unset = 'unset %s;'
+                unset = ''.join(unset % name for name in unchanged)
+                before = _shell_environment(shell, unset)
+                after = _shell_environment(shell, unset + source)
+                for name in unchanged:
+                    if name in after and name not in before:
+                        environment[name] = after[name]
+            _fsl_environments[key] = environment
+    return environment
+
+
+def fsl_subprocess_environment(environment, env=None):
+    '''
+    Environment of an FSL command: env (os.environ if None) updated with the
+    variables returned by :func:`fsl_environment`. Prepended path entries
+    are added to the value the variable has in env.
+    '''
+    env = dict(os.environ if env is None else env)
+    for name, value in environment.items():
+        if isinstance(value, list):
+            if env.get(name):
+                value = value + [env[name]]
+            value = os.pathsep.join(value)
+        env[name] = value
+    return env
+
+
+def fsl_command_and_environment(command):
+    '''
+    Same as :func:`fsl_command_with_environment` but, when FSL is
+    configured with fsl.sh, returns the command to call directly and
+    the environment variables to add for it: (command, environment).
+    environment is None when no variable has to be set.
+    '''
+    fsl_config = os.environ.get('FSL_CONFIG')
+    if not fsl_config:
+        return fsl_command_with_environment(command), None
+    fsldir = osp.dirname(osp.dirname(osp.dirname(fsl_config)))
+    fsl_prefix = os.environ.get('FSL_PREFIX', '')
+    cmd = ['%s/bin/%s%s' % (fsldir, fsl_prefix, command[0])] + command[1:]
+    return cmd, fsl_environment(fsl_config)
+
+
+def _fsl_subprocess_args(command, kwargs):
+    '''
+    Command and subprocess keyword arguments to run an FSL command
+    '''
+    cmd, environment = fsl_command_and_environment(command)
+    if environment:
+        kwargs = dict(kwargs, env=fsl_subprocess_environment(
+            environment, kwargs.get('env')))
+    return cmd, kwargs
+
+
 class FslPopen(soma.subprocess.Popen):
     '''
     Equivalent to Python subprocess.Popen for FSL commands
     '''
     def __init__(self, command, **kwargs):
-        cmd = fsl_command_with_environment(command)
-        super(Popen, self).__init__(cmd, **kwargs)
+        cmd, kwargs = _fsl_subprocess_args(command, kwargs)
+        super(FslPopen, self).__init__(cmd, **kwargs)
         
 def fsl_call(command, **kwargs):
     '''
     Equivalent to Python subprocess.call for FSL commands
     '''
-    cmd = fsl_command_with_environment(command)
+    cmd, kwargs = _fsl_subprocess_args(command, kwargs)
     return soma.subprocess.call(cmd, **kwargs)
 
 def fsl_check_call(command, **kwargs):
     '''
     Equivalent to Python subprocess.check_call for FSL commands
     '''
-    cmd = fsl_command_with_environment(command)
+    cmd, kwargs = _fsl_subprocess_args(command, kwargs)
     return soma.subprocess.check_call(cmd, **kwargs)
 
 
@@ -89,5 +235,5 @@ def fsl_check_output(command, **kwargs):
     '''
     Equivalent to Python subprocess.check_output for FSL commands
     '''
-    cmd = fsl_command_with_environment(command)
+    cmd, kwargs = _fsl_subprocess_args(command, kwargs)
     return soma.subprocess.check_output(cmd, **kwargs)
@@ -21,7 +21,15 @@ def configure_spm():
     spm_directory = os.environ.get('SPM_DIRECTORY')
     if spm_directory:
         from nipype.interfaces import spm
-        
+        from capsul.in_context import spm_session
+
+        if spm_session.persistent_session_enabled():
+            # send the Matlab scripts to the persistent SPM session
+            spm_session.shared_session().serve()
+            spm.SPMCommand.set_mlab_paths(
+                matlab_cmd=spm_session.session_command(), use_mcr=True)
+            return
+
         standalone = (os.environ.get('SPM_STANDALONE') == 'yes')
         if standalone:
             import glob
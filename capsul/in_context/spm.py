@@ -13,6 +13,18 @@ with statement). For instance::
 
 For calling SPM command with this module, the first arguent of
 command line must be the SPM batch file to execute with Matlab.
+
+Starting SPM standalone (or Matlab) takes a lot of time, often more than
+running a batch. Several independent batches may be run in a single SPM
+session using :func:`spm_call_batches`, or gathered by a
+:class:`SPMBatchExecutor`::
+
+   with ce:
+      with SPMBatchExecutor() as executor:
+          jobs = [executor.submit(batch) for batch in subjects_batches]
+      for job in jobs:
+          if job.returncode != 0:
+              print(job.batch_file, 'failed:', job.message)
 '''
 
 from __future__ import absolute_import, print_function
@@ -20,6 +32,9 @@ from __future__ import absolute_import, print_function
 import glob
 import os
 import os.path as osp
+import shutil
+import tempfile
+import threading
 
 import soma.subprocess
 
@@ -47,6 +62,202 @@ def spm_command(spm_batch_filename):
                                   'implemented yet')
     return cmd
 
+def spm_script_command(script_filename):
+    '''
+    Command running a Matlab script (not a batch) in SPM standalone, or in
+    Matlab with SPM in its path.
+    '''
+    spm_directory = os.environ.get('SPM_DIRECTORY', '')
+    if os.environ.get('SPM_STANDALONE') == 'yes':
+        spm_exec_glob = osp.join(spm_directory, 'mcr', 'v*')
+        spm_exec = glob.glob(spm_exec_glob)
+        if not spm_exec:
+            raise ValueError('Cannot find SPM executable: %s' % spm_exec_glob)
+        cmd = [osp.join(spm_directory,
+                        'run_spm%s.sh' % os.environ.get('SPM_VERSION', '')),
+               spm_exec[0],
+               'script',
+               script_filename]
+    else:
+        matlab_executable = os.environ.get('MATLAB_EXECUTABLE')
+        if not matlab_executable:
+            raise ValueError('MATLAB_EXECUTABLE is not defined')
+        script = "try, run('%s'); catch err, disp(err.message); end; exit" \
+            % _matlab_string(script_filename)
+        if spm_directory:
+            script = "addpath('%s'); " % _matlab_string(spm_directory) \
+                + script
+        cmd = [matlab_executable, '-nodisplay', '-nosplash', '-nojvm',
+               '-r', script]
+    return cmd
+
+
+def _matlab_string(value):
+    return value.replace("'", "''")
+
+
+def _run_batch_lines(batch, status):
+    '''
+    Matlab code running the batch (or script) file, and writing its status
+    in the status file. batch and status are Matlab expressions.
+    '''
+    return [
+        "clear matlabbatch;",
+        "try",
+        "    eval(fileread(%s));" % batch,
+        "    if exist('matlabbatch', 'var')",
+        "        spm_jobman('run', matlabbatch);",
+        "    end",
+        "    capsul_status = '0';",
+        "catch capsul_error",
+        "    capsul_status = sprintf('1\\n%s', capsul_error.message);",
+        "end",
+        "capsul_fid = fopen(%s, 'w');" % status,
+        "fprintf(capsul_fid, '%s', capsul_status);",
+        "fclose(capsul_fid);"]
+
+
+def spm_batches_script(spm_batch_filenames, status_filenames):
+    '''
+    Matlab script running several SPM batches in a single session.
+
+    Each batch is run independently: a failing batch does not prevent the
+    following ones from running. The status of each batch is written in
+    the matching status file: "0" on success, "1" followed by the error
+    message on failure.
+    '''
+    lines = ["spm('defaults', 'fmri');",
+             "spm_jobman('initcfg');"]
+    for batch, status in zip(spm_batch_filenames, status_filenames):
+        lines += _run_batch_lines(
+            "'%s'" % _matlab_string(osp.abspath(batch)),
+            "'%s'" % _matlab_string(osp.abspath(status)))
+    return '\n'.join(lines) + '\n'
+
+
+def read_batches_status(status_filenames, returncode=0):
+    '''
+    Read the status files written by a script from
+    :func:`spm_batches_script`. Returns a list of (returncode, message),
+    one per batch. Batches which have not written their status (the session
+    has been interrupted) get the session return code, or 1 if it is 0.
+    '''
+    statuses = []
+    for status_filename in status_filenames:
+        if not osp.exists(status_filename):
+            statuses.append((returncode or 1,
+                             'SPM session ended before the batch was run '
+                             '(return code: %d)' % returncode))
+            continue
+        with open(status_filename) as f:
+            status = f.read().split('\n', 1)
+        statuses.append((int(status[0] or 1),
+                         status[1] if len(status) > 1 else ''))
+    return statuses
+
+
+def call_batches_script(spm_batch_filenames, script_command, **kwargs):
+    '''
+    Write a script from :func:`spm_batches_script` in a temporary directory,
+    run the command returned by script_command(script_filename) with
+    subprocess.call (keyword arguments are passed to it), and read the
+    status of each batch (see :func:`read_batches_status`).
+    '''
+    if not spm_batch_filenames:
+        return []
+    tmpdir = tempfile.mkdtemp(prefix='capsul_spm_batches_')
+    try:
+        script_filename = osp.join(tmpdir, 'capsul_spm_batches.m')
+        status_filenames = [osp.join(tmpdir, 'status_%d.txt' % i)
+                            for i in range(len(spm_batch_filenames))]
+        with open(script_filename, 'w') as f:
+            f.write(spm_batches_script(spm_batch_filenames,
+                                       status_filenames))
+        cmd = script_command(script_filename)
+        returncode = soma.subprocess.call(cmd, **kwargs)
+        return read_batches_status(status_filenames, returncode)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def spm_call_batches(spm_batch_filenames, **kwargs):
+    '''
+    Run several SPM batches in a single SPM standalone (or Matlab) session,
+    thus paying the runtime startup only once. Keyword arguments are passed
+    to subprocess.call.
+
+    Returns a list of (returncode, message) tuples, one per batch, in the
+    order of spm_batch_filenames.
+    '''
+    return call_batches_script(spm_batch_filenames, spm_script_command,
+                               **kwargs)
+
+
+class SPMBatchJob(object):
+    '''
+    SPM batch submitted to a :class:`SPMBatchExecutor`. returncode and
+    message are set once the batch has been run, wait() blocks until then.
+    '''
+    def __init__(self, batch_file):
+        self.batch_file = batch_file
+        self.returncode = None
+        self.message = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.returncode
+
+    def _set_status(self, returncode, message):
+        self.returncode = returncode
+        self.message = message
+        self._done.set()
+
+
+class SPMBatchExecutor(object):
+    '''
+    Gathers SPM batches submitted (possibly from several threads) and runs
+    them in a single SPM session when flush() is called, when max_batches
+    batches are pending, or when leaving a with statement. Keyword
+    arguments are passed to subprocess.call.
+    '''
+    def __init__(self, max_batches=None, **kwargs):
+        self.max_batches = max_batches
+        self.call_kwargs = kwargs
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def submit(self, spm_batch_filename):
+        job = SPMBatchJob(spm_batch_filename)
+        with self._lock:
+            self._pending.append(job)
+            full = (self.max_batches is not None
+                    and len(self._pending) >= self.max_batches)
+        if full:
+            self.flush()
+        return job
+
+    def flush(self):
+        with self._lock:
+            jobs = self._pending
+            self._pending = []
+        if not jobs:
+            return
+        try:
+            statuses = spm_call_batches([job.batch_file for job in jobs],
+                                        **self.call_kwargs)
+        except Exception as e:
+            statuses = [(1, str(e))] * len(jobs)
+        for job, status in zip(jobs, statuses):
+            job._set_status(*status)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+
 class SPMPopen(soma.subprocess.Popen):
     '''
     Equivalent to Python subprocess.Popen for SPM batch
@@ -55,17 +266,42 @@ class SPMPopen(soma.subprocess.Popen):
         cmd = spm_command(spm_batch_filename)
         super(Popen, self).__init__(cmd, **kwargs)
         
+def _session_run_batch(spm_batch_filename):
+    '''
+    Run the batch in the shared persistent SPM session if the configuration
+    requests it, returns None otherwise.
+    '''
+    from capsul.in_context import spm_session
+
+    if not spm_session.persistent_session_enabled():
+        return None
+    return spm_session.shared_session().run_batch(spm_batch_filename)
+
+
 def spm_call(spm_batch_filename, **kwargs):
     '''
     Equivalent to Python subprocess.call for SPM batch
+
+    When a persistent SPM session is used, keyword arguments are ignored.
     '''
+    result = _session_run_batch(spm_batch_filename)
+    if result is not None:
+        return result[0]
     cmd = spm_command(spm_batch_filename)
     return soma.subprocess.call(cmd, **kwargs)
 
 def spm_check_call(spm_batch_filename, **kwargs):
     '''
     Equivalent to Python subprocess.check_call for SPM batch
+
+    When a persistent SPM session is used, keyword arguments are ignored.
     '''
+    result = _session_run_batch(spm_batch_filename)
+    if result is not None:
+        if result[0] != 0:
+            raise soma.subprocess.CalledProcessError(
+                result[0], [spm_batch_filename], result[2])
+        return 0
     cmd = spm_command(spm_batch_filename)
     return soma.subprocess.check_call(cmd, **kwargs)
 
@@ -73,7 +309,15 @@ def spm_check_call(spm_batch_filename, **kwargs):
 def spm_check_output(spm_batch_filename, **kwargs):
     '''
     Equivalent to Python subprocess.check_output for SPM batch
+
+    When a persistent SPM session is used, keyword arguments are ignored.
     '''
+    result = _session_run_batch(spm_batch_filename)
+    if result is not None:
+        if result[0] != 0:
+            raise soma.subprocess.CalledProcessError(
+                result[0], [spm_batch_filename], result[2])
+        return result[2]
     cmd = spm_command(spm_batch_filename)
     return soma.subprocess.check_output(cmd, **kwargs)
 
@@ -0,0 +1,375 @@
+'''
+Persistent SPM standalone (or Matlab) session. The SPM runtime is started
+once, then runs batch files sent to it one after the other, which avoids
+paying the runtime startup for each batch. A session may start several
+runtime processes to run batches of concurrent callers (see
+:class:`SPMSession`)::
+
+   from capsul.in_context.spm_session import SPMSession
+
+   with ce:
+       with SPMSession() as session:
+           for batch in subjects_batches:
+               returncode, message, output = session.run_batch(batch)
+
+When the SPM configuration of the activated ExecutionContext requests a
+persistent session (SPM_PERSISTENT_SESSION environment variable set to
+"yes"), :mod:`capsul.in_context.spm` functions and Nipype SPM interfaces
+use a session shared by the whole Python process (see
+:func:`shared_session`), with as many runtime processes as the
+SPM_PERSISTENT_SESSIONS environment variable (1 by default). Other
+processes (Nipype runs its Matlab commands
+in subprocesses) send their batches to it through a local socket, using
+this module as a command::
+
+   python -m capsul.in_context.spm_session batch_file.m
+
+Scripts sent this way often end with an ``exit`` statement (Nipype SPM
+detection script for instance), which would end the session: such
+statements are removed from them (see :func:`remove_exit_statements`).
+'''
+
+from __future__ import absolute_import, print_function
+
+import atexit
+import binascii
+import os
+import os.path as osp
+import re
+import shutil
+import sys
+import tempfile
+import threading
+
+import soma.subprocess
+
+from capsul.in_context.spm import (spm_script_command, read_batches_status,
+                                   _run_batch_lines)
+
+
+def spm_session_script(done_marker):
+    '''
+    Matlab script of the session: it reads requests on its standard input,
+    each made of a batch file and a status file separated by a tab, runs
+    the batch, writes its status, then prints done_marker on its standard
+    output. An empty line or "exit" ends the session.
+    '''
+    lines = ["spm('defaults', 'fmri');",
+             "spm_jobman('initcfg');",
+             "while true",
+             "    capsul_request = input('', 's');",
+             "    if isempty(capsul_request) || "
+             "strcmp(capsul_request, 'exit')",
+             "        break;",
+             "    end",
+             "    capsul_tab = find(capsul_request == char(9), 1);",
+             "    capsul_batch = capsul_request(1:capsul_tab-1);",
+             "    capsul_status_file = capsul_request(capsul_tab+1:end);"]
+    lines += ['    ' + line
+              for line in _run_batch_lines('capsul_batch',
+                                           'capsul_status_file')]
+    lines += ["    fprintf(1, '\\n%s\\n');" % done_marker,
+              "end"]
+    return '\n'.join(lines) + '\n'
+
+
+# exit or quit statements, with an optional return code
+_exit_re = re.compile(r'(^|[;,])([ \t]*)(?:exit|quit)'
+                      r'(?:[ \t]*\([^)]*\)|[ \t]+(?:force|cancel))?'
+                      r'(?=[ \t]*(?:[;,%]|$))', re.MULTILINE)
+
+
+def remove_exit_statements(script):
+    '''
+    Remove the ``exit`` and ``quit`` statements of a Matlab script, which
+    would end a session running it.
+    '''
+    return _exit_re.sub(r'\1\2', script)
+
+
+class SPMSession(object):
+    '''
+    Long-lived SPM standalone or Matlab processes, configured from the
+    activated ExecutionContext environment when they are started. A process
+    is started on the first batch, and restarted if it has died (a script
+    calling exit() for instance). run_batch() may be called from several
+    threads: each process runs one batch at a time, and up to
+    max_processes processes are started to run the batches of concurrent
+    callers. When they are all busy, callers wait for one to be free.
+
+    Keyword arguments are passed to subprocess.Popen.
+    '''
+    done_marker = 'capsul_spm_batch_done'
+
+    def __init__(self, max_processes=1, **kwargs):
+        self.max_processes = max_processes
+        self.popen_kwargs = kwargs
+        self.address = None
+        self._processes = []
+        self._idle = []
+        self._tmpdir = None
+        self._count = 0
+        self._listener = None
+        self._lock = threading.RLock()
+        self._released = threading.Condition(self._lock)
+
+    def _start_process(self):
+        if self._tmpdir is None:
+            self._tmpdir = tempfile.mkdtemp(prefix='capsul_spm_session_')
+        script = osp.join(self._tmpdir, 'capsul_spm_session.m')
+        with open(script, 'w') as f:
+            f.write(spm_session_script(self.done_marker))
+        process = soma.subprocess.Popen(
+            spm_script_command(script), stdin=soma.subprocess.PIPE,
+            stdout=soma.subprocess.PIPE, stderr=soma.subprocess.STDOUT,
+            universal_newlines=True, **self.popen_kwargs)
+        self._processes.append(process)
+        return process
+
+    def _drop_process(self, process):
+        self._processes.remove(process)
+        process.stdout.close()
+        self._released.notify()
+
+    def start(self):
+        ''' Start an SPM process, if none is running '''
+        with self._lock:
+            for process in list(self._idle):
+                if process.poll() is not None:
+                    self._idle.remove(process)
+                    self._drop_process(process)
+            if not self._processes:
+                self._idle.append(self._start_process())
+
+    def _acquire_process(self):
+        with self._lock:
+            while True:
+                while self._idle:
+                    process = self._idle.pop()
+                    if process.poll() is None:
+                        return process
+                    self._drop_process(process)
+                if len(self._processes) < self.max_processes:
+                    return self._start_process()
+                self._released.wait()
+
+    def _release_process(self, process):
+        with self._lock:
+            if process in self._processes:
+                self._idle.append(process)
+                self._released.notify()
+
+    def run_batch(self, batch_file, ignore_exit=False):
+        '''
+        Run a batch (or Matlab script) file in the session. Returns a tuple
+        (returncode, message, output) where message is the error message of
+        a failed batch and output is what the batch printed.
+
+        If ignore_exit is True, ``exit`` and ``quit`` statements of the
+        script are removed before it is run (see
+        :func:`remove_exit_statements`). Otherwise they end the process
+        running them, which is restarted for the next batch.
+        '''
+        with self._lock:
+            if self._tmpdir is None:
+                self._tmpdir = tempfile.mkdtemp(prefix='capsul_spm_session_')
+            self._count += 1
+            count = self._count
+        status_file = osp.join(self._tmpdir, 'status_%d.txt' % count)
+        if ignore_exit:
+            with open(batch_file) as f:
+                script = f.read()
+            batch_file = osp.join(self._tmpdir, 'batch_%d.m' % count)
+            with open(batch_file, 'w') as f:
+                f.write(remove_exit_statements(script))
+        process = self._acquire_process()
+        output = []
+        done = False
+        returncode = 0
+        try:
+            try:
+                process.stdin.write('%s\t%s\n'
+                                    % (osp.abspath(batch_file), status_file))
+                process.stdin.flush()
+                for line in iter(process.stdout.readline, ''):
+                    if line.strip() == self.done_marker:
+                        done = True
+                        break
+                    output.append(line)
+            except (IOError, OSError):
+                # broken pipe: the process has died
+                pass
+            if not done:
+                returncode = process.wait()
+        finally:
+            if done:
+                self._release_process(process)
+            else:
+                with self._lock:
+                    if process.poll() is None:
+                        process.kill()
+                        process.wait()
+                    if process in self._processes:
+                        self._drop_process(process)
+        status = read_batches_status([status_file], returncode)[0]
+        if osp.exists(status_file):
+            os.unlink(status_file)
+        if ignore_exit and osp.exists(batch_file):
+            os.unlink(batch_file)
+        return status[0], status[1], ''.join(output)
+
+    def serve(self):
+        '''
+        Accept batches from other processes, through a local socket. The
+        socket address and key are set in os.environ
+        (CAPSUL_SPM_SESSION and CAPSUL_SPM_SESSION_KEY) so that child
+        processes find the session. Returns the socket address.
+        '''
+        from multiprocessing.connection import Listener
+
+        with self._lock:
+            if self._listener is not None:
+                return self.address
+            self.start()
+            authkey = binascii.hexlify(os.urandom(16))
+            self._listener = Listener(osp.join(self._tmpdir, 'socket'),
+                                      'AF_UNIX', authkey=authkey)
+            self.address = self._listener.address
+            thread = threading.Thread(target=self._accept,
+                                      args=(self._listener, ))
+            thread.daemon = True
+            thread.start()
+            os.environ['CAPSUL_SPM_SESSION'] = self.address
+            os.environ['CAPSUL_SPM_SESSION_KEY'] = authkey.decode()
+        return self.address
+
+    def _accept(self, listener):
+        while self._listener is listener:
+            try:
+                connection = listener.accept()
+            except Exception:
+                # closed listener or authentication failure
+                continue
+            thread = threading.Thread(target=self._serve_connection,
+                                      args=(connection, ))
+            thread.daemon = True
+            thread.start()
+
+    def _serve_connection(self, connection):
+        try:
+            batch_file = connection.recv()
+            try:
+                # forwarded scripts are written to be run in their own
+                # Matlab process, and often exit at the end
+                result = self.run_batch(batch_file, ignore_exit=True)
+            except Exception as e:
+                result = (1, str(e), '')
+            connection.send(result)
+        except (IOError, OSError, EOFError):
+            pass
+        finally:
+            connection.close()
+
+    def close(self):
+        ''' Stop serving and end the SPM process '''
+        with self._lock:
+            if self._listener is not None:
+                listener = self._listener
+                self._listener = None
+                listener.close()
+                if os.environ.get('CAPSUL_SPM_SESSION') == self.address:
+                    os.environ.pop('CAPSUL_SPM_SESSION', None)
+                    os.environ.pop('CAPSUL_SPM_SESSION_KEY', None)
+                self.address = None
+            for process in self._processes:
+                if process.poll() is None:
+                    try:
+                        process.stdin.write('exit\n')
+                        process.stdin.close()
+                    except (IOError, OSError):
+                        pass
+                    process.wait()
+                process.stdout.close()
+            self._processes = []
+            self._idle = []
+            self._released.notify_all()
+            if self._tmpdir is not None:
+                shutil.rmtree(self._tmpdir, ignore_errors=True)
+                self._tmpdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def persistent_session_enabled():
+    '''
+    True if the activated ExecutionContext requests batches to be run in
+    a persistent SPM session.
+    '''
+    return os.environ.get('SPM_PERSISTENT_SESSION') == 'yes'
+
+
+def shared_session():
+    '''
+    Persistent SPM session shared in the current Python process. It is
+    created on first call, with the number of SPM processes given by the
+    SPM_PERSISTENT_SESSIONS environment variable (1 by default), and closed
+    when Python exits.
+    '''
+    global _shared_session
+
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = SPMSession(
+                max_processes=int(os.environ.get('SPM_PERSISTENT_SESSIONS')
+                                  or 1))
+            atexit.register(_shared_session.close)
+        return _shared_session
+
+
+def session_command():
+    '''
+    Command line prefix sending a batch file to the served session, as
+    expected by Nipype matlab_cmd.
+    '''
+    return '%s -m capsul.in_context.spm_session' % sys.executable
+
+
+def main(argv=sys.argv[1:]):
+    '''
+    Send batch files to the session served by another process (see
+    :meth:`SPMSession.serve`). Returns the first non-zero return code.
+    '''
+    from multiprocessing.connection import Client
+
+    address = os.environ.get('CAPSUL_SPM_SESSION')
+    if not address:
+        print('No SPM session is served (CAPSUL_SPM_SESSION is not set)',
+              file=sys.stderr)
+        return 1
+    authkey = os.environ.get('CAPSUL_SPM_SESSION_KEY', '').encode()
+    for batch_file in argv:
+        connection = Client(address, 'AF_UNIX', authkey=authkey)
+        try:
+            connection.send(osp.abspath(batch_file))
+            returncode, message, output = connection.recv()
+        finally:
+            connection.close()
+        sys.stdout.write(output)
+        if returncode != 0:
+            # same message as Nipype Matlab scripts, which it looks for
+            print('MATLAB code threw an exception:', file=sys.stderr)
+            print(message, file=sys.stderr)
+            return returncode
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
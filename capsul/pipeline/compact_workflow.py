@@ -0,0 +1,455 @@
+'''
+Compact, streaming serialization of soma-workflow workflows.
+
+Workflows generated by
+:func:`~capsul.pipeline.pipeline_workflow.workflow_from_pipeline` for large
+cohorts contain thousands of jobs whose command lines and parameters
+dictionaries repeat the same strings (paths, parameter names, commands)
+and the same sub-dictionaries. The format written here stores each
+distinct string and each distinct dictionary once, and refers to it by
+number afterwards.
+
+The file is a sequence of JSON records, one per line, optionally
+gzip-compressed (when the file name ends with ``.gz``). Records are written
+as soon as jobs are given to :class:`WorkflowWriter`, which does not keep
+references to them: elements are then designated by the numbers the writer
+returns. A producer generating jobs one at a time may thus write them
+without keeping them all in memory::
+
+    with WorkflowWriter('/tmp/big.workflow.gz', name='big') as writer:
+        previous = None
+        for job in generate_jobs():
+            job_id = writer.write_job(job)
+            if previous is not None:
+                writer.write_dependencies([(previous, job_id)])
+            previous = job_id
+
+    workflow = read_workflow('/tmp/big.workflow.gz')
+
+This is what
+:func:`~capsul.pipeline.pipeline_workflow.workflow_from_pipeline` does when
+it is given an ``output_file``: each job is written as soon as it is built
+and dropped afterwards, only jobs numbers are kept for dependencies and
+links. A Workflow already in memory is written with :func:`write_workflow`.
+
+:func:`read_workflow` builds a whole Workflow (soma-workflow needs one to
+submit it), sharing strings and dictionaries between the jobs it reads.
+
+Record types
+------------
+``["workflow", {"format": ..., "version": ..., "name": ...}]``
+    header
+``["s", id, string]``
+    string definition
+``["d", id, dict]``
+    dictionary definition (values are encoded values)
+``["p", id, class_name, dict]``
+    special path (FileTransfer, SharedResourcePath, TemporaryPath)
+``["job", id, class_name, dict]``
+    job definition
+``["group", id, name, [element ids]]``
+    group definition
+``["deps", [[job_id, job_id], ...]]``
+    dependencies
+``["links", job_id, {param: [[job_id, param], ...]}]``
+    parameters links of a job
+``["root", [element ids]]``
+    root group elements
+``["end"]``
+
+In encoded values, a JSON string is the number of a string definition,
+``{"$d": id}`` refers to a dictionary, ``{"$p": id, "pattern": ...}`` to a
+special path, ``{"$t": [...]}`` is a tuple and ``{"$u": 0}`` is the
+Undefined traits value. Numbers, booleans, null and lists are stored
+as is.
+
+Classes
+=======
+:class:`WorkflowWriter`
+-----------------------
+
+Functions
+=========
+:func:`write_workflow`
+----------------------
+:func:`read_workflow`
+---------------------
+'''
+
+from __future__ import absolute_import
+
+import gzip
+import importlib
+import io
+import json
+
+import six
+
+import soma_workflow.client as swclient
+from traits.api import Undefined
+
+format_name = 'capsul_compact_workflow'
+format_version = 1
+
+# soma-workflow job attributes saved in the file. Attributes which are not
+# set on a job, or are None, are skipped.
+job_attributes = (
+    'name', 'command', 'referenced_input_files', 'referenced_output_files',
+    'stdin', 'join_stderrout', 'stdout_file', 'stderr_file',
+    'working_directory', 'priority', 'native_specification',
+    'parallel_job_info', 'disposal_timeout', 'env', 'param_dict',
+    'use_input_params_file', 'has_outputs', 'user_storage',
+    # capsul attributes
+    'requirements', 'estimated_duration', 'estimated_memory',
+    'process_hash', 'fused_process_hashes',
+)
+
+# special path classes, in the order they have to be checked (a
+# TemporaryPath may be a FileTransfer subclass)
+_path_class_names = ('TemporaryPath', 'SharedResourcePath', 'FileTransfer')
+
+
+def _path_classes():
+    return [(name, getattr(swclient, name)) for name in _path_class_names
+            if hasattr(swclient, name)]
+
+
+def _open(filename, mode):
+    if filename.endswith('.gz'):
+        stream = gzip.open(filename, mode + 'b')
+    else:
+        stream = io.open(filename, mode + 'b')
+    if six.PY3:
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return stream
+
+
+class WorkflowWriter(object):
+    '''
+    Write a workflow to a file, job by job.
+
+    Jobs and groups are designated by the numbers returned by
+    :meth:`write_job` and :meth:`write_group`: the writer does not keep
+    references to them. Jobs must be written before the groups,
+    dependencies and links referring to them. :meth:`close` writes the root
+    group (all written jobs and groups which are not part of another group,
+    if not given) and the end record. The writer can be used as a context
+    manager, which closes it.
+
+    Parameters
+    ----------
+    filename: str
+        output file. It is gzip-compressed if its name ends with ``.gz``.
+    name: str (optional)
+        workflow name
+    '''
+
+    def __init__(self, filename, name=None):
+        self.filename = filename
+        self._stream = _open(filename, 'w')
+        self._strings = {}
+        self._dicts = {}
+        self._paths = {}
+        # numbers of written elements which are not in a group
+        self._ungrouped = set()
+        self._next_id = 0
+        self._write(['workflow', {'format': format_name,
+                                  'version': format_version,
+                                  'name': name}])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(',', ':'))
+        if six.PY2 and isinstance(line, str):
+            line = line.decode('utf-8')
+        self._stream.write(line)
+        self._stream.write(u'\n')
+
+    def _string(self, value):
+        ident = self._strings.get(value)
+        if ident is None:
+            ident = self._new_id()
+            self._strings[value] = ident
+            self._write(['s', ident, value])
+        return str(ident)
+
+    def _path(self, value, class_name):
+        # copies of a path share the same referent, and are equal: they are
+        # written once, with their own pattern
+        ident = self._paths.get(value)
+        if ident is None:
+            referent = value.referent() if hasattr(value, 'referent') \
+                else value
+            ident = self._new_id()
+            self._paths[value] = ident
+            self._write(['p', ident, class_name, referent.to_dict()])
+        encoded = {'$p': ident}
+        pattern = getattr(value, 'pattern', '%s')
+        if pattern != '%s':
+            encoded['pattern'] = self._string(pattern)
+        return encoded
+
+    def _dict(self, value):
+        encoded = dict((six.text_type(k), self.encode(v))
+                       for k, v in six.iteritems(value))
+        key = json.dumps(encoded, sort_keys=True, separators=(',', ':'))
+        ident = self._dicts.get(key)
+        if ident is None:
+            ident = self._new_id()
+            self._dicts[key] = ident
+            self._write(['d', ident, encoded])
+        return {'$d': ident}
+
+    def encode(self, value):
+        '''
+        Encoded form of a value, writing definitions of strings,
+        dictionaries and paths it contains which have not been written yet.
+        '''
+        if value is None or isinstance(value, (bool, float)
+                                       + six.integer_types):
+            return value
+        for class_name, path_class in _path_classes():
+            if isinstance(value, path_class):
+                return self._path(value, class_name)
+        if isinstance(value, six.string_types):
+            return self._string(value)
+        if value is Undefined:
+            return {'$u': 0}
+        if isinstance(value, list):
+            return [self.encode(item) for item in value]
+        if isinstance(value, tuple):
+            return {'$t': [self.encode(item) for item in value]}
+        if isinstance(value, dict):
+            return self._dict(value)
+        if hasattr(value, 'export_to_dict'):
+            # Controller
+            return self._dict(value.export_to_dict())
+        raise TypeError('cannot serialize value %s' % repr(value))
+
+    def write_job(self, job):
+        '''
+        Write a job. Its number is returned.
+        '''
+        encoded = {}
+        for attribute in job_attributes:
+            value = getattr(job, attribute, None)
+            if value is not None:
+                encoded[attribute] = self.encode(value)
+        ident = self._new_id()
+        self._ungrouped.add(ident)
+        job_class = type(job)
+        self._write(['job', ident,
+                     '%s.%s' % (job_class.__module__, job_class.__name__),
+                     encoded])
+        return ident
+
+    def write_group(self, name, elements):
+        '''
+        Write a group, given the numbers of its elements, which must have
+        been written before. Its number is returned.
+        '''
+        elements = list(elements)
+        self._ungrouped.difference_update(elements)
+        ident = self._new_id()
+        self._ungrouped.add(ident)
+        self._write(['group', ident, self.encode(name), elements])
+        return ident
+
+    def write_dependencies(self, dependencies):
+        '''
+        Write dependencies, given as (job number, job number) pairs.
+        '''
+        self._write(['deps', [[source, dest]
+                              for source, dest in dependencies]])
+
+    def write_param_links(self, job, links):
+        '''
+        Write parameters links of a job, given its number.
+        links is a {param: [(source_job, source_param), ...]} dictionary
+        (see soma-workflow Workflow param_links) where source_job are jobs
+        numbers.
+        '''
+        encoded = {}
+        for param, linkl in six.iteritems(links):
+            encoded[param] = [[link[0]]
+                              + [self.encode(item) for item in link[1:]]
+                              for link in linkl]
+        self._write(['links', job, encoded])
+
+    def close(self, root_group=None):
+        '''
+        Write the root group (given as elements numbers) and end the file.
+        '''
+        if root_group is None:
+            root_group = sorted(self._ungrouped)
+        self._write(['root', list(root_group)])
+        self._write(['end'])
+        self._stream.close()
+
+    def abort(self):
+        '''
+        Close the file without ending it: reading it will fail.
+        '''
+        self._stream.close()
+
+
+def write_workflow(workflow, filename):
+    '''
+    Write a soma-workflow Workflow in the compact format.
+    '''
+    writer = WorkflowWriter(filename, name=workflow.name)
+    try:
+        ids = {}
+        for job in workflow.jobs:
+            ids[job] = writer.write_job(job)
+        # groups have to be written after their elements
+        groups = list(workflow.groups)
+        while groups:
+            remaining = []
+            for group in groups:
+                if all(element in ids for element in group.elements):
+                    ids[group] = writer.write_group(
+                        group.name, [ids[element]
+                                     for element in group.elements])
+                else:
+                    remaining.append(group)
+            if len(remaining) == len(groups):
+                raise ValueError('groups elements are not part of the '
+                                 'workflow')
+            groups = remaining
+        writer.write_dependencies((ids[source], ids[dest])
+                                  for source, dest in workflow.dependencies)
+        for job, links in six.iteritems(getattr(workflow, 'param_links',
+                                                None) or {}):
+            writer.write_param_links(
+                ids[job],
+                dict((param, [(ids[link[0]], ) + tuple(link[1:])
+                              for link in linkl])
+                     for param, linkl in six.iteritems(links)))
+        writer.close([ids[element] for element in workflow.root_group])
+    except Exception:
+        writer.abort()
+        raise
+
+
+class _Reader(object):
+
+    def __init__(self):
+        self.strings = {}
+        self.dicts = {}
+        self.paths = {}
+        self.elements = {}
+
+    def decode(self, value):
+        if isinstance(value, six.string_types):
+            return self.strings[int(value)]
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        if isinstance(value, dict):
+            if '$d' in value:
+                return self.dicts[value['$d']]
+            if '$p' in value:
+                path = self.paths[value['$p']]
+                if 'pattern' in value:
+                    path = type(path)(path)
+                    path.pattern = self.decode(value['pattern'])
+                return path
+            if '$t' in value:
+                return tuple(self.decode(item) for item in value['$t'])
+            if '$u' in value:
+                return Undefined
+        return value
+
+    def job(self, class_name, encoded):
+        module_name, name = class_name.rsplit('.', 1)
+        job_class = getattr(importlib.import_module(module_name), name)
+        values = dict((k, self.decode(v)) for k, v in six.iteritems(encoded))
+        job = job_class(command=values.pop('command', []),
+                        name=values.pop('name', None))
+        if isinstance(values.get('param_dict'), dict):
+            # the job owns its parameters dict
+            values['param_dict'] = dict(values['param_dict'])
+        for attribute, value in six.iteritems(values):
+            setattr(job, attribute, value)
+        return job
+
+
+def read_workflow(filename):
+    '''
+    Read a workflow written by :class:`WorkflowWriter` or
+    :func:`write_workflow`, and return a soma-workflow Workflow.
+    '''
+    reader = _Reader()
+    jobs = []
+    groups = []
+    dependencies = []
+    param_links = {}
+    root_group = []
+    name = None
+    complete = False
+    with _open(filename, 'r') as stream:
+        for line_number, line in enumerate(stream):
+            record = json.loads(line)
+            kind = record[0]
+            if line_number == 0:
+                if kind != 'workflow' \
+                        or record[1].get('format') != format_name:
+                    raise ValueError('%s is not a compact workflow file'
+                                     % filename)
+                if record[1].get('version', 0) > format_version:
+                    raise ValueError('unsupported compact workflow version '
+                                     '%s' % record[1].get('version'))
+                name = record[1].get('name')
+            elif kind == 's':
+                reader.strings[record[1]] = record[2]
+            elif kind == 'd':
+                reader.dicts[record[1]] = dict(
+                    (k, reader.decode(v)) for k, v in six.iteritems(record[2]))
+            elif kind == 'p':
+                reader.paths[record[1]] = getattr(
+                    swclient, record[2]).from_dict(record[3])
+            elif kind == 'job':
+                job = reader.job(record[2], record[3])
+                reader.elements[record[1]] = job
+                jobs.append(job)
+            elif kind == 'group':
+                group = swclient.Group(
+                    [reader.elements[e] for e in record[3]],
+                    name=reader.decode(record[2]))
+                reader.elements[record[1]] = group
+                groups.append(group)
+            elif kind == 'deps':
+                dependencies += [(reader.elements[source],
+                                  reader.elements[dest])
+                                 for source, dest in record[1]]
+            elif kind == 'links':
+                links = {}
+                for param, linkl in six.iteritems(record[2]):
+                    links[param] = [
+                        tuple([reader.elements[link[0]]]
+                              + [reader.decode(item) for item in link[1:]])
+                        for link in linkl]
+                param_links[reader.elements[record[1]]] = links
+            elif kind == 'root':
+                root_group = [reader.elements[e] for e in record[1]]
+            elif kind == 'end':
+                complete = True
+                break
+    if not complete:
+        raise ValueError('truncated compact workflow file: %s' % filename)
+    workflow = swclient.Workflow(jobs=jobs, dependencies=dependencies,
+                                 root_group=root_group, name=name,
+                                 param_links=param_links)
+    return workflow
@@ -4,7 +4,7 @@
 '''
 
 
-from capsul.pipeline.pipeline_nodes import Node, Plug
+from capsul.pipeline.pipeline_nodes import Node
 from soma.controller import Controller
 import traits.api as traits
 import six
@@ -76,29 +76,11 @@ class MapNode(Node):
             old_value = []
         if value in (None, traits.Undefined):
             value = []
-        if len(old_value) > len(value):
-            for i in range(len(old_value) - 1, len(value) - 1, -1):
-                pname = output % i
-                self.remove_trait(pname)
-                if pname in self.plugs:
-                    # remove links to this plug
-                    plug = self.plugs[pname]
-                    to_del = []
-                    for link in plug.links_to:
-                        linkd = (self, pname, link[2], link[1])
-                        to_del.append(linkd)
-                    for linkd in to_del:
-                        self.pipeline.remove_link(linkd)
-                    del self.plugs[pname]
-        for i in range(len(old_value), len(value)):
-            pname = output % i
-            ptype = self._clone_trait(ptype,
-                                      {'output': True, 'optional': True})
-            self.add_trait(pname, ptype)
-            plug = Plug(name=output % i, optional=True, output=True)
-            self.plugs[pname] = plug
-            plug.on_trait_change(
-                self.pipeline.update_nodes_and_plugs_activation, "enabled")
+        if len(old_value) != len(value):
+            # add / remove all plugs at once, and notify once
+            self._resize_numbered_plugs(output, len(old_value), len(value),
+                                        ptype, True)
+            self.user_traits_changed = True
         for i, val in enumerate(value):
             setattr(self, output % i, val)
         # update lengths
@@ -5,7 +5,7 @@
 
 from __future__ import print_function
 
-from capsul.pipeline.pipeline_nodes import Node, Plug
+from capsul.pipeline.pipeline_nodes import Node
 from soma.controller import Controller
 import traits.api as traits
 import six
@@ -58,6 +58,8 @@ class ReduceNode(Node):
         self.input_names = input_names
         self.output_names = output_names
         self.lengths = [0] * len(input_names)
+        # {input name: (series index, position in series)}
+        self._input_indices = {}
 
         self.set_callbacks()
 
@@ -72,76 +74,61 @@ class ReduceNode(Node):
         if value in (None, traits.Undefined):
             value = [0] * len(self.input_names)
 
-        # remove former callback
-        inputs = []
-        for i, pname_p in enumerate(self.input_names):
-            inputs += [pname_p % j for j in range(old_value[i])]
-        self.on_trait_change(self.reduce_callback, inputs, remove=True)
-
         # adjust sizes
+        resized = False
         for in_index in range(len(value)):
             ptype = self.input_types[in_index]
             pname_p = self.input_names[in_index]
             oval = old_value[in_index]
             val = value[in_index]
-            if oval > val:
-                for i in range(oval - 1, val - 1, -1):
-                    pname = pname_p % i
-                    self.remove_trait(pname)
-                    if pname in self.plugs:
-                        # remove links to this plug
-                        plug = self.plugs[pname]
-                        to_del = []
-                        for link in plug.links_from:
-                            linkd = (link[2], link[1], self, pname)
-                            to_del.append(linkd)
-                        for linkd in to_del:
-                            self.pipeline.remove_link(linkd)
-                    del self.plugs[pname]
-            for i in range(oval, val):
-                pname =  pname_p % i
-                ptype2 = self._clone_trait(ptype,
-                                           {'output': False, 'optional': True})
-                self.add_trait(pname, ptype2)
-                plug = Plug(name=pname, optional=True, output=False)
-                self.plugs[pname] = plug
-                plug.on_trait_change(
-                    self.pipeline.update_nodes_and_plugs_activation, "enabled")
-            if oval != val:
-                ovalue = [getattr(self, pname_p % i) for i in range(val)]
-                if isinstance(ptype,
-                              (traits.Str, traits.File, traits.Directory)):
-                    # List trait doesn't accept Undefined as items
-                    ovalue = [v if v not in (None, traits.Undefined) else ''
-                              for v in ovalue]
-                setattr(self, self.output_names[in_index], ovalue)
-
-        # setup new callback
-        inputs = []
-        for i, pname_p in enumerate(self.input_names):
-            inputs += [pname_p % j for j in range(value[i])]
-        self.on_trait_change(self.reduce_callback, inputs)
+            if oval == val:
+                continue
+            resized = True
+            # add / remove all plugs at once. Removed traits take their
+            # callback with them, only new plugs need one.
+            self._resize_numbered_plugs(pname_p, oval, val, ptype, False)
+            new_inputs = [pname_p % i for i in range(oval, val)]
+            if new_inputs:
+                self.on_trait_change(self.reduce_callback, new_inputs)
+            ovalue = [getattr(self, pname_p % i) for i in range(val)]
+            if isinstance(ptype,
+                          (traits.Str, traits.File, traits.Directory)):
+                # List trait doesn't accept Undefined as items
+                ovalue = [v if v not in (None, traits.Undefined) else ''
+                          for v in ovalue]
+            setattr(self, self.output_names[in_index], ovalue)
+
+        # inputs series and positions of inputs names
+        self._input_indices = {}
+        for in_index, pname_p in enumerate(self.input_names):
+            for i in range(value[in_index]):
+                self._input_indices[pname_p % i] = (in_index, i)
+        if resized:
+            self.user_traits_changed = True
 
     def reduce_callback(self, obj, name, old_value, value):
         # find out which input pattern is used
-        in_index = None
-        for index, pname_p in enumerate(self.input_names):
-            for i in range(self.lengths[index]):
-                pname = pname_p % i
-                if name == pname:
-                    in_index = index
-                    break
-            if in_index is not None:
-                break
+        in_index, i = self._input_indices[name]
         output = self.output_names[in_index]
-        value = [getattr(self, pname_p % i)
-                 for i in range(self.lengths[in_index])]
         if isinstance(self.input_types[in_index],
-                      (traits.Str, traits.File, traits.Directory)):
+                      (traits.Str, traits.File, traits.Directory)) \
+                and value in (None, traits.Undefined):
             # List trait doesn't accept Undefined as items
-            value = [v if v not in (None, traits.Undefined) else ''
-                     for v in value]
-        setattr(self, output, value)
+            value = ''
+        outputs = getattr(self, output)
+        if outputs in (None, traits.Undefined) \
+                or len(outputs) != self.lengths[in_index]:
+            pname_p = self.input_names[in_index]
+            outputs = [getattr(self, pname_p % j)
+                       for j in range(self.lengths[in_index])]
+            if isinstance(self.input_types[in_index],
+                          (traits.Str, traits.File, traits.Directory)):
+                outputs = [v if v not in (None, traits.Undefined) else ''
+                           for v in outputs]
+        else:
+            outputs = list(outputs)
+        outputs[i] = value
+        setattr(self, output, outputs)
 
     def configured_controller(self):
         c = self.configure_controller()
@@ -11,6 +11,7 @@ from __future__ import absolute_import
 
 # System import
 import logging
+from collections import deque
 from copy import deepcopy
 import tempfile
 import os
@@ -40,6 +41,7 @@ from .pipeline_nodes import ProcessNode
 from .pipeline_nodes import PipelineNode
 from .pipeline_nodes import Switch
 from .pipeline_nodes import OptionalOutputSwitch
+from .pipeline_nodes import _propagation
 
 # Soma import
 from soma.controller import Controller
@@ -114,6 +116,21 @@ class Pipeline(Process):
     which allows to select one processing branch betwen several, and disables
     the unselected ones.
 
+    After each activation step, the ``selection_changed`` event of the
+    pipeline (and of its sub-pipelines) is fired with a dict describing what
+    has changed since the previous one, so that views may update only the
+    affected items:
+
+    * ``activation``: {node_name: plug_names} for nodes whose activation, or
+      the activation of some of their plugs, has changed. plug_names is the
+      set of changed plugs. The pipeline node name is ''.
+    * ``links``: list of (added, link) in the order of changes, where added
+      is a bool and link is (source_node_name, source_plug_name,
+      dest_node_name, dest_plug_name, weak_link).
+
+    The event may also be fired with True (by older code), meaning that
+    anything may have changed.
+
     **Pipeline steps**
 
     Pipelines may define execution steps: they are user-oriented groups of
@@ -223,6 +240,9 @@ class Pipeline(Process):
         self.nodes = SortedDictionary()
         self._invalid_nodes = set()
         self._skip_invalid_nodes = set()
+        # {(node, plug_name): number of links to/from the pipeline node},
+        # maintained by add_link() and remove_link()
+        self._exported_plugs = {}
         # Get node_position from the Pipeline class if it is
         # defined
         node_position = getattr(self,'node_position', None)
@@ -245,6 +265,7 @@ class Pipeline(Process):
         self.nodes[''] = self.pipeline_node
         self.do_not_export = set()
         self.parent_pipeline = None
+        self._links_changes = []
         self._disable_update_nodes_and_plugs_activation = 1
         self._must_update_nodes_and_plugs_activation = False
         self.pipeline_definition()
@@ -951,8 +972,12 @@ class Pipeline(Process):
             dest_node.set_plug_value(dest_plug_name, value)
 
         # Update plugs memory of the pipeline
-        source_plug.links_to.add((dest_node_name, dest_plug_name, dest_node,
-                                  dest_plug, weak_link))
+        link_to = (dest_node_name, dest_plug_name, dest_node, dest_plug,
+                   weak_link)
+        if link_to not in source_plug.links_to:
+            self._update_exported_plugs(source_node, source_plug_name,
+                                        dest_node, dest_plug_name, 1)
+        source_plug.links_to.add(link_to)
         dest_plug.links_from.add((source_node_name, source_plug_name,
                                   source_node, source_plug, weak_link))
 
@@ -976,9 +1001,37 @@ class Pipeline(Process):
         source_node.connect(source_plug_name, dest_node, dest_plug_name)
         dest_node.connect(dest_plug_name, source_node, source_plug_name)
 
+        # Reported to views on next selection_changed
+        self._links_changes.append(
+            (True, (source_node_name, source_plug_name, dest_node_name,
+                    dest_plug_name, weak_link)))
+
         # Refresh pipeline activation
         self.update_nodes_and_plugs_activation()
 
+    def _update_exported_plugs(self, source_node, source_plug_name,
+                               dest_node, dest_plug_name, count):
+        """ Maintain the index of node plugs linked to the pipeline node
+        when a link is added (count=1) or removed (count=-1).
+        """
+        if dest_node is self.pipeline_node:
+            key = (source_node, source_plug_name)
+        elif source_node is self.pipeline_node:
+            key = (dest_node, dest_plug_name)
+        else:
+            return
+        count += self._exported_plugs.get(key, 0)
+        if count > 0:
+            self._exported_plugs[key] = count
+        else:
+            self._exported_plugs.pop(key, None)
+
+    def _is_plug_exported(self, node, plug_name):
+        """ Tell if a plug of a node of this pipeline is linked to a
+        parameter of the pipeline (this pipeline only, not a parent one).
+        """
+        return (node, plug_name) in self._exported_plugs
+
     def remove_link(self, link):
         """ Remove a link between pipeline nodes
 
@@ -1010,10 +1063,16 @@ class Pipeline(Process):
             return
 
         # Update plugs memory of the pipeline
-        source_plug.links_to.discard((dest_node_name, dest_plug_name,
-                                      dest_node, dest_plug, True))
-        source_plug.links_to.discard((dest_node_name, dest_plug_name,
-                                      dest_node, dest_plug, False))
+        for weak_link in (True, False):
+            link_to = (dest_node_name, dest_plug_name, dest_node, dest_plug,
+                       weak_link)
+            if link_to in source_plug.links_to:
+                self._update_exported_plugs(source_node, source_plug_name,
+                                            dest_node, dest_plug_name, -1)
+                source_plug.links_to.discard(link_to)
+                self._links_changes.append(
+                    (False, (source_node_name, source_plug_name,
+                             dest_node_name, dest_plug_name, weak_link)))
         dest_plug.links_from.discard((source_node_name, source_plug_name,
                                       source_node, source_plug, True))
         dest_plug.links_from.discard((source_node_name, source_plug_name,
@@ -1298,6 +1357,47 @@ class Pipeline(Process):
                         plugs_deactivated.append((plug_name, plug))
         return plugs_deactivated
 
+    def set_parameters(self, parameters):
+        """ Set several parameters of the pipeline at once.
+
+        Values are propagated along links as when parameters are set one by
+        one, but breadth-first and together: a plug reached from several
+        parameters, or several times through sub-pipelines levels, is set
+        (and its value validated) once per propagation round, with the last
+        value it received. Nodes and plugs activations are updated once, at
+        the end.
+
+        During the propagation, callbacks on pipeline parameters may see
+        downstream plugs which have not received their new value yet.
+
+        Parameters
+        ----------
+        parameters: dict
+            {parameter name: value}
+        """
+        if getattr(_propagation, 'pending', None) is not None:
+            # nested call: values are propagated by the outer one
+            for name, value in six.iteritems(parameters):
+                self.set_parameter(name, value)
+            return
+        self.delay_update_nodes_and_plugs_activation()
+        _propagation.pending = SortedDictionary()
+        try:
+            for name, value in six.iteritems(parameters):
+                self.set_parameter(name, value)
+            pending = _propagation.pending
+            while pending:
+                _propagation.pending = SortedDictionary()
+                for node, plug_name, value in six.itervalues(pending):
+                    try:
+                        node.set_plug_value(plug_name, value)
+                    except traits.TraitError:
+                        pass
+                pending = _propagation.pending
+        finally:
+            _propagation.pending = None
+            self.restore_update_nodes_and_plugs_activation()
+
     def delay_update_nodes_and_plugs_activation(self):
         if self.parent_pipeline is not None:
             # Only the top level pipeline can manage activations
@@ -1340,6 +1440,13 @@ class Pipeline(Process):
             debug = open(debug, 'w')
             print(self.id, file=debug)
 
+        # Remember nodes and plugs activations, in order to tell views what
+        # has changed (see at the end of this method)
+        previous_activations = [
+            (pipeline, node_name, node, node.activated,
+             [plug.activated for plug in six.itervalues(node.plugs)])
+            for pipeline, node_name, node in self._pipelines_nodes()]
+
         # Remember all links that are inactive (i.e. at least one of the two
         # plugs is inactive) in order to execute a callback if they become
         # active (see at the end of this method)
@@ -1453,13 +1560,54 @@ class Pipeline(Process):
                 value = node.get_plug_value(source_plug_name)
                 node._callbacks[(source_plug_name, n, pn)](value)
 
-        # Refresh views relying on plugs and nodes selection
+        # Refresh views relying on plugs and nodes selection, telling them
+        # what has changed
+        activation_changes = self._activation_changes(previous_activations)
         for node in self.all_nodes():
             if isinstance(node, PipelineNode):
-                node.process.selection_changed = True
+                pipeline = node.process
+                links_changes = pipeline._links_changes
+                pipeline._links_changes = []
+                pipeline.selection_changed = {
+                    'activation': activation_changes.get(id(pipeline), {}),
+                    'links': links_changes}
 
         self._disable_update_nodes_and_plugs_activation -= 1
 
+    def _pipelines_nodes(self):
+        """ Iterate over (pipeline, node_name, node) for the nodes of this
+        pipeline and of its sub-pipelines. A sub-pipeline node appears twice:
+        in its parent pipeline, and as the '' node of the sub-pipeline.
+        """
+        for node_name, node in six.iteritems(self.nodes):
+            yield self, node_name, node
+            if (isinstance(node, PipelineNode) and
+                    node is not self.pipeline_node):
+                for item in node.process._pipelines_nodes():
+                    yield item
+
+    @staticmethod
+    def _activation_changes(previous_activations):
+        """ Compare nodes and plugs activations with the ones recorded
+        before an activation step.
+
+        Returns
+        -------
+        changes: dict
+            {id(pipeline): {node_name: changed_plug_names}}
+        """
+        changes = {}
+        for pipeline, node_name, node, activated, plugs_activated \
+                in previous_activations:
+            changed_plugs = set(
+                plug_name for (plug_name, plug), plug_activated
+                in zip(six.iteritems(node.plugs), plugs_activated)
+                if plug.activated != plug_activated)
+            if changed_plugs or node.activated != activated:
+                changes.setdefault(id(pipeline), {})[node_name] \
+                    = changed_plugs
+        return changes
+
     def workflow_graph(self, remove_disabled_steps=True,
                        remove_disabled_nodes=True):
         """ Generate a workflow graph
@@ -1588,7 +1736,8 @@ class Pipeline(Process):
 
         return graph
 
-    def workflow_ordered_nodes(self, remove_disabled_steps=True):
+    def workflow_ordered_nodes(self, remove_disabled_steps=True,
+                               estimated_costs=None):
         """ Generate a workflow: list of process node to execute
 
         Returns
@@ -1599,12 +1748,39 @@ class Pipeline(Process):
             When set, disabled steps (and their children) will not be included
             in the workflow graph.
             Default: True
+        estimated_costs: dict (optional)
+            Estimated execution costs of processes, as returned by
+            :meth:`capsul.engine.history.ExecutionHistory.estimated_costs`
+            ({process_id: {'duration': seconds, ...}}). When given, among
+            the nodes that can be executed, the one with the longest
+            remaining path to the end of the pipeline is taken first
+            (critical path scheduling). Processes without estimate count
+            for one second.
         """
         # Create a graph and a list of graph node edges
         graph = self.workflow_graph(remove_disabled_steps)
 
+        def sort_graph(graph):
+            if estimated_costs is None:
+                return graph.topological_sort()
+            return graph.topological_sort(
+                graph.remaining_path_costs(graph_node_cost))
+
+        def graph_node_cost(gnode):
+            if isinstance(gnode.meta, list):
+                cost = 0.
+                for node in gnode.meta:
+                    process_id = getattr(getattr(node, 'process', node),
+                                         'id', None)
+                    cost += estimated_costs.get(process_id, {}).get(
+                        'duration', 1.)
+                return cost
+            # sub-pipeline: cost of its critical path
+            return max(list(gnode.meta.remaining_path_costs(
+                graph_node_cost).values()) or [0.])
+
         # Start the topologival sort
-        ordered_list = graph.topological_sort()
+        ordered_list = sort_graph(graph)
 
         def walk_workflow(wokflow, workflow_list):
             """ Recursive fonction to go through pipelines' graphs
@@ -1619,7 +1795,7 @@ class Pipeline(Process):
                 # Otherwise we need to call the topological sort in order to
                 # sort the graph and than flat the graph structure
                 else:
-                    flat_structure = sub_workflow[1].topological_sort()
+                    flat_structure = sort_graph(sub_workflow[1])
                     walk_workflow(flat_structure, workflow_list)
 
         # Generate the output workflow representation
@@ -1632,7 +1808,8 @@ class Pipeline(Process):
 
         return workflow_list
 
-    def _check_temporary_files_for_node(self, node, temp_files):
+    def _check_temporary_files_for_node(self, node, temp_files,
+                                        temp_directory=None):
         """ Check temporary outputs and allocate files for them.
 
         Temporary files or directories will be appended to the temp_files list,
@@ -1650,6 +1827,9 @@ class Pipeline(Process):
         temp_files: list
             list of temporary files for the pipeline execution. The list will
             be modified (completed).
+        temp_directory: str (optional)
+            directory where temporary files are created. Default: the
+            system temporary directory.
         """
         process = getattr(node, 'process', None)
         if process is not None and isinstance(process, NipypeProcess):
@@ -1680,8 +1860,7 @@ class Pipeline(Process):
                 continue
             # check that it is really temporary: not exported
             # to the main pipeline
-            if self.pipeline_node in [link[2]
-                                      for link in plug.links_to]:
+            if self._is_plug_exported(node, plug_name):
                 # it is visible out of the pipeline: not temporary
                 continue
             # if we get here, we are a temporary.
@@ -1691,7 +1870,8 @@ class Pipeline(Process):
                     tmpdirs = []
                     for i in range(len(value)):
                         if value[i] in ('', traits.Undefined):
-                            tmpdir = tempfile.mkdtemp(suffix='capsul_run')
+                            tmpdir = tempfile.mkdtemp(
+                                suffix='capsul_run', dir=temp_directory)
                             new_value.append(tmpdir)
                             tmpdirs.append(tmpdir)
                         else:
@@ -1707,7 +1887,8 @@ class Pipeline(Process):
                         suffix = 'capsul'
                     for i in range(len(value)):
                         if value[i] in ('', traits.Undefined):
-                            tmpfile = tempfile.mkstemp(suffix=suffix)
+                            tmpfile = tempfile.mkstemp(
+                                suffix=suffix, dir=temp_directory)
                             tmpfiles.append(tmpfile[1])
                             os.close(tmpfile[0])
                             new_value.append(tmpfile[1])
@@ -1717,7 +1898,8 @@ class Pipeline(Process):
                     temp_files.append((node, plug_name, tmpfiles, value))
             else:
                 if trait.trait_type is traits.Directory:
-                    tmpdir = tempfile.mkdtemp(suffix='capsul_run')
+                    tmpdir = tempfile.mkdtemp(suffix='capsul_run',
+                                              dir=temp_directory)
                     temp_files.append((node, plug_name, tmpdir, value))
                     node.set_plug_value(plug_name, tmpdir)
                 else:
@@ -1725,7 +1907,8 @@ class Pipeline(Process):
                         suffix = 'capsul' + trait.allowed_extensions[0]
                     else:
                         suffix = 'capsul'
-                    tmpfile = tempfile.mkstemp(suffix=suffix)
+                    tmpfile = tempfile.mkstemp(suffix=suffix,
+                                               dir=temp_directory)
                     node.set_plug_value(plug_name, tmpfile[1])
                     os.close(tmpfile[0])
                     temp_files.append((node, plug_name, tmpfile[1], value))
@@ -1739,26 +1922,34 @@ class Pipeline(Process):
         #
         for node, plug_name, tmpfiles, value in temp_files:
             node.set_plug_value(plug_name, value)
-            if not isinstance(tmpfiles, list):
-                tmpfiles = [tmpfiles]
-            for tmpfile in tmpfiles:
-                if os.path.isdir(tmpfile):
-                    try:
-                        shutil.rmtree(tmpfile)
-                    except:
-                        pass
-                else:
-                    try:
-                        os.unlink(tmpfile)
-                    except:
-                        pass
-                # handle additional files (.hdr, .minf...)
-                # TODO
-                if os.path.exists(tmpfile + '.minf'):
-                    try:
-                        os.unlink(tmpfile + '.minf')
-                    except:
-                        pass
+            self._remove_temporary_files(tmpfiles)
+
+    @staticmethod
+    def _remove_temporary_files(tmpfiles):
+        """ Delete temporary files or directories (a path or a list of
+        paths) allocated by _check_temporary_files_for_node(). Files which
+        do not exist any longer are ignored.
+        """
+        if not isinstance(tmpfiles, list):
+            tmpfiles = [tmpfiles]
+        for tmpfile in tmpfiles:
+            if os.path.isdir(tmpfile):
+                try:
+                    shutil.rmtree(tmpfile)
+                except:
+                    pass
+            else:
+                try:
+                    os.unlink(tmpfile)
+                except:
+                    pass
+            # handle additional files (.hdr, .minf...)
+            # TODO
+            if os.path.exists(tmpfile + '.minf'):
+                try:
+                    os.unlink(tmpfile + '.minf')
+                except:
+                    pass
 
     def _run_process(self):
         '''
@@ -1782,18 +1973,18 @@ class Pipeline(Process):
         """
         empty_params = []
         # walk all activated nodes, recursively
-        nodes = [(node_name, node)
-                 for node_name, node in six.iteritems(self.nodes)
-                 if node_name != '' and node.enabled and node.activated]
+        nodes = deque((node_name, node)
+                      for node_name, node in six.iteritems(self.nodes)
+                      if node_name != '' and node.enabled and node.activated)
         while nodes:
-            node_name, node = nodes.pop(0)
+            node_name, node = nodes.popleft()
             if hasattr(node, 'process'):
                 process = node.process
                 if isinstance(process, Pipeline):
-                    nodes += [(cnode_name, cnode)
+                    nodes.extend((cnode_name, cnode)
                         for cnode_name, cnode in six.iteritems(process.nodes)
                         if cnode_name != '' and cnode.enabled
-                        and cnode.activated]
+                        and cnode.activated)
             else:
                 process = node
             # check output plugs; input ones don't work with generated
@@ -1826,14 +2017,15 @@ class Pipeline(Process):
                     continue # non-null value: not an empty parameter.
                 optional = bool(parameter.optional)
                 valid = True
-                links = list(plug.links_from.union(plug.links_to))
+                links = deque(plug.links_from)
+                links.extend(plug.links_to)
                 if len(links) == 0:
                     if optional:
                         # an optional, non-connected output can stay empty
                         continue
                 # check where this plug is linked
                 while links:
-                    link = links.pop(0)
+                    link = links.popleft()
                     oplug = link[3]
                     if link[0] == '':
                         if link[2] == self.nodes['']:
@@ -1854,7 +2046,7 @@ class Pipeline(Process):
                         # needed only if this pipeline plug is used later,
                         # or mandatory
                         if oplug.optional:
-                            links += oplug.links_to
+                            links.extend(oplug.links_to)
                     optional &= bool(oplug.optional)
                 if valid:
                     empty_params.append((node, plug_name, optional))
@@ -1870,7 +2062,7 @@ class Pipeline(Process):
             links_count, enabled_nodes_count, enabled_procs_count,
             enabled_links_count)
         """
-        nodes = self.nodes.values()
+        nodes = deque(self.nodes.values())
         plugs_count = 0
         params_count = len([param
             for param_name, param in six.iteritems(self.user_traits())
@@ -1878,31 +2070,29 @@ class Pipeline(Process):
         nodes_count = 0
         links_count = 0
         procs = set()
-        nodeset = set()
+        # nodes already queued or counted
+        nodeset = set(nodes)
         enabled_nodes_count = 0
         enabled_procs_count = 0
         enabled_links_count = 0
         while nodes:
-            node = nodes.pop(0)
-            nodeset.add(node)
+            node = nodes.popleft()
             nodes_count += 1
             if node.enabled and node.activated:
                 enabled_nodes_count += 1
             plugs_count += len(node.plugs)
             links_count += sum([len(plug.links_to) + len(plug.links_from)
-                for plug in node.plugs.itervalues()])
+                for plug in six.itervalues(node.plugs)])
             enabled_links_count += sum(
                 [len([pend for pend in plug.links_to
                         if pend[3].enabled and pend[3].activated])
                     + len([pend for pend in plug.links_from
                         if pend[3].enabled and pend[3].activated])
-                    for plug in node.plugs.itervalues()
+                    for plug in six.itervalues(node.plugs)
                     if plug.enabled and plug.activated])
+            sub_nodes = []
             if hasattr(node, 'nodes'):
-                sub_nodes = [sub_node
-                    for sub_node in node.nodes.values()
-                    if sub_node not in nodeset and sub_node not in nodes]
-                nodes += sub_nodes
+                sub_nodes = node.nodes.values()
             elif hasattr(node, 'process'):
                 if node.process in procs:
                     continue
@@ -1915,16 +2105,17 @@ class Pipeline(Process):
                     if param_name not in (
                         'nodes_activation', 'selection_changed')])
                 if hasattr(node.process, 'nodes'):
-                    sub_nodes = [sub_node
-                        for sub_node in node.process.nodes.values()
-                        if sub_node not in nodeset and sub_node not in nodes]
-                    nodes += sub_nodes
+                    sub_nodes = node.process.nodes.values()
             elif hasattr(node, 'user_traits'):
                 params_count += len([param
                     for param_name, param in six.iteritems(node.user_traits())
                     if param_name not in (
                         'nodes_activation', 'selection_changed', 'activated',
                         'enabled', 'name')])
+            for sub_node in sub_nodes:
+                if sub_node not in nodeset:
+                    nodeset.add(sub_node)
+                    nodes.append(sub_node)
         return nodes_count, len(procs), plugs_count, params_count, \
             links_count, enabled_nodes_count, enabled_procs_count, \
             enabled_links_count
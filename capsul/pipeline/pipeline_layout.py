@@ -0,0 +1,320 @@
+'''
+Automatic layout of pipeline graphs, without external tools.
+
+Nodes are placed using a layered (Sugiyama-style) algorithm: the graph is
+made acyclic, nodes are assigned to layers (columns, from left to right,
+following links), long links are split through virtual nodes, then nodes
+orders inside layers are improved by barycenter sweeps to reduce links
+crossings. Intermediate layouts are yielded by :func:`iter_layered_layout`,
+so that a GUI may display them progressively while the layout runs in a
+thread.
+
+Computed layouts are cached per graph structure (see :func:`layout_key`).
+
+Functions
+=========
+:func:`pipeline_layout_graph`
+-----------------------------
+:func:`layout_key`
+------------------
+:func:`iter_layered_layout`
+---------------------------
+:func:`layered_layout`
+----------------------
+:func:`cached_layout`
+---------------------
+:func:`cache_layout`
+--------------------
+'''
+
+from __future__ import absolute_import
+
+import hashlib
+import threading
+
+import six
+
+from soma.sorted_dictionary import OrderedDict
+
+
+def pipeline_layout_graph(pipeline, include_io=True):
+    '''
+    Graph of the pipeline nodes, as used by the layout functions: one edge
+    between two given nodes, whatever the number of links between their
+    plugs. As in pipeline views, the pipeline inputs and outputs are the
+    "inputs" and "outputs" nodes.
+
+    Returns
+    -------
+    graph: tuple
+        (nodes, edges): nodes is a list of node names, edges a list of
+        (source_name, dest_name) tuples.
+    '''
+    nodes = []
+    edges = []
+    done = set()
+    main_node = pipeline.nodes['']
+    has_inputs = False
+    has_outputs = False
+    for plug in main_node.plugs.values():
+        if plug.output:
+            has_outputs = True
+        else:
+            has_inputs = True
+    if include_io and has_inputs:
+        nodes.append('inputs')
+    nodes += [name for name in pipeline.nodes if name != '']
+    if include_io and has_outputs:
+        nodes.append('outputs')
+    for node_name, node in six.iteritems(pipeline.nodes):
+        for plug in node.plugs.values():
+            for dest_node_name, _, dest_node, _, _ in plug.links_to:
+                if node_name == '':
+                    source = 'inputs'
+                else:
+                    source = node_name
+                if dest_node_name == '':
+                    dest = 'outputs'
+                else:
+                    dest = dest_node_name
+                if not include_io and ('' in (node_name, dest_node_name)):
+                    continue
+                if (source, dest) not in done and source != dest:
+                    done.add((source, dest))
+                    edges.append((source, dest))
+    return nodes, edges
+
+
+def layout_key(nodes, edges, nodes_sizes=None):
+    '''
+    Hash identifying a graph structure (and its nodes sizes) for the layout
+    cache.
+    '''
+    sizes = nodes_sizes or {}
+    desc = repr((sorted(nodes), sorted(edges),
+                 sorted((name, (int(round(size[0])), int(round(size[1]))))
+                        for name, size in six.iteritems(sizes))))
+    return hashlib.md5(desc.encode('utf-8')).hexdigest()
+
+
+def _make_acyclic(nodes, successors):
+    # reverse the back edges found by a depth-first search
+    reversed_edges = set()
+    state = {}
+    for root in nodes:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(successors[root]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if state.get(child) == 1:
+                    reversed_edges.add((node, child))
+                elif child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                state[node] = 2
+                stack.pop()
+    return reversed_edges
+
+
+def _assign_layers(nodes, edges):
+    # longest path layering, in topological order
+    predecessors = dict((node, []) for node in nodes)
+    successors = dict((node, []) for node in nodes)
+    for source, dest in edges:
+        successors[source].append(dest)
+        predecessors[dest].append(source)
+    count = dict((node, len(predecessors[node])) for node in nodes)
+    ready = [node for node in nodes if count[node] == 0]
+    layer = {}
+    while ready:
+        node = ready.pop(0)
+        layer[node] = max([layer[p] + 1 for p in predecessors[node]] or [0])
+        for child in successors[node]:
+            count[child] -= 1
+            if count[child] == 0:
+                ready.append(child)
+    return layer
+
+
+def _crossings(upper, lower, edges_down):
+    position = dict((node, i) for i, node in enumerate(lower))
+    segments = [(i, position[dest]) for i, node in enumerate(upper)
+                for dest in edges_down.get(node, ())]
+    crossings = 0
+    for n, (a1, b1) in enumerate(segments):
+        for a2, b2 in segments[n + 1:]:
+            if (a1 - a2) * (b1 - b2) < 0:
+                crossings += 1
+    return crossings
+
+
+def _coordinates(layers, sizes, layer_spacing, node_spacing):
+    positions = {}
+    x = 0.
+    columns = []
+    for layer in layers:
+        width = max([sizes[node][0] for node in layer] or [0.])
+        height = sum(sizes[node][1] for node in layer) \
+            + node_spacing * (len(layer) - 1)
+        columns.append((x, height))
+        x += width + layer_spacing
+    max_height = max([column[1] for column in columns] or [0.])
+    for layer, (x, height) in zip(layers, columns):
+        # center each layer vertically
+        y = (max_height - height) / 2.
+        for node in layer:
+            if not isinstance(node, tuple):
+                positions[node] = (x, y)
+            y += sizes[node][1] + node_spacing
+    return positions
+
+
+def iter_layered_layout(nodes, edges, nodes_sizes=None, layer_spacing=100.,
+                        node_spacing=30., sweeps=8,
+                        default_size=(150., 100.)):
+    '''
+    Layered layout of a directed graph, going from left to right.
+
+    This is a generator which yields successive layouts, improved after each
+    crossings reduction sweep. The last one is the final layout.
+
+    Parameters
+    ----------
+    nodes: list
+        node names
+    edges: list
+        (source, dest) node names tuples
+    nodes_sizes: dict (optional)
+        {node_name: (width, height)}
+    layer_spacing: float
+        horizontal space between layers
+    node_spacing: float
+        vertical space between nodes in a layer
+    sweeps: int
+        max number of crossings reduction sweeps
+    default_size: tuple
+        size of nodes not in nodes_sizes
+
+    Yields
+    ------
+    positions: dict
+        {node_name: (x, y)} top left corners of nodes
+    '''
+    nodes = list(nodes)
+    nodes_set = set(nodes)
+    edges = [(s, d) for s, d in edges
+             if s in nodes_set and d in nodes_set and s != d]
+    sizes = dict((node, tuple((nodes_sizes or {}).get(node, default_size)))
+                 for node in nodes)
+    successors = OrderedDict((node, []) for node in nodes)
+    for source, dest in edges:
+        successors[source].append(dest)
+    reversed_edges = _make_acyclic(nodes, successors)
+    dag_edges = set()
+    for edge in edges:
+        if edge in reversed_edges:
+            edge = (edge[1], edge[0])
+        dag_edges.add(edge)
+    index = dict((node, i) for i, node in enumerate(nodes))
+    dag_edges = sorted(dag_edges, key=lambda e: (index[e[0]], index[e[1]]))
+    layer_of = _assign_layers(nodes, dag_edges)
+
+    # split long edges through virtual nodes (tuples, which cannot be
+    # confused with node names)
+    nlayers = max(layer_of.values() or [0]) + 1
+    layers = [[] for i in range(nlayers)]
+    for node in nodes:
+        layers[layer_of[node]].append(node)
+    edges_down = {}
+    edges_up = {}
+    for source, dest in dag_edges:
+        chain = [source]
+        for l in range(layer_of[source] + 1, layer_of[dest]):
+            virtual = (source, dest, l)
+            sizes[virtual] = (0., 0.)
+            layers[l].append(virtual)
+            chain.append(virtual)
+        chain.append(dest)
+        for upper, lower in zip(chain[:-1], chain[1:]):
+            edges_down.setdefault(upper, []).append(lower)
+            edges_up.setdefault(lower, []).append(upper)
+
+    def total_crossings(layers):
+        return sum(_crossings(layers[i], layers[i + 1], edges_down)
+                   for i in range(len(layers) - 1))
+
+    best = [list(layer) for layer in layers]
+    best_crossings = total_crossings(best)
+    yield _coordinates(best, sizes, layer_spacing, node_spacing)
+
+    for sweep in range(sweeps):
+        if best_crossings == 0:
+            break
+        if sweep % 2 == 0:
+            order = range(1, nlayers)
+            neighbors = edges_up
+            fixed_offset = -1
+        else:
+            order = range(nlayers - 2, -1, -1)
+            neighbors = edges_down
+            fixed_offset = 1
+        for l in order:
+            fixed = dict((node, i)
+                         for i, node in enumerate(layers[l + fixed_offset]))
+            current = dict((node, i) for i, node in enumerate(layers[l]))
+
+            def barycenter(node):
+                linked = [fixed[n] for n in neighbors.get(node, ())
+                          if n in fixed]
+                if not linked:
+                    return current[node]
+                return float(sum(linked)) / len(linked)
+
+            layers[l].sort(key=lambda node: (barycenter(node), current[node]))
+        crossings = total_crossings(layers)
+        if crossings < best_crossings:
+            best = [list(layer) for layer in layers]
+            best_crossings = crossings
+            yield _coordinates(best, sizes, layer_spacing, node_spacing)
+
+
+def layered_layout(nodes, edges, nodes_sizes=None, **kwargs):
+    '''
+    Final layout of :func:`iter_layered_layout`, with the same parameters.
+    '''
+    positions = {}
+    for positions in iter_layered_layout(nodes, edges, nodes_sizes,
+                                         **kwargs):
+        pass
+    return positions
+
+
+_layout_cache = OrderedDict()
+_layout_cache_lock = threading.Lock()
+_layout_cache_size = 32
+
+
+def cached_layout(key):
+    '''
+    Layout stored for the given :func:`layout_key`, or None
+    '''
+    with _layout_cache_lock:
+        return _layout_cache.get(key)
+
+
+def cache_layout(key, positions):
+    '''
+    Store a layout for the given :func:`layout_key`. The cache keeps the
+    most recent layouts only.
+    '''
+    with _layout_cache_lock:
+        if key in _layout_cache:
+            del _layout_cache[key]
+        _layout_cache[key] = positions
+        while len(_layout_cache) > _layout_cache_size:
+            del _layout_cache[list(_layout_cache.keys())[0]]
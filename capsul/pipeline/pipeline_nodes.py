@@ -20,8 +20,11 @@ Classes
 from __future__ import print_function
 
 # System import
+import inspect
 import logging
 import six
+import threading
+import weakref
 
 # Define the logger
 logger = logging.getLogger(__name__)
@@ -45,10 +48,56 @@ from soma.sorted_dictionary import SortedDictionary
 from soma.utils.functiontools import SomaPartial
 from soma.utils.weak_proxy import weak_proxy, get_ref
 
+# Pending values propagations along links, while parameters are set in a
+# batch (see :meth:`capsul.pipeline.pipeline.Pipeline.set_parameters`):
+# _propagation.pending is a dict {(id(dest_node), dest_plug_name):
+# (dest_node, dest_plug_name, value)}
+_propagation = threading.local()
+
+def _remove_keys(dictionary, keys):
+    # remove several keys from a dict, in linear time for SortedDictionary
+    # (whose item removal is linear)
+    if isinstance(dictionary, SortedDictionary):
+        removed = set(keys)
+        for key in keys:
+            dict.pop(dictionary, key, None)
+        dictionary.sortedKeys = [key for key in dictionary.sortedKeys
+                                 if key not in removed]
+    else:
+        for key in keys:
+            dictionary.pop(key, None)
+
+
+def _plug_flag(name, mask, doc):
+    # property storing a boolean attribute of Plug as a bit of its flags
+
+    def get_flag(self):
+        return bool(self._flags & mask)
+
+    def set_flag(self, value):
+        old_value = bool(self._flags & mask)
+        value = bool(value)
+        if value == old_value:
+            return
+        if value:
+            self._flags |= mask
+        else:
+            self._flags &= ~mask
+        if self._callbacks:
+            self._notify(name, old_value, value)
+
+    return property(get_flag, set_flag, doc=doc)
 
-class Plug(Controller):
+
+class Plug(object):
     """ Overload of the traits in oder to keep the pipeline memory.
 
+    Pipelines may contain tens of thousands of plugs, so plugs are
+    lightweight objects: their boolean attributes are stored as bits of a
+    single integer, and they are not :class:`~soma.controller.Controller`
+    instances any longer. They still support :meth:`on_trait_change` for
+    their boolean attributes.
+
     Attributes
     ----------
     enabled : bool
@@ -61,21 +110,50 @@ class Plug(Controller):
         parameter to create an optional Plug
     has_default_value : bool
         indicate if a value is available for that plug even if its not linked
+    hidden : bool
+        internal plug, which GUIs do not display
     links_to : set (node_name, plug_name, node, plug, is_weak)
         the successor plugs of this  plug
     links_from : set (node_name, plug_name, node, plug, is_weak)
         the predecessor plugs of this plug
     """
-    enabled = Bool(default_value=True)
-    activated = Bool(default_value=False)
-    output = Bool(default_value=False)
-    optional = Bool(default_value=False)
-
-    def __init__(self, **kwargs):
+    __slots__ = ('name', 'links_to', 'links_from', '_flags', '_callbacks',
+                 '__weakref__')
+
+    _ENABLED = 1
+    _ACTIVATED = 2
+    _OUTPUT = 4
+    _OPTIONAL = 8
+    _HAS_DEFAULT_VALUE = 16
+    _HIDDEN = 32
+
+    enabled = _plug_flag('enabled', _ENABLED,
+                         'user parameter to control the plug activation')
+    activated = _plug_flag('activated', _ACTIVATED,
+                           'parameter describing the Plug status')
+    output = _plug_flag('output', _OUTPUT,
+                        'parameter to set the Plug type (input or output)')
+    optional = _plug_flag('optional', _OPTIONAL,
+                          'parameter to create an optional Plug')
+    has_default_value = _plug_flag(
+        'has_default_value', _HAS_DEFAULT_VALUE,
+        'indicate if a value is available for that plug even if its not '
+        'linked')
+    hidden = _plug_flag('hidden', _HIDDEN,
+                        'internal plug, which GUIs do not display')
+
+    def __init__(self, name=None, enabled=True, activated=False,
+                 output=False, optional=False):
         """ Generate a Plug, i.e. a trait with the memory of the
         pipeline adjacent nodes.
         """
-        super(Plug, self).__init__(**kwargs)
+        self.name = name
+        self._flags = 0
+        self._callbacks = None
+        self.enabled = enabled
+        self.activated = activated
+        self.output = output
+        self.optional = optional
         # The links correspond to edges in the graph theory
         # links_to = successor
         # links_from = predecessor
@@ -86,6 +164,101 @@ class Plug(Controller):
         # parameter in Pipeline.add_process
         self.has_default_value = False
 
+    def on_trait_change(self, handler, name=None, remove=False):
+        """ Add or remove a callback called when a plug attribute changes,
+        like :meth:`traits.api.HasTraits.on_trait_change`. Bound methods
+        are referenced weakly.
+
+        Parameters
+        ----------
+        handler: callable
+            called with 0 to 4 arguments: (object, name, old value, new
+            value), or its last items
+        name: str or list
+            attribute(s) names. None means all attributes.
+        remove: bool
+            if True, remove the callback
+        """
+        if name is None or isinstance(name, six.string_types):
+            names = [name]
+        else:
+            names = list(name)
+        if remove:
+            if not self._callbacks:
+                return
+            for name in names:
+                self._callbacks = [
+                    callback for callback in self._callbacks
+                    if callback[0] != name
+                        or not _same_handler(callback, handler)]
+            return
+        if hasattr(handler, '__self__') \
+                and getattr(handler, '__self__', None) is not None:
+            function = (weakref.ref(handler.__self__), handler.__func__)
+        else:
+            function = (None, handler)
+        nargs = _handler_args_count(handler)
+        if self._callbacks is None:
+            self._callbacks = []
+        for name in names:
+            self._callbacks.append((name, function, nargs))
+
+    def _notify(self, name, old_value, value):
+        args = (self, name, old_value, value)
+        for callback in list(self._callbacks):
+            cb_name, (obj_ref, function), nargs = callback
+            if cb_name is not None and cb_name != name:
+                continue
+            if obj_ref is None:
+                function(*args[4 - nargs:])
+            else:
+                obj = obj_ref()
+                if obj is None:
+                    # dead object: drop the callback
+                    self._callbacks.remove(callback)
+                    continue
+                function(obj, *args[4 - nargs:])
+
+    def __getstate__(self):
+        # callbacks are not copied, as with traits
+        return (self.name, self._flags, self.links_to, self.links_from)
+
+    def __setstate__(self, state):
+        self.name, self._flags, self.links_to, self.links_from = state
+        self._callbacks = None
+
+
+def _same_handler(callback, handler):
+    obj_ref, function = callback[1]
+    if obj_ref is None:
+        return function == handler
+    return obj_ref() is getattr(handler, '__self__', None) \
+        and function == getattr(handler, '__func__', None)
+
+
+def _handler_args_count(handler):
+    # number of arguments a trait change handler expects, as traits does
+    if hasattr(handler, '__func__'):
+        function = handler.__func__
+        skip = 1
+    elif inspect.isfunction(handler):
+        function = handler
+        skip = 0
+    else:
+        function = getattr(handler, '__call__', handler)
+        skip = 1 if hasattr(function, '__self__') else 0
+        function = getattr(function, '__func__', function)
+    try:
+        if six.PY2:
+            spec = inspect.getargspec(function)
+        else:
+            spec = inspect.getfullargspec(function)
+    except TypeError:
+        return 4
+    if spec.varargs is not None:
+        return 4
+    return min(4, max(0, len(spec.args) - skip))
+
 
 class Node(Controller):
     """ Basic Node structure of the pipeline that need to be tuned.
@@ -218,6 +391,14 @@ class Node(Controller):
                         value):
         """ Spread the source plug value to the destination plug.
         """
+        pending = getattr(_propagation, 'pending', None)
+        if pending is not None:
+            # batch mode: the value is set later, only once if several
+            # sources write it
+            dest_node = get_ref(dest_node)
+            pending[(id(dest_node), dest_plug_name)] \
+                = (dest_node, dest_plug_name, value)
+            return
         try:
             dest_node.set_plug_value(dest_plug_name, value)
         except traits.TraitError:
@@ -415,6 +596,94 @@ class Node(Controller):
         """
         return self.trait(trait_name)
 
+    def _resize_numbered_plugs(self, name_pattern, old_count, new_count,
+                               trait, output):
+        """ Add or remove a series of numbered plugs in a single operation.
+
+        Nodes with a variable number of parameters (map / reduce nodes) name
+        them after a pattern: ``name_pattern % i``. Plugs and traits
+        ``old_count`` to ``new_count - 1`` are added, or plugs ``new_count``
+        to ``old_count - 1`` are removed with their links. Added traits are
+        copies of a single clone of ``trait``, and removals are performed in
+        bulk, so that resizing does not grow quadratically with the number of
+        plugs.
+
+        The ``user_traits_changed`` event is not fired: the caller fires it
+        once when all series are resized. This is why Controller.add_trait()
+        and remove_trait() are not used: this method updates the Controller
+        state (``_user_traits``, optional parameter, default value) as they
+        do, and must be kept in sync with them (see
+        ``capsul/pipeline/test/test_numbered_plugs.py``).
+
+        Parameters
+        ----------
+        name_pattern: str (mandatory)
+            plugs names pattern, containing a ``"%d"``
+        old_count: int (mandatory)
+            current number of plugs in the series
+        new_count: int (mandatory)
+            new number of plugs
+        trait: trait (mandatory)
+            trait type of the plugs
+        output: bool (mandatory)
+            type of plugs (input or output)
+        """
+        if new_count < old_count:
+            names = [name_pattern % i
+                     for i in range(old_count - 1, new_count - 1, -1)]
+            for name in names:
+                plug = self.plugs.get(name)
+                if plug is None:
+                    continue
+                # remove links to this plug
+                links = [(self, name, link[2], link[1])
+                         for link in plug.links_to]
+                links += [(link[2], link[1], self, name)
+                          for link in plug.links_from]
+                for link in links:
+                    self.pipeline.remove_link(link)
+            _remove_keys(self.plugs, names)
+            _remove_keys(self._user_traits, names)
+            for name in names:
+                traits.HasTraits.remove_trait(self, name)
+            return
+
+        trait_template = None
+        for i in range(old_count, new_count):
+            name = name_pattern % i
+            if trait_template is None:
+                # the trait and its default value are checked once, as in
+                # Controller.add_trait(), copies are then added as they are
+                traits.HasTraits.add_trait(
+                    self, name,
+                    self.checked_trait(
+                        self._clone_trait(trait, {'output': output,
+                                                  'optional': True})))
+                trait_template = self.trait(name)
+                self._user_traits[name] = trait_template
+                self._propagate_optional_parameter(trait_template)
+                try:
+                    values = (getattr(self, name), traits.Undefined, None,
+                              '', 0)
+                except traits.TraitError:
+                    values = (traits.Undefined, None, '', 0)
+                for value in values:
+                    try:
+                        setattr(self, name, value)
+                        break
+                    except (traits.TraitError, TypeError):
+                        pass
+            else:
+                new_trait = traits.CTrait(0)
+                new_trait.clone(trait_template)
+                new_trait.__dict__ = trait_template.__dict__.copy()
+                traits.HasTraits.add_trait(self, name, new_trait)
+                self._user_traits[name] = self.trait(name)
+            plug = Plug(name=name, optional=True, output=output)
+            self.plugs[name] = plug
+            plug.on_trait_change(
+                self.pipeline.update_nodes_and_plugs_activation, "enabled")
+
     def get_connections_through(self, plug_name, single=False):
         """ If the node has internal links (inside a pipeline, or in a switch
         or other custom connection node), return the "other side" of the
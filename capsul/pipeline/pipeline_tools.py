@@ -21,6 +21,12 @@ Functions
 -----------------------------------
 :func:`nodes_with_missing_inputs`
 ---------------------------------
+:func:`stale_process_nodes`
+---------------------------
+:func:`out_of_date_nodes`
+-------------------------
+:func:`record_file_checksums`
+-----------------------------
 :func:`where_is_plug_value_from`
 --------------------------------
 :func:`dump_pipeline_state_as_dict`
@@ -49,6 +55,7 @@ import soma.subprocess
 import six
 import sys
 import json
+from collections import deque
 from datetime import date, time, datetime
 import io
 
@@ -66,6 +73,7 @@ from capsul.pipeline.pipeline import Pipeline, PipelineNode, Switch, \
     ProcessNode, OptionalOutputSwitch
 from capsul.pipeline.process_iteration import ProcessIteration
 from soma.controller import Controller
+from soma.sorted_dictionary import OrderedDict
 
 if sys.version_info[0] >= 3:
     basestring = str
@@ -796,6 +804,251 @@ def nodes_with_missing_inputs(pipeline, recursive=True):
     return selected_nodes
 
 
+def _file_plug_values(process, plug_names):
+    # (param_name, file_name) input and output pairs of a process
+    inputs = []
+    outputs = []
+    for plug_name in plug_names:
+        trait = process.trait(plug_name)
+        if trait is None:
+            continue
+        trait_type = trait.trait_type
+        if isinstance(trait_type, traits.List):
+            inner_traits = trait.inner_traits
+            if not inner_traits:
+                continue
+            trait_type = inner_traits[0].trait_type
+        if not isinstance(trait_type, (traits.File, traits.Directory)):
+            continue
+        value = getattr(process, plug_name)
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        values = [item for item in value
+                  if isinstance(item, basestring) and item]
+        if trait.output:
+            outputs += [(plug_name, item) for item in values]
+        else:
+            inputs += [(plug_name, item) for item in values]
+    # input/output files are inputs
+    input_files = set(item[1] for item in inputs)
+    outputs = [item for item in outputs if item[1] not in input_files]
+    return inputs, outputs
+
+
+def _input_unchanged(filename, checksums):
+    # checksums entries: [size, mtime, md5]
+    from capsul.utils.file_utils import file_checksum
+
+    entry = checksums.get(filename)
+    if entry is None:
+        return False
+    stat = os.stat(filename)
+    if stat.st_size != entry[0]:
+        return False
+    if stat.st_mtime != entry[1]:
+        if os.path.isdir(filename) or file_checksum(filename) != entry[2]:
+            return False
+        # same contents: avoid computing the checksum next time
+        entry[1] = stat.st_mtime
+    return True
+
+
+def stale_process_nodes(nodes, dependencies, checksums=None,
+                        temporaries=None):
+    '''
+    Make-like up-to-date analysis of process nodes (see
+    :func:`out_of_date_nodes`).
+
+    Parameters
+    ----------
+    nodes: list
+        process nodes (or processes)
+    dependencies: set
+        set of (node, successor_node) tuples
+    checksums: dict (optional)
+        file checksums recorded by :func:`record_file_checksums`. Input files
+        newer than outputs, but with unchanged contents, do not make nodes
+        stale. Entries may be updated.
+    temporaries: set (optional)
+        temporary files allocated for the run. They are not compared, but a
+        stale node makes the producers of its temporary inputs stale, since
+        temporaries do not persist between runs.
+
+    Returns
+    -------
+    stale_nodes: OrderedDict
+        keys: stale nodes, in dependencies order
+        values: list of pairs (param_name, file_name) which make the node
+        stale: missing outputs, and inputs newer than outputs or produced by
+        a stale node. The list is empty for nodes which do not have output
+        files, which are always stale, and for nodes which are stale because
+        of a non-file dependency or of their temporary outputs.
+    '''
+    if temporaries is None:
+        temporaries = set()
+    successors = dict((node, []) for node in nodes)
+    predecessors_count = dict((node, 0) for node in nodes)
+    for source, dest in dependencies:
+        if source in successors and dest in successors:
+            successors[source].append(dest)
+            predecessors_count[dest] += 1
+    # topological order
+    ordered_nodes = []
+    todo = deque(node for node in nodes if predecessors_count[node] == 0)
+    while todo:
+        node = todo.popleft()
+        ordered_nodes.append(node)
+        for successor in successors[node]:
+            predecessors_count[successor] -= 1
+            if predecessors_count[successor] == 0:
+                todo.append(successor)
+    files = {}
+    temp_producers = {}
+    for node in ordered_nodes:
+        process = getattr(node, 'process', node)
+        plug_names = getattr(node, 'plugs', None)
+        if plug_names is None:
+            plug_names = process.user_traits()
+        files[node] = _file_plug_values(process, plug_names)
+        for item in files[node][1]:
+            if item[1] in temporaries:
+                temp_producers[item[1]] = node
+
+    # nodes which must run to produce temporaries of stale nodes
+    forced = set()
+    while True:
+        stale_nodes = OrderedDict()
+        # output files of stale nodes, which make their consumers stale
+        stale_files = set()
+        # stale nodes which make their successors stale
+        propagating = set(forced)
+        for node in ordered_nodes:
+            inputs, outputs = files[node]
+            if not outputs:
+                # nothing to compare: the node has to run
+                stale_nodes[node] = []
+                continue
+            reasons = [item for item in inputs if item[1] in stale_files]
+            persistent = [item for item in outputs
+                          if item[1] not in temporaries]
+            missing = [item for item in persistent
+                       if not os.path.exists(item[1])]
+            reasons += missing
+            if persistent and not missing:
+                oldest_output = min(os.stat(item[1]).st_mtime
+                                    for item in persistent)
+                for item in inputs:
+                    if item[1] not in temporaries \
+                            and item[1] not in stale_files \
+                            and os.path.exists(item[1]) \
+                            and os.stat(item[1]).st_mtime > oldest_output \
+                            and (checksums is None
+                                 or not _input_unchanged(item[1],
+                                                         checksums)):
+                        reasons.append(item)
+            if reasons or node in propagating:
+                stale_nodes[node] = reasons
+                stale_files.update(item[1] for item in outputs)
+                propagating.update(successors[node])
+        new_forced = set()
+        for node in stale_nodes:
+            for item in files[node][0]:
+                producer = temp_producers.get(item[1])
+                if producer is not None and producer not in stale_nodes:
+                    new_forced.add(producer)
+        if not new_forced:
+            return stale_nodes
+        forced.update(new_forced)
+
+
+def out_of_date_nodes(pipeline, checksums=None):
+    '''
+    Checks which process nodes of a pipeline need to run, the way make does.
+    A node is out of date when one of its output files is missing, when one
+    of its input files is newer than its oldest output file, or when one of
+    the nodes it depends on (in the pipeline workflow graph) is out of date.
+    Nodes without output files are always out of date.
+
+    With file checksums recorded by :func:`record_file_checksums` after the
+    previous run, input files which have been modified but have the same
+    contents do not make nodes out of date.
+
+    Only enabled and active nodes, which are not in disabled runtime steps,
+    are checked. Sub-pipelines are parsed recursively.
+
+    Parameters
+    ----------
+    pipeline: Pipeline (mandatory)
+        pipeline to check
+    checksums: dict (optional)
+        file checksums. Entries may be updated.
+
+    Returns
+    -------
+    selected_nodes: OrderedDict
+        keys: node names (including their parent pipelines names, see
+        :attr:`~capsul.process.process.Process.context_name`), in execution
+        order
+        values: list of pairs (param_name, file_name) which make the node
+        out of date
+    '''
+    from capsul.pipeline.topological_sort import flatten_workflow_graph
+
+    if isinstance(pipeline, Pipeline):
+        nodes, dependencies = flatten_workflow_graph(
+            pipeline.workflow_graph())
+    else:
+        nodes, dependencies = [pipeline], set()
+    selected_nodes = OrderedDict()
+    for node, reasons in six.iteritems(stale_process_nodes(
+            nodes, dependencies, checksums)):
+        process = getattr(node, 'process', node)
+        node_name = getattr(process, 'context_name', None) or node.name
+        selected_nodes[node_name] = reasons
+    return selected_nodes
+
+
+def record_file_checksums(pipeline, checksums=None):
+    '''
+    Record the checksums of the input files of the process nodes of a
+    pipeline, after it has run, for later use by :func:`out_of_date_nodes`.
+    Checksums are generally saved in a JSON file between runs.
+
+    Parameters
+    ----------
+    pipeline: Pipeline or Process (mandatory)
+        pipeline to record input files of
+    checksums: dict (optional)
+        checksums dict to update
+
+    Returns
+    -------
+    checksums: dict
+        keys: file names
+        values: [size, modification time, MD5 checksum] lists
+    '''
+    from capsul.pipeline.topological_sort import flatten_workflow_graph
+    from capsul.utils.file_utils import file_checksum
+
+    if checksums is None:
+        checksums = {}
+    if isinstance(pipeline, Pipeline):
+        nodes = flatten_workflow_graph(pipeline.workflow_graph())[0]
+    else:
+        nodes = [pipeline]
+    for node in nodes:
+        process = getattr(node, 'process', node)
+        plug_names = getattr(node, 'plugs', None)
+        if plug_names is None:
+            plug_names = process.user_traits()
+        for plug_name, filename in _file_plug_values(process, plug_names)[0]:
+            if os.path.isfile(filename):
+                stat = os.stat(filename)
+                checksums[filename] = [stat.st_size, stat.st_mtime,
+                                       file_checksum(filename)]
+    return checksums
+
+
 def where_is_plug_value_from(plug, recursive=True):
     '''
     Find where the given (input) plug takes its value from.
@@ -5,6 +5,20 @@ Standard use case::
     workflow = workflow_from_pipeline(pipeline)
     controller, wf_id = workflow_run(workflow_name, workflow, study_config)
 
+To re-submit a pipeline after some of its parameters have been edited,
+a :class:`WorkflowBuildCache` may be used to rebuild only the jobs which
+have changed::
+
+    cache = WorkflowBuildCache()
+    workflow = workflow_from_pipeline(pipeline, build_cache=cache)
+    pipeline.nodes['smoothing'].process.fwhm = 8.
+    workflow = workflow_from_pipeline(pipeline, build_cache=cache)
+
+Classes
+=======
+:class:`WorkflowBuildCache`
+---------------------------
+
 Functions
 =========
 :func:`workflow_from_pipeline`
@@ -25,8 +39,10 @@ import soma_workflow.info as swinfo
 
 from capsul.pipeline.pipeline import Pipeline, Switch, PipelineNode
 from capsul.pipeline import pipeline_tools
+from capsul.pipeline.compact_workflow import WorkflowWriter
 from capsul.process.process import Process
-from capsul.pipeline.topological_sort import Graph
+from capsul.process.resources import get_requirements
+from capsul.pipeline.topological_sort import Graph, longest_remaining_paths
 from traits.api import Directory, Undefined, File, Str, Any, List
 from soma.sorted_dictionary import OrderedDict
 from .process_iteration import ProcessIteration
@@ -45,8 +61,126 @@ else:
         return container.values()
 
 
+class WorkflowBuildCache(object):
+    """ Jobs and temporary paths kept between successive calls to
+    :func:`workflow_from_pipeline` on the same pipeline, to rebuild only the
+    jobs which have changed since the previous call.
+
+    Each job is stored with a fingerprint of its process: parameters
+    values, job name, priority, pipeline step, resources requirements,
+    native specification and parallel job info. On the next build, a job
+    whose fingerprint is unchanged is reused as is, other jobs are rebuilt.
+    Nodes which are activated, deactivated or belong to a disabled step
+    change the set of jobs in the workflow: jobs which are not used any
+    longer are dropped from the cache.
+
+    Temporary paths assigned to the same parameter of the same process
+    are the same soma-workflow TemporaryPath objects from one build to the
+    next, so that reused jobs and rebuilt jobs stay connected. Jobs
+    involved in file transfers are always rebuilt.
+
+    State which is not held in process parameters (the study configuration
+    for instance) is not part of fingerprints: :meth:`clear` has to be
+    called after it is modified.
+
+    Attributes
+    ----------
+    workflow: Workflow
+        the last built workflow
+    built_jobs: int
+        number of jobs (re)built during the last build
+    reused_jobs: int
+        number of jobs reused during the last build
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """ Forget all jobs, so that the next build is a complete one.
+        """
+        # {id(process): (process, {fingerprint: job})}
+        self.jobs = {}
+        # {(id(process), plug_name, index): (process, key, TemporaryPath)}
+        self.temporary_paths = {}
+        self.shared_map = {}
+        self.shared_paths = None
+        self.workflow = None
+        self.built_jobs = 0
+        self.reused_jobs = 0
+        self._used_jobs = set()
+        self._used_temporary_paths = set()
+
+    def start_build(self, shared_paths):
+        if shared_paths != self.shared_paths:
+            # shared resource paths are part of jobs commandlines
+            self.clear()
+            self.shared_paths = shared_paths
+        self.built_jobs = 0
+        self.reused_jobs = 0
+        self._used_jobs = set()
+        self._used_temporary_paths = set()
+
+    def end_build(self, workflow):
+        self.workflow = workflow
+        used = self._used_jobs
+        for pid, (process, jobs) in list(self.jobs.items()):
+            for fingerprint, job in list(jobs.items()):
+                if job not in used:
+                    del jobs[fingerprint]
+            if not jobs:
+                del self.jobs[pid]
+        for key in list(self.temporary_paths):
+            if key not in self._used_temporary_paths:
+                del self.temporary_paths[key]
+        self._used_jobs = set()
+        self._used_temporary_paths = set()
+
+    def temporary_path(self, process, plug_name, index, is_directory, suffix,
+                       name):
+        """ Return the TemporaryPath assigned to a parameter (or list
+        element) of a process during the previous build, or a new one.
+        """
+        key = (id(process), plug_name, index)
+        tmp_key = (is_directory, suffix)
+        entry = self.temporary_paths.get(key)
+        if entry is None or entry[0] is not process or entry[1] != tmp_key:
+            entry = (process, tmp_key,
+                     swclient.TemporaryPath(is_directory=is_directory,
+                                            suffix=suffix, name=name))
+            self.temporary_paths[key] = entry
+        self._used_temporary_paths.add(key)
+        return entry[2]
+
+    def job(self, process, fingerprint):
+        """ Return the job built for a process with the given fingerprint, or
+        None if there is no such job (or if it is already used in the
+        current build, which happens for iterations).
+        """
+        entry = self.jobs.get(id(process))
+        if entry is None or entry[0] is not process:
+            return None
+        job = entry[1].get(fingerprint)
+        if job is None or job in self._used_jobs:
+            return None
+        self._used_jobs.add(job)
+        self.reused_jobs += 1
+        return job
+
+    def store_job(self, process, fingerprint, job):
+        entry = self.jobs.get(id(process))
+        if entry is None or entry[0] is not process:
+            entry = (process, {})
+            self.jobs[id(process)] = entry
+        entry[1][fingerprint] = job
+        self._used_jobs.add(job)
+        self.built_jobs += 1
+
+
 def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
-                           jobs_priority=0, create_directories=True):
+                           jobs_priority=0, create_directories=True,
+                           estimated_costs=None, build_cache=None,
+                           fuse_jobs_below=None, output_file=None):
     """ Create a soma-workflow workflow from a Capsul Pipeline
 
     Parameters
@@ -70,11 +204,42 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
     create_directories: bool (optional, default: True)
         if set, needed output directories (which will contain output files)
         will be created in a first job, which all other ones depend on.
+    estimated_costs: dict (optional)
+        estimated execution costs of processes, as returned by
+        :meth:`capsul.engine.history.ExecutionHistory.estimated_costs`
+        ({process_id: {'duration': seconds, 'peak_rss': bytes, ...}}).
+        If given, each job priority is increased by the estimated duration
+        (in seconds) of the longest path from this job to the end of the
+        workflow, so that soma-workflow starts the critical path first.
+        Estimates are also stored in the ``estimated_duration`` and
+        ``estimated_memory`` attributes of jobs.
+    build_cache: WorkflowBuildCache (optional)
+        if given, jobs of the previous build using the same cache, whose
+        processes have not changed, are reused instead of being built
+        again. The cache is updated with the new jobs.
+    fuse_jobs_below: float (optional)
+        if given with estimated_costs, linear chains of Python process jobs
+        (each job being the only successor of the previous one and the only
+        predecessor of the next one) whose estimated durations are all
+        below this value (in seconds) are merged into a single job, which
+        runs the processes one after the other in the same Python
+        interpreter. Temporary files produced and used only within such a
+        chain are written in a local temporary directory of the computing
+        node.
+    output_file: str (optional)
+        if given, the workflow is written in this file, in the format of
+        :mod:`capsul.pipeline.compact_workflow`, instead of being returned:
+        each job is written as soon as it is built, and is not kept in
+        memory afterwards. Jobs, groups, dependencies and links are then
+        designated by the numbers given by the
+        :class:`~capsul.pipeline.compact_workflow.WorkflowWriter`. This
+        mode cannot be used with estimated_costs or build_cache, which
+        need all the jobs.
 
     Returns
     -------
     workflow: Workflow
-        a soma-workflow workflow
+        a soma-workflow workflow, or the output_file name if it is given
     """
 
     class TempFile(str):
@@ -172,9 +337,42 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                 return item
         return None
 
+    def _job_fingerprint(process, temp_map, transfers, forbidden_temp,
+                         name, priority, step_name, node):
+        """ Fingerprint of everything build_job() uses to build the job of
+        a process, or None if the job cannot be reused.
+        """
+        if process in transfers[0] or process in transfers[1]:
+            # FileTransfer objects are not kept between builds
+            return None
+
+        def value_key(value):
+            if isinstance(value, TempFile):
+                # temp_map values are rebuilt on each build, but their
+                # TemporaryPath is the one kept in build_cache
+                return ('<temp>', id(temp_map[value][0]), value.pattern,
+                        value in forbidden_temp)
+            if isinstance(value, (list, tuple, set)):
+                return (type(value).__name__,
+                        [value_key(item) for item in value])
+            if isinstance(value, dict):
+                return ('dict', sorted((repr(k), value_key(v))
+                                       for k, v in six.iteritems(value)))
+            return value
+
+        params = [(param_name, value_key(getattr(process, param_name)))
+                  for param_name in sorted(process.user_traits())]
+        return repr((type(process).__module__, type(process).__name__,
+                     name, priority, step_name,
+                     get_requirements(node if node is not None
+                                      else process),
+                     getattr(process, 'native_specification', None),
+                     getattr(process, 'parallel_job_info', None),
+                     params))
+
     def build_job(process, temp_map={}, shared_map={}, transfers=[{}, {}],
                   shared_paths={}, forbidden_temp=set(), name='', priority=0,
-                  step_name=''):
+                  step_name='', node=None):
         """ Create a soma-workflow Job from a Capsul Process
 
         Parameters
@@ -198,6 +396,9 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
             priority assigned to the job
         step_name: str (optional)
             the step name will be stored in the job user_storage variable
+        node: Node (optional)
+            the pipeline node containing the process. Its resources
+            requirements, if any, override the process ones.
 
         Returns
         -------
@@ -287,6 +488,16 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         if not job_name:
             job_name = process.name
 
+        fingerprint = None
+        if build_cache is not None:
+            fingerprint = _job_fingerprint(
+                process, temp_map, transfers, forbidden_temp, job_name,
+                priority, step_name, node)
+            if fingerprint is not None:
+                job = build_cache.job(process, fingerprint)
+                if job is not None:
+                    return job
+
         # check for special modified paths in parameters
         input_replaced_paths = []
         output_replaced_paths = []
@@ -344,7 +555,9 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
             process_cmdline, process, iproc_transfers, oproc_transfers)
 
         use_input_params_file = False
+        process_definition = None
         if process_cmdline[0] == 'capsul_job':
+            process_definition = process_cmdline[1]
             python_command = os.path.basename(sys.executable)
             process_cmdline = [
                 'capsul_job', python_command, '-c',
@@ -367,6 +580,8 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         # handle native specification (cluster-specific specs as in
         # soma-workflow)
         native_spec = getattr(process, 'native_specification', None)
+        requirements = get_requirements(node if node is not None
+                                        else process)
         # Return the soma-workflow job
         if process_cmdline[0] == 'custom_job':
             job = build_custom_job(
@@ -398,13 +613,31 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
             parallel_job_info = getattr(process, 'parallel_job_info', None)
             if parallel_job_info:
                 job.parallel_job_info = parallel_job_info
+            elif requirements['cpus'] > 1:
+                job.parallel_job_info = {
+                    'config_name': 'native',
+                    'nodes_number': 1,
+                    'cpu_per_node': requirements['cpus']}
         if step_name:
             job.user_storage = step_name
+        job.requirements = requirements
+        # capsul_job jobs may be merged (see _fuse_jobs())
+        job.process_definition = process_definition
         # associate job with process
         job.process = weakref.ref(process)
         job._do_not_pickle = ['process']
         job.process_hash = id(process)
-        return job
+        if fingerprint is not None and job is not None:
+            build_cache.store_job(process, fingerprint, job)
+        return emit_job(job)
+
+    def emit_job(job):
+        """ Write a job when the workflow is written while it is built (see
+        output_file), and return its number. Otherwise return the job.
+        """
+        if writer is None or job is None:
+            return job
+        return writer.write_job(job)
 
     def build_custom_job(node, process_cmdline, name,
                          referenced_input_files, referenced_output_files,
@@ -433,8 +666,11 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         Returns
         -------
         group: Group
-            the soma-workflow Group instance
+            the soma-workflow Group instance, or its number when the
+            workflow is written while it is built (see output_file)
         """
+        if writer is not None:
+            return writer.write_group(name, jobs)
         return swclient.Group(jobs, name=name)
 
     def get_jobs(group, groups):
@@ -448,8 +684,11 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                 jobs.append(group_or_job)
         return jobs
 
-    def assign_temporary_filenames(pipeline, count_start=0):
-        ''' Find and temporarily assign necessary temporary file names'''
+    def assign_temporary_filenames(pipeline, count_start=0, build_cache=None):
+        ''' Find and temporarily assign necessary temporary file names.
+        If build_cache is given, TemporaryPath objects of the previous build
+        are reused.
+        '''
         temp_filenames = pipeline.find_empty_parameters()
         temp_map = {}
         count = count_start
@@ -472,7 +711,7 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                     continue
             else:
                 todo = [Undefined]
-            for item in todo:
+            for index, item in enumerate(todo):
                 if item not in (Undefined, '', None):
                     # non-empty list element
                     values.append(item)
@@ -482,8 +721,14 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                     suffix = trait.allowed_extensions[0]
                 else:
                     suffix = ''
-                swf_tmp = swclient.TemporaryPath(is_directory=is_directory,
-                    suffix=suffix, name='temporary_%d' % count)
+                if build_cache is not None:
+                    swf_tmp = build_cache.temporary_path(
+                        process, plug_name, index, is_directory, suffix,
+                        name='temporary_%d' % count)
+                else:
+                    swf_tmp = swclient.TemporaryPath(
+                        is_directory=is_directory, suffix=suffix,
+                        name='temporary_%d' % count)
                 tmp_file = TempFile('%d' % count)
                 count += 1
                 temp_map[tmp_file] = (swf_tmp, node, plug_name, optional)
@@ -944,6 +1189,8 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                 param_dict=reduce_param_dict)
             map_job.process_hash = id(it_process)
             reduce_job.process_hash = id(it_process)
+            map_job = emit_job(map_job)
+            reduce_job = emit_job(reduce_job)
 
             # connect inputs of the map node, outputs to reduce node,
             # and record connections to iterated jobs
@@ -1210,7 +1457,7 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                                     forbidden_temp=forbidden_temp,
                                     name=node_name,
                                     priority=jobs_priority,
-                                    step_name=step_name)
+                                    step_name=step_name, node=node)
                     if job:
                         sub_jobs[process] = job
                         root_jobs[process] = [job]
@@ -1331,6 +1578,12 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
     if study_config is None:
         study_config = pipeline.get_study_config()
 
+    writer = None
+    if output_file is not None and (estimated_costs is not None
+                                    or build_cache is not None):
+        raise ValueError('estimated_costs and build_cache cannot be used '
+                         'when the workflow is written in a file')
+
     if not isinstance(pipeline, Pipeline):
         # "pipeline" is actally a single process (or should, if it is not a
         # pipeline). Get it into a pipeine (with a single node) to make the
@@ -1340,12 +1593,17 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         new_pipeline.add_process('main', pipeline)
         new_pipeline.autoexport_nodes_parameters()
         pipeline = new_pipeline
-    temp_map = assign_temporary_filenames(pipeline)
+    swf_paths = _get_swf_paths(study_config)
+    if build_cache is not None:
+        build_cache.start_build(swf_paths[1])
+        shared_map = build_cache.shared_map
+    else:
+        shared_map = {}
+
+    temp_map = assign_temporary_filenames(pipeline, build_cache=build_cache)
     temp_subst_list = [(x1, x2[0]) for x1, x2 in six.iteritems(temp_map)]
     temp_subst_map = dict(temp_subst_list)
-    shared_map = {}
 
-    swf_paths = _get_swf_paths(study_config)
     transfers = _get_transfers(pipeline, swf_paths[0], merged_formats)
     # get complete list of disabled leaf nodes
     if disabled_nodes is None:
@@ -1363,11 +1621,14 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
     #print('SWF transfers:', swf_paths[0])
     #print('shared paths:', swf_paths[1])
 
+    if output_file is not None:
+        writer = WorkflowWriter(output_file, name=pipeline.name)
+
     if create_directories:
         # create job
-        dirs_job = _create_directories_job(
+        dirs_job = emit_job(_create_directories_job(
             pipeline, shared_map=shared_map, shared_paths=swf_paths[1],
-            transfer_paths=swf_paths[0])
+            transfer_paths=swf_paths[0]))
 
     # build steps map
     steps = {}
@@ -1385,6 +1646,10 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                 swf_paths[1],
                 disabled_nodes=disabled_nodes, forbidden_temp=remove_temp,
                 steps=steps, study_config=study_config)
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
     finally:
         restore_empty_filenames(temp_map)
 
@@ -1438,6 +1703,20 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         all_jobs.insert(0, dirs_job)
         root_jobs.insert(0, dirs_job)
 
+    if writer is not None:
+        writer.write_dependencies(dependencies)
+        for job, job_links in six.iteritems(param_links):
+            writer.write_param_links(job, job_links)
+        writer.close(root_jobs)
+        return output_file
+
+    if estimated_costs is not None:
+        _set_jobs_costs(all_jobs, dependencies, estimated_costs)
+        if fuse_jobs_below:
+            all_jobs, dependencies, param_links = _fuse_jobs(
+                all_jobs, dependencies, param_links, root_jobs,
+                fuse_jobs_below)
+
     workflow = swclient.Workflow(jobs=all_jobs,
         dependencies=dependencies,
         root_group=root_jobs,
@@ -1448,9 +1727,271 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
     workflow.pipeline = weakref.ref(pipeline)
     workflow._do_not_pickle = ['pipeline']
 
+    if build_cache is not None:
+        build_cache.end_build(workflow)
+
     return workflow
 
 
+def _set_jobs_costs(jobs, dependencies, estimated_costs):
+    """ Set estimated duration and memory on jobs, and raise the priority of
+    jobs according to their longest remaining path in the workflow (jobs
+    without estimate count for one second).
+    """
+    successors = dict((job, []) for job in jobs)
+    for source, dest in dependencies:
+        if source in successors and dest in successors:
+            successors[source].append(dest)
+    for job in jobs:
+        process = getattr(job, 'process', None)
+        if process is not None:
+            process = process()  # dereference the weakref
+        costs = estimated_costs.get(getattr(process, 'id', None), {})
+        job.estimated_duration = costs.get('duration')
+        job.estimated_memory = costs.get('peak_rss')
+    remaining = longest_remaining_paths(
+        successors,
+        lambda job: job.estimated_duration
+            if job.estimated_duration is not None else 1.)
+    for job, cost in six.iteritems(remaining):
+        # jobs may be reused from a previous build (see WorkflowBuildCache):
+        # keep their initial priority
+        if not hasattr(job, 'base_priority'):
+            job.base_priority = job.priority
+        job.priority = job.base_priority + int(round(cost))
+
+
+def _fusion_chains(jobs, dependencies, max_duration):
+    """ Linear chains of jobs which can be merged by _fuse_jobs()
+    """
+    def fusable(job):
+        return getattr(job, 'process_definition', None) is not None \
+            and job.estimated_duration is not None \
+            and job.estimated_duration < max_duration \
+            and not getattr(job, 'parallel_job_info', None)
+
+    successors = dict((job, []) for job in jobs)
+    predecessors = dict((job, []) for job in jobs)
+    for source, dest in dependencies:
+        if source in successors and dest in successors:
+            successors[source].append(dest)
+            predecessors[dest].append(source)
+
+    def linked(job, next_job):
+        return len(successors[job]) == 1 and successors[job][0] is next_job \
+            and len(predecessors[next_job]) == 1 and fusable(next_job) \
+            and next_job.native_specification == job.native_specification
+
+    chains = []
+    for job in jobs:
+        if not fusable(job) or (len(predecessors[job]) == 1
+                                and linked(predecessors[job][0], job)
+                                and fusable(predecessors[job][0])):
+            # not fusable, or not the start of a chain
+            continue
+        chain = [job]
+        while successors[chain[-1]] and linked(chain[-1],
+                                               successors[chain[-1]][0]):
+            chain.append(successors[chain[-1]][0])
+        if len(chain) > 1:
+            chains.append(chain)
+    return chains
+
+
+def _fused_job(chain, temp_users, param_links):
+    """ Build a single job running all jobs of a chain. temp_users is a
+    {TemporaryPath: set of jobs using it} dict.
+    """
+    # temporary paths only used within the chain are local
+    chain_set = set(chain)
+    local_temps = {}
+    for temp, users in six.iteritems(temp_users):
+        if users.issubset(chain_set):
+            local_temps[temp] = '<capsul_local_temp_%d%s>' \
+                % (len(local_temps), getattr(temp, 'suffix', '') or '')
+
+    def is_local(path):
+        return isinstance(path, swclient.TemporaryPath) \
+            and path.referent() in local_temps
+
+    def local_value(value):
+        if is_local(value):
+            return getattr(value, 'pattern', '%s') \
+                % local_temps[value.referent()]
+        if isinstance(value, (list, tuple)):
+            return type(value)(local_value(item) for item in value)
+        return value
+
+    index = dict((job, i) for i, job in enumerate(chain))
+    param_dict = {}
+    input_files = []
+    output_files = []
+    links = []
+    for i, job in enumerate(chain):
+        for param, value in six.iteritems(job.param_dict):
+            param_dict['%d:%s' % (i, param)] = local_value(value)
+        for path in job.referenced_input_files or []:
+            if not is_local(path) and path not in input_files:
+                input_files.append(path)
+        for path in job.referenced_output_files or []:
+            if not is_local(path) and path not in output_files:
+                output_files.append(path)
+        for param, linkl in six.iteritems(param_links.get(job, {})):
+            for link in linkl:
+                if link[0] in index:
+                    links.append((i, param, index[link[0]], link[1]))
+
+    python_command = chain[0].command[0]
+    job = swclient.Job(
+        name=', '.join(job.name for job in chain),
+        command=[
+            python_command, '-c',
+            'from capsul.api import Process; '
+            'Process.run_fused_from_commandline(%s, %s)'
+            % (repr([job.process_definition for job in chain]),
+               repr(links))],
+        referenced_input_files=input_files,
+        referenced_output_files=output_files,
+        priority=max(job.priority for job in chain),
+        native_specification=chain[0].native_specification,
+        param_dict=param_dict,
+        use_input_params_file=True,
+        has_outputs=any(getattr(job, 'has_outputs', False)
+                        for job in chain))
+    user_storage = getattr(chain[0], 'user_storage', None)
+    if user_storage:
+        job.user_storage = user_storage
+    requirements = [job.requirements for job in chain]
+    job.requirements = {
+        'cpus': max(r['cpus'] for r in requirements),
+        'memory': max(r['memory'] for r in requirements),
+        'tags': sorted(set(sum((r['tags'] for r in requirements), [])))}
+    job.estimated_duration = sum(job.estimated_duration for job in chain)
+    memory = [job.estimated_memory for job in chain
+              if job.estimated_memory is not None]
+    job.estimated_memory = max(memory) if memory else None
+    job.fused_jobs = list(chain)
+    job.process_definition = None
+    job.process_hash = None
+    # output parameters of the i-th process are prefixed with "i:" (see
+    # Process.run_fused_from_commandline), they are given back to the
+    # processes using this list (see _import_job_outputs())
+    job.fused_process_hashes = [getattr(fused_job, 'process_hash', None)
+                                for fused_job in chain]
+    return job
+
+
+def _fuse_jobs(jobs, dependencies, param_links, root_group, max_duration):
+    """ Merge linear chains of short Python process jobs into single jobs.
+    Dependencies, parameters links and groups are updated accordingly.
+
+    Returns
+    -------
+    (jobs, dependencies, param_links)
+    """
+    chains = _fusion_chains(jobs, dependencies, max_duration)
+    if not chains:
+        return jobs, dependencies, param_links
+    temp_users = {}
+    for job in jobs:
+        for path in (job.referenced_input_files or []) \
+                + (job.referenced_output_files or []):
+            if isinstance(path, swclient.TemporaryPath):
+                temp_users.setdefault(path.referent(), set()).add(job)
+    fused = {}  # {job: (fused_job, index in chain)}
+    for chain in chains:
+        fused_job = _fused_job(chain, temp_users, param_links)
+        for i, job in enumerate(chain):
+            fused[job] = (fused_job, i)
+
+    new_jobs = []
+    for job in jobs:
+        if job not in fused:
+            new_jobs.append(job)
+        elif fused[job][1] == 0:
+            new_jobs.append(fused[job][0])
+
+    def fused_element(job):
+        return fused[job][0] if job in fused else job
+
+    new_dependencies = set()
+    for source, dest in dependencies:
+        source = fused_element(source)
+        dest = fused_element(dest)
+        if source is not dest:
+            new_dependencies.add((source, dest))
+
+    def fused_param(job, param):
+        if job in fused:
+            return fused[job][0], '%d:%s' % (fused[job][1], param)
+        return job, param
+
+    new_links = {}
+    for dest_job, links in six.iteritems(param_links):
+        for dest_param, linkl in six.iteritems(links):
+            new_dest, new_param = fused_param(dest_job, dest_param)
+            for link in linkl:
+                if new_dest is fused_element(link[0]):
+                    # internal to a fused job
+                    continue
+                new_links.setdefault(new_dest, {}).setdefault(
+                    new_param, []).append(
+                        fused_param(link[0], link[1]) + tuple(link[2:]))
+
+    # replace jobs in groups
+    todo = [root_group]
+    done = set()
+    while todo:
+        elements = todo.pop(0)
+        new_elements = []
+        for element in elements:
+            if isinstance(element, swclient.Group):
+                if element not in done:
+                    done.add(element)
+                    todo.append(element.elements)
+                new_elements.append(element)
+            elif element not in fused:
+                new_elements.append(element)
+            elif fused[element][1] == 0:
+                new_elements.append(fused[element][0])
+        elements[:] = new_elements
+
+    # remove groups left empty
+    def prune(elements):
+        elements[:] = [element for element in elements
+                       if not isinstance(element, swclient.Group)
+                       or prune(element.elements)]
+        return elements
+
+    prune(root_group)
+
+    return new_jobs, new_dependencies, new_links
+
+
+def _import_job_outputs(job, out_params, proc_map):
+    """ Set the output parameters values of a finished job on its
+    process(es). proc_map is a {process_hash: process} dict.
+    """
+    fused_hashes = getattr(job, 'fused_process_hashes', None)
+    if fused_hashes is not None:
+        # fused job: "i:param" parameters belong to the i-th process
+        outputs = [(proc_map.get(process_hash), {})
+                   for process_hash in fused_hashes]
+        for key, value in six.iteritems(out_params):
+            index, param = key.split(':', 1)
+            outputs[int(index)][1][param] = value
+    else:
+        outputs = [(proc_map.get(getattr(job, 'process_hash', None)),
+                    out_params)]
+    for process, params in outputs:
+        if process is None:
+            # iteration or non-process job
+            continue
+        params = dict((param, value) for param, value in six.iteritems(params)
+                      if process.trait(param) is not None)
+        process.import_from_dict(params)
+
+
 def workflow_run(workflow_name, workflow, study_config):
     """ Create a soma-workflow controller and submit a workflow
 
@@ -1501,14 +2042,7 @@ def workflow_run(workflow_name, workflow, study_config):
                 out_params = controller.get_job_output_params(
                     eng_wf.job_mapping[job].job_id)
                 if out_params:
-                    process = proc_map.get(job.process_hash)
-                    if process is None:
-                        # iteration or non-process job
-                        continue
-                    for param in list(out_params.keys()):
-                        if process.trait(param) is None:
-                            del out_params[param]
-                    process.import_from_dict(out_params)
+                    _import_job_outputs(job, out_params, proc_map)
 
     # TODO: should we transfer if the WF fails ?
     swclient.Helper.transfer_output_files(wf_id, controller)
@@ -0,0 +1,121 @@
+'''
+Memory benchmark of large pipelines structures.
+
+A pipeline with many processes, each having many parameters, is generated,
+then the memory used by the pipeline structure (nodes, plugs and links) is
+reported, per plug.
+
+::
+
+    python -m capsul.pipeline.test.benchmark_pipeline_memory -n 500 -p 50
+'''
+
+from __future__ import print_function
+
+import argparse
+import gc
+import sys
+import timeit
+
+from traits.api import File, Float
+from capsul.api import Process, Pipeline
+
+
+class BenchmarkProcess(Process):
+    """ Process with a configurable number of inputs / outputs
+    """
+    def __init__(self, nparams=10):
+        super(BenchmarkProcess, self).__init__()
+        for i in range(nparams):
+            self.add_trait('input_%d' % i, File(optional=True))
+            self.add_trait('output_%d' % i, File(optional=True, output=True))
+        self.add_trait('factor', Float(optional=True))
+
+    def _run_process(self):
+        pass
+
+
+class BenchmarkPipeline(Pipeline):
+    """ Chain of nprocs BenchmarkProcess, each output of a process being
+    linked to the same input of the next one
+    """
+    def __init__(self, nprocs=100, nparams=10, **kwargs):
+        self.nprocs = nprocs
+        self.nparams = nparams
+        super(BenchmarkPipeline, self).__init__(**kwargs)
+
+    def pipeline_definition(self):
+        for n in range(self.nprocs):
+            self.add_process('node_%d' % n, BenchmarkProcess(self.nparams))
+        for n in range(1, self.nprocs):
+            for i in range(self.nparams):
+                self.add_link('node_%d.output_%d->node_%d.input_%d'
+                              % (n - 1, i, n, i))
+        for i in range(self.nparams):
+            self.export_parameter('node_0', 'input_%d' % i)
+            self.export_parameter('node_%d' % (self.nprocs - 1),
+                                  'output_%d' % i)
+
+
+def count_plugs(pipeline):
+    plugs = 0
+    links = 0
+    for node in pipeline.nodes.values():
+        plugs += len(node.plugs)
+        for plug in node.plugs.values():
+            links += len(plug.links_to)
+    return plugs, links
+
+
+def memory_usage():
+    ''' current (traced) memory in bytes, or None if tracing is not
+    available '''
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    if not tracemalloc.is_tracing():
+        return None
+    return tracemalloc.get_traced_memory()[0]
+
+
+def benchmark(nprocs, nparams):
+    try:
+        import tracemalloc
+        tracemalloc.start()
+    except ImportError:
+        print('tracemalloc is not available: memory will not be measured')
+    gc.collect()
+    mem_before = memory_usage()
+    tic = timeit.default_timer()
+    pipeline = BenchmarkPipeline(nprocs=nprocs, nparams=nparams)
+    toc = timeit.default_timer()
+    gc.collect()
+    mem_after = memory_usage()
+    plugs, links = count_plugs(pipeline)
+    print('pipeline: %d nodes, %d plugs, %d links' % (nprocs, plugs, links))
+    print('built in %.2f s' % (toc - tic))
+    if mem_before is not None:
+        mem = mem_after - mem_before
+        print('pipeline memory: %.1f MB, %.0f bytes per plug'
+              % (mem / 1024. / 1024., float(mem) / plugs))
+    tic = timeit.default_timer()
+    pipeline.update_nodes_and_plugs_activation()
+    toc = timeit.default_timer()
+    print('activation update in %.2f s' % (toc - tic))
+    return pipeline
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Measure the memory used by a large generated pipeline')
+    parser.add_argument('-n', '--nprocs', type=int, default=200,
+                        help='number of processes in the pipeline')
+    parser.add_argument('-p', '--nparams', type=int, default=25,
+                        help='number of inputs (and outputs) per process')
+    options = parser.parse_args(argv)
+    benchmark(options.nprocs, options.nparams)
+
+
+if __name__ == '__main__':
+    main()
@@ -454,6 +454,34 @@ class TestCustomNodes(unittest.TestCase):
         #print(sorted([(d[0].name, d[1].name) for d in wf.dependencies]))
         self.assertEqual(len(wf.dependencies), 28)
 
+    def test_mapreduce_resize(self):
+        sc = StudyConfig()
+        pipeline = sc.get_process_instance(PipelineMapReduce)
+        map_node = pipeline.nodes['map']
+        reduce_node = pipeline.nodes['reduce']
+        inputs = ['/tmp/file%d' % i for i in range(1000)]
+        events = []
+        map_node.on_trait_change(lambda: events.append(1),
+                                 'user_traits_changed')
+        pipeline.main_inputs = inputs
+        self.assertEqual(len(events), 1)
+        self.assertEqual(map_node.test_999, inputs[999])
+        self.assertTrue('test_999' in map_node.plugs)
+        reduce_node.lengths = [1000]
+        self.assertEqual(len(reduce_node.outputs), 1000)
+        reduce_node.in_output_500 = '/tmp/out500'
+        self.assertEqual(reduce_node.outputs[500], '/tmp/out500')
+        # shrink: plugs, traits and links are removed
+        pipeline.main_inputs = inputs[:1]
+        self.assertEqual(len(events), 2)
+        self.assertFalse('test_1' in map_node.plugs)
+        self.assertFalse('test_1' in map_node.user_traits())
+        self.assertEqual(
+            len(pipeline.nodes['proc2'].plugs['test'].links_from), 0)
+        reduce_node.lengths = [2]
+        self.assertEqual(len(reduce_node.outputs), 2)
+        self.assertFalse('in_output_500' in reduce_node.plugs)
+
 
 def test():
     suite = unittest.TestLoader().loadTestsFromTestCase(TestCustomNodes)
@@ -98,6 +98,20 @@ class TestPipeline(unittest.TestCase):
         self.pipeline.workflow_ordered_nodes()
         self.assertEqual(self.pipeline.workflow_repr, "")
 
+    def test_exported_plugs(self):
+        node1 = self.pipeline.nodes['node1']
+        node2 = self.pipeline.nodes['node2']
+        self.assertTrue(self.pipeline._is_plug_exported(node2,
+                                                        'output_image'))
+        self.assertFalse(self.pipeline._is_plug_exported(node1,
+                                                         'output_image'))
+        self.pipeline.remove_link('node2.output_image->output')
+        self.assertFalse(self.pipeline._is_plug_exported(node2,
+                                                         'output_image'))
+        self.pipeline.add_link('node2.output_image->output')
+        self.assertTrue(self.pipeline._is_plug_exported(node2,
+                                                        'output_image'))
+
     def test_run_pipeline(self):
         setattr(self.pipeline.nodes_activation, "node2", True)
         tmp = tempfile.mkstemp('', prefix='capsul_test_pipeline')
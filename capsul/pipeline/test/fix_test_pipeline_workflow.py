@@ -126,6 +126,75 @@ class TestPipelineWorkflow(unittest.TestCase):
             raise ValueError('workflow should have failed due to a missing '
                 'temporary file')
 
+    def test_incremental_wf(self):
+        self.pipeline.enable_all_pipeline_steps()
+        cache = pipeline_workflow.WorkflowBuildCache()
+        wf1 = pipeline_workflow.workflow_from_pipeline(
+            self.pipeline, study_config={}, create_directories=False,
+            build_cache=cache)
+        self.assertEqual(len(wf1.jobs), 4)
+        self.assertEqual(cache.built_jobs, 4)
+        self.assertEqual(cache.reused_jobs, 0)
+        # nothing changed: all jobs are reused
+        wf2 = pipeline_workflow.workflow_from_pipeline(
+            self.pipeline, study_config={}, create_directories=False,
+            build_cache=cache)
+        self.assertEqual(cache.built_jobs, 0)
+        self.assertEqual(cache.reused_jobs, 4)
+        self.assertEqual(set(wf1.jobs), set(wf2.jobs))
+        self.assertEqual(len(wf2.dependencies), 3)
+        # only node3 has changed
+        self.pipeline.output2 = '/tmp/file_out2_bis.nii'
+        wf3 = pipeline_workflow.workflow_from_pipeline(
+            self.pipeline, study_config={}, create_directories=False,
+            build_cache=cache)
+        self.assertEqual(cache.built_jobs, 1)
+        self.assertEqual(cache.reused_jobs, 3)
+        self.assertEqual(len(set(wf2.jobs) & set(wf3.jobs)), 3)
+        self.assertEqual(len(wf3.dependencies), 3)
+        # a disabled step removes its job
+        self.pipeline.pipeline_steps.step3 = False
+        wf4 = pipeline_workflow.workflow_from_pipeline(
+            self.pipeline, study_config={}, create_directories=False,
+            build_cache=cache)
+        self.assertEqual(len(wf4.jobs), 3)
+        self.assertEqual(cache.built_jobs, 0)
+
+    def test_fused_wf(self):
+        self.pipeline.enable_all_pipeline_steps()
+        process_id = self.pipeline.nodes['node1'].process.id
+        estimated_costs = {process_id: {'duration': 0.5}}
+        wf = pipeline_workflow.workflow_from_pipeline(
+            self.pipeline, study_config={}, create_directories=False,
+            estimated_costs=estimated_costs, fuse_jobs_below=1.)
+        # node1 and node2 are merged, node2 has 2 successors
+        self.assertEqual(len(wf.jobs), 3)
+        self.assertEqual(len(wf.dependencies), 2)
+        fused = [job for job in wf.jobs if hasattr(job, 'fused_jobs')]
+        self.assertEqual(len(fused), 1)
+        self.assertEqual([job.name for job in fused[0].fused_jobs],
+                         ['node1', 'node2'])
+        # the temporary file between node1 and node2 is local
+        self.assertTrue('<capsul_local_temp_0'
+                        in fused[0].param_dict['0:output'])
+        self.assertEqual(fused[0].estimated_duration, 1.)
+        # output parameters of the fused job go back to each process
+        node1 = self.pipeline.nodes['node1'].process
+        node2 = self.pipeline.nodes['node2'].process
+        proc_map = {id(node1): node1, id(node2): node2}
+        self.assertEqual(fused[0].fused_process_hashes,
+                         [id(node1), id(node2)])
+        pipeline_workflow._import_job_outputs(
+            fused[0], {'0:output': '/tmp/out1', '1:output': '/tmp/out2',
+                       '1:unknown': 1}, proc_map)
+        self.assertEqual(node1.output, '/tmp/out1')
+        self.assertEqual(node2.output, '/tmp/out2')
+        # too long jobs are not merged
+        wf = pipeline_workflow.workflow_from_pipeline(
+            self.pipeline, study_config={}, create_directories=False,
+            estimated_costs=estimated_costs, fuse_jobs_below=0.2)
+        self.assertEqual(len(wf.jobs), 4)
+
 
 def test():
     """ Function to execute unitest
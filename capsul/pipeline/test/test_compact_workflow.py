@@ -0,0 +1,182 @@
+from __future__ import print_function
+
+import os
+import os.path as osp
+import shutil
+import sys
+import tempfile
+import unittest
+import weakref
+
+import soma_workflow.client as swclient
+from traits.api import File
+
+from capsul.api import Process, Pipeline
+from capsul.pipeline.compact_workflow import (WorkflowWriter, write_workflow,
+                                              read_workflow)
+from capsul.pipeline.pipeline_workflow import workflow_from_pipeline
+
+
+class StreamedProcess(Process):
+    def __init__(self):
+        super(StreamedProcess, self).__init__()
+        self.add_trait('input', File(optional=False))
+        self.add_trait('output', File(output=True))
+
+    def _run_process(self):
+        pass
+
+
+class StreamedPipeline(Pipeline):
+    def pipeline_definition(self):
+        self.add_process('node1', StreamedProcess())
+        self.add_process('node2', StreamedProcess())
+        self.add_process('node3', StreamedProcess())
+        self.add_link('node1.output->node2.input')
+        self.add_link('node1.output->node3.input')
+        self.export_parameter('node1', 'input')
+        self.export_parameter('node2', 'output', 'output2')
+        self.export_parameter('node3', 'output', 'output3')
+
+
+class TestCompactWorkflow(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_compact_wf')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def build_workflow(self, size):
+        tmp = swclient.TemporaryPath(suffix='.nii', name='temporary_0')
+        shared = {'threshold': 0.5, 'options': {'mode': 'fast',
+                                                'levels': [1, 2, 3]}}
+        jobs = []
+        for i in range(size):
+            param_dict = {'input': '/data/study/subject_%04d/t1.nii' % i,
+                          'output': tmp, 'config': shared}
+            jobs.append(swclient.Job(
+                name='job_%d' % i,
+                command=['python', '-c', 'pass', tmp + '.minf'],
+                referenced_output_files=[tmp],
+                param_dict=param_dict, priority=i % 3,
+                use_input_params_file=True))
+        group = swclient.Group(jobs[1:], name='group')
+        dependencies = [(jobs[0], job) for job in jobs[1:]]
+        links = {jobs[1]: {'input': [(jobs[0], 'output')]}}
+        return swclient.Workflow(jobs=jobs, dependencies=dependencies,
+                                 root_group=[jobs[0], group], name='test',
+                                 param_links=links)
+
+    def test_round_trip(self):
+        workflow = self.build_workflow(20)
+        filename = osp.join(self.tmpdir, 'test.workflow')
+        write_workflow(workflow, filename)
+        workflow2 = read_workflow(filename)
+        self.assertEqual(workflow2.name, 'test')
+        self.assertEqual(len(workflow2.jobs), 20)
+        jobs = dict((job.name, job) for job in workflow2.jobs)
+        job = jobs['job_3']
+        self.assertEqual(job.priority, 0)
+        self.assertEqual(job.param_dict['input'],
+                         '/data/study/subject_0003/t1.nii')
+        self.assertEqual(job.param_dict['config']['options']['levels'],
+                         [1, 2, 3])
+        # temporary paths and interned dicts are shared between jobs
+        self.assertTrue(isinstance(job.param_dict['output'],
+                                   swclient.TemporaryPath))
+        self.assertTrue(job.param_dict['output'].referent()
+                        is jobs['job_4'].param_dict['output'].referent())
+        self.assertTrue(job.param_dict['config']
+                        is jobs['job_4'].param_dict['config'])
+        self.assertEqual(job.command[3].pattern, '%s.minf')
+        self.assertEqual(len(workflow2.dependencies), 19)
+        self.assertEqual(len(workflow2.root_group), 2)
+        self.assertEqual(list(workflow2.param_links[jobs['job_1']]),
+                         ['input'])
+        self.assertTrue(workflow2.param_links[jobs['job_1']]['input'][0][0]
+                        is jobs['job_0'])
+
+    def test_compact(self):
+        workflow = self.build_workflow(200)
+        filename = osp.join(self.tmpdir, 'test.workflow')
+        write_workflow(workflow, filename)
+        with open(filename) as f:
+            lines = f.readlines()
+        # the shared parameters dict is written once
+        self.assertEqual(len([l for l in lines if '"fast"' in l]), 1)
+        gz_filename = osp.join(self.tmpdir, 'test.workflow.gz')
+        write_workflow(workflow, gz_filename)
+        self.assertTrue(os.stat(gz_filename).st_size
+                        < os.stat(filename).st_size)
+        self.assertEqual(len(read_workflow(gz_filename).jobs), 200)
+
+    def test_streaming(self):
+        filename = osp.join(self.tmpdir, 'test.workflow')
+        with WorkflowWriter(filename, name='stream') as writer:
+            previous = None
+            last_ids = []
+            for i in range(10):
+                job = swclient.Job(name='job_%d' % i, command=['ls'])
+                job_id = writer.write_job(job)
+                if previous is not None:
+                    writer.write_dependencies([(previous, job_id)])
+                previous = job_id
+                last_ids = last_ids[-1:] + [job_id]
+                # the writer does not keep written jobs
+                job_ref = weakref.ref(job)
+                del job
+                self.assertTrue(job_ref() is None)
+            writer.write_group('last', last_ids)
+        workflow = read_workflow(filename)
+        self.assertEqual(len(workflow.jobs), 10)
+        self.assertEqual(len(workflow.dependencies), 9)
+        self.assertEqual(len(workflow.root_group), 9)
+        self.assertEqual([element.name for element
+                          in workflow.root_group[-1].elements],
+                         ['job_8', 'job_9'])
+
+    def test_pipeline_streaming(self):
+        pipeline = StreamedPipeline()
+        pipeline.input = '/tmp/input.nii'
+        pipeline.output2 = '/tmp/output2.nii'
+        pipeline.output3 = '/tmp/output3.nii'
+        filename = osp.join(self.tmpdir, 'pipeline.workflow')
+        self.assertEqual(
+            workflow_from_pipeline(pipeline, study_config={},
+                                   create_directories=False,
+                                   output_file=filename),
+            filename)
+        workflow = read_workflow(filename)
+        expected = workflow_from_pipeline(pipeline, study_config={},
+                                          create_directories=False)
+        self.assertEqual(sorted(job.name for job in workflow.jobs),
+                         sorted(job.name for job in expected.jobs))
+        self.assertEqual(sorted((source.name, dest.name)
+                                for source, dest in workflow.dependencies),
+                         [('node1', 'node2'), ('node1', 'node3')])
+        self.assertEqual(len(workflow.root_group), 3)
+        self.assertRaises(ValueError, workflow_from_pipeline, pipeline,
+                          study_config={}, estimated_costs={},
+                          output_file=filename)
+
+    def test_truncated(self):
+        filename = osp.join(self.tmpdir, 'test.workflow')
+        write_workflow(self.build_workflow(5), filename)
+        with open(filename) as f:
+            lines = f.readlines()
+        with open(filename, 'w') as f:
+            f.writelines(lines[:-3])
+        self.assertRaises(ValueError, read_workflow, filename)
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCompactWorkflow)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -0,0 +1,64 @@
+from __future__ import print_function
+import unittest
+from traits.api import File
+from capsul.api import Process
+from capsul.api import Pipeline
+
+
+class DummyProcess(Process):
+    """ Dummy Test Process
+    """
+    def __init__(self):
+        super(DummyProcess, self).__init__()
+
+        # inputs
+        self.add_trait("input_image", File(optional=False))
+
+        # outputs
+        self.add_trait("output_image", File(optional=True, output=True))
+
+    def _run_process(self):
+        pass
+
+
+class MyPipelineWithOptOut(Pipeline):
+    """ Simple Pipeline with an OptionalOutputSwitch Node
+    """
+    def pipeline_definition(self):
+
+        # Create processes
+        self.add_process("node1", DummyProcess())
+        self.add_process("node2", DummyProcess())
+        self.add_optional_output_switch("intermediate_out", "one")
+
+        # Links
+        self.add_link("node1.output_image->node2.input_image")
+        self.add_link("node1.output_image->"
+                      "intermediate_out.one_switch_intermediate_out")
+
+        # exports
+        self.export_parameter("node1", "input_image", "input_image1")
+        self.export_parameter("node2", "output_image", "output_image2")
+
+
+class TestHiddenPlugs(unittest.TestCase):
+
+    def test_optional_output_switch(self):
+        pipeline = MyPipelineWithOptOut()
+        switch = pipeline.nodes["intermediate_out"]
+        self.assertTrue(switch.plugs["switch"].hidden)
+        self.assertTrue(switch.plugs["_none_switch_intermediate_out"].hidden)
+        self.assertFalse(switch.plugs["one_switch_intermediate_out"].hidden)
+        self.assertFalse(pipeline.nodes["node1"].plugs["output_image"].hidden)
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestHiddenPlugs)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -0,0 +1,89 @@
+from __future__ import print_function
+import unittest
+import traits.api as traits
+from capsul.api import Pipeline
+from capsul.pipeline.pipeline_nodes import Node, Plug
+
+
+class EmptyPipeline(Pipeline):
+    """ Pipeline holding the tested nodes
+    """
+    def pipeline_definition(self):
+        pass
+
+
+class TestNumberedPlugs(unittest.TestCase):
+    """ Node._resize_numbered_plugs() must leave a node in the same state as
+    Controller.add_trait() / remove_trait() called for each plug.
+    """
+
+    traits = [('file_%d', traits.File, True),
+              ('int_%d', traits.Int, False),
+              ('list_%d', lambda **kwargs: traits.List(traits.Int(),
+                                                       **kwargs), False)]
+
+    def setUp(self):
+        self.pipeline = EmptyPipeline()
+        self.resized = Node(self.pipeline, 'resized', [], [])
+        self.reference = Node(self.pipeline, 'reference', [], [])
+
+    def resize(self, old_count, new_count):
+        for name_pattern, trait_type, output in self.traits:
+            self.resized._resize_numbered_plugs(
+                name_pattern, old_count, new_count, trait_type(), output)
+            for i in range(old_count, new_count):
+                name = name_pattern % i
+                self.reference.add_trait(
+                    name, trait_type(output=output, optional=True))
+                plug = Plug(name=name, optional=True, output=output)
+                self.reference.plugs[name] = plug
+            for i in range(new_count, old_count):
+                name = name_pattern % i
+                self.reference.remove_trait(name)
+                del self.reference.plugs[name]
+
+    def check_same_state(self):
+        self.assertEqual(list(self.resized.user_traits().keys()),
+                         list(self.reference.user_traits().keys()))
+        self.assertEqual(list(self.resized.plugs.keys()),
+                         list(self.reference.plugs.keys()))
+        for name in self.reference.plugs:
+            trait = self.reference.trait(name)
+            resized_trait = self.resized.trait(name)
+            self.assertTrue(resized_trait is self.resized.user_traits()[name])
+            self.assertEqual(type(resized_trait.trait_type),
+                             type(trait.trait_type))
+            self.assertEqual(resized_trait.output, trait.output)
+            self.assertEqual(resized_trait.optional, trait.optional)
+            self.assertEqual(getattr(self.resized, name),
+                             getattr(self.reference, name))
+            resized_plug = self.resized.plugs[name]
+            plug = self.reference.plugs[name]
+            self.assertEqual(resized_plug.output, plug.output)
+            self.assertEqual(resized_plug.optional, plug.optional)
+
+    def test_resize(self):
+        self.resize(0, 5)
+        self.check_same_state()
+        # added plugs have independent values
+        self.resized.file_3 = self.reference.file_3 = '/tmp/file_3'
+        self.resized.list_1 = self.reference.list_1 = [1, 2]
+        self.check_same_state()
+        self.resize(5, 8)
+        self.check_same_state()
+        self.resize(8, 2)
+        self.check_same_state()
+        self.resize(2, 0)
+        self.check_same_state()
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestNumberedPlugs)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -0,0 +1,124 @@
+from __future__ import print_function
+
+import unittest
+import tempfile
+import shutil
+import os
+import os.path as osp
+import sys
+from traits.api import File
+from capsul.api import Process, Pipeline
+from capsul.pipeline.pipeline_tools import (out_of_date_nodes,
+                                            record_file_checksums)
+
+
+class DummyProcess(Process):
+    """ Dummy Test Process
+    """
+    def __init__(self):
+        super(DummyProcess, self).__init__()
+
+        # inputs
+        self.add_trait("input_image", File(optional=False))
+
+        # outputs
+        self.add_trait("output_image", File(optional=False, output=True))
+
+    def _run_process(self):
+        open(self.output_image, 'w').write(open(self.input_image).read())
+
+
+class MyPipeline(Pipeline):
+    """ Simple linear Pipeline
+    """
+    def pipeline_definition(self):
+
+        # Create processes
+        self.add_process("node1",
+            "capsul.pipeline.test.test_out_of_date.DummyProcess")
+        self.add_process("node2",
+            "capsul.pipeline.test.test_out_of_date.DummyProcess")
+        self.add_process("node3",
+            "capsul.pipeline.test.test_out_of_date.DummyProcess")
+
+        # Links
+        self.add_link("node1.output_image->node2.input_image")
+        self.add_link("node2.output_image->node3.input_image")
+
+        # Outputs
+        self.export_parameter("node1", "input_image")
+        self.export_parameter("node1", "output_image", "output1")
+        self.export_parameter("node2", "output_image", "output2")
+        self.export_parameter("node3", "output_image", "output3")
+
+
+class TestOutOfDate(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_ood')
+        self.pipeline = MyPipeline()
+        self.pipeline.input_image = osp.join(self.tmpdir, 'input.nii')
+        for i in range(1, 4):
+            setattr(self.pipeline, 'output%d' % i,
+                    osp.join(self.tmpdir, 'output%d.nii' % i))
+        self.time = 1000000000
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, filename, data='data'):
+        # files are given increasing timestamps
+        with open(filename, 'w') as f:
+            f.write(data)
+        self.time += 10
+        os.utime(filename, (self.time, self.time))
+
+    def stale_names(self, checksums=None):
+        return [name.split('.')[-1]
+                for name in out_of_date_nodes(self.pipeline, checksums)]
+
+    def test_out_of_date(self):
+        self.assertEqual(self.stale_names(), ['node1', 'node2', 'node3'])
+        self.write(self.pipeline.input_image)
+        for i in range(1, 4):
+            self.write(getattr(self.pipeline, 'output%d' % i))
+        self.assertEqual(self.stale_names(), [])
+        # a newer intermediate file makes its consumers out of date
+        self.write(self.pipeline.output1)
+        stale = out_of_date_nodes(self.pipeline)
+        self.assertEqual([name.split('.')[-1] for name in stale],
+                         ['node2', 'node3'])
+        self.assertEqual(list(stale.values())[0],
+                         [('input_image', self.pipeline.output1)])
+        # a missing output
+        self.write(self.pipeline.output2)
+        self.write(self.pipeline.output3)
+        os.unlink(self.pipeline.output2)
+        self.assertEqual(self.stale_names(), ['node2', 'node3'])
+
+    def test_checksums(self):
+        self.write(self.pipeline.input_image)
+        for i in range(1, 4):
+            self.write(getattr(self.pipeline, 'output%d' % i))
+        checksums = record_file_checksums(self.pipeline)
+        self.assertEqual(len(checksums), 3)
+        # touched, same contents
+        self.write(self.pipeline.input_image)
+        self.assertEqual(self.stale_names(checksums), [])
+        self.assertEqual(self.stale_names(), ['node1', 'node2', 'node3'])
+        # modified contents
+        self.write(self.pipeline.input_image, 'new data')
+        self.assertEqual(self.stale_names(checksums),
+                         ['node1', 'node2', 'node3'])
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestOutOfDate)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -0,0 +1,107 @@
+from __future__ import print_function
+
+import unittest
+import sys
+from capsul.pipeline.pipeline_layout import (pipeline_layout_graph,
+                                             iter_layered_layout,
+                                             layered_layout, layout_key,
+                                             cached_layout, cache_layout)
+
+
+class DummyPlug(object):
+    def __init__(self, output=False):
+        self.output = output
+        self.links_to = set()
+
+
+class DummyNode(object):
+    def __init__(self, inputs=(), outputs=()):
+        self.plugs = dict([(name, DummyPlug()) for name in inputs]
+                          + [(name, DummyPlug(True)) for name in outputs])
+
+
+class DummyPipeline(object):
+    ''' Duck-typed pipeline: a -> b -> c, a -> c, inputs -> a,
+    c -> outputs '''
+    def __init__(self):
+        self.nodes = {'': DummyNode(['input'], ['output']),
+                      'a': DummyNode(['i'], ['o']),
+                      'b': DummyNode(['i'], ['o']),
+                      'c': DummyNode(['i', 'j'], ['o'])}
+        self.link('', 'input', 'a', 'i')
+        self.link('a', 'o', 'b', 'i')
+        self.link('b', 'o', 'c', 'i')
+        self.link('a', 'o', 'c', 'j')
+        self.link('c', 'o', '', 'output')
+
+    def link(self, source, source_plug, dest, dest_plug):
+        dest_node = self.nodes[dest]
+        self.nodes[source].plugs[source_plug].links_to.add(
+            (dest, dest_plug, dest_node, dest_node.plugs[dest_plug], False))
+
+
+class TestPipelineLayout(unittest.TestCase):
+
+    def test_pipeline_graph(self):
+        nodes, edges = pipeline_layout_graph(DummyPipeline())
+        self.assertEqual(nodes[0], 'inputs')
+        self.assertEqual(nodes[-1], 'outputs')
+        self.assertEqual(sorted(nodes), ['a', 'b', 'c', 'inputs', 'outputs'])
+        self.assertEqual(sorted(edges),
+                         [('a', 'b'), ('a', 'c'), ('b', 'c'),
+                          ('c', 'outputs'), ('inputs', 'a')])
+        nodes, edges = pipeline_layout_graph(DummyPipeline(),
+                                             include_io=False)
+        self.assertEqual(sorted(nodes), ['a', 'b', 'c'])
+        self.assertEqual(len(edges), 3)
+
+    def test_layers(self):
+        nodes, edges = pipeline_layout_graph(DummyPipeline())
+        sizes = dict((node, (100., 50.)) for node in nodes)
+        pos = layered_layout(nodes, edges, sizes)
+        self.assertEqual(sorted(pos.keys()), sorted(nodes))
+        # links go from left to right
+        for source, dest in edges:
+            self.assertTrue(pos[source][0] + 100. <= pos[dest][0])
+
+    def test_crossings(self):
+        # a1 -> b2, a2 -> b1: the second layer must be swapped
+        nodes = ['a1', 'a2', 'b1', 'b2']
+        edges = [('a1', 'b2'), ('a2', 'b1')]
+        layouts = list(iter_layered_layout(nodes, edges))
+        self.assertEqual(len(layouts), 2)
+        pos = layouts[-1]
+        self.assertEqual(pos['a1'][0], pos['a2'][0])
+        self.assertTrue((pos['a1'][1] - pos['a2'][1])
+                        * (pos['b2'][1] - pos['b1'][1]) > 0)
+        # no overlap in a layer
+        self.assertTrue(abs(pos['b1'][1] - pos['b2'][1]) >= 100.)
+
+    def test_cycle(self):
+        pos = layered_layout(['a', 'b', 'c'],
+                             [('a', 'b'), ('b', 'c'), ('c', 'a')])
+        self.assertEqual(len(pos), 3)
+        self.assertEqual(len(set(x for x, y in pos.values())), 3)
+
+    def test_cache(self):
+        nodes, edges = pipeline_layout_graph(DummyPipeline())
+        key = layout_key(nodes, edges, {'a': (100, 50)})
+        self.assertEqual(key, layout_key(list(reversed(nodes)), edges,
+                                         {'a': (100.2, 50)}))
+        self.assertNotEqual(key, layout_key(nodes, edges[1:],
+                                            {'a': (100, 50)}))
+        self.assertTrue(cached_layout(key) is None)
+        cache_layout(key, {'a': (0, 0)})
+        self.assertEqual(cached_layout(key), {'a': (0, 0)})
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestPipelineLayout)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -0,0 +1,78 @@
+from __future__ import print_function
+
+import copy
+import gc
+import sys
+import unittest
+
+from capsul.pipeline.pipeline_nodes import Plug
+
+
+class Listener(object):
+    def __init__(self):
+        self.calls = []
+
+    def changed(self):
+        self.calls.append('changed')
+
+    def full_changed(self, obj, name, old, new):
+        self.calls.append((name, old, new))
+
+
+class TestPlug(unittest.TestCase):
+
+    def test_flags(self):
+        plug = Plug(output=True, optional=True)
+        self.assertTrue(plug.enabled)
+        self.assertFalse(plug.activated)
+        self.assertTrue(plug.output)
+        self.assertTrue(plug.optional)
+        self.assertFalse(plug.has_default_value)
+        plug.has_default_value = True
+        plug.optional = False
+        self.assertTrue(plug.has_default_value)
+        self.assertFalse(plug.optional)
+        self.assertTrue(plug.output)
+        self.assertEqual(plug.links_to, set())
+        self.assertFalse(plug.hidden)
+        plug.hidden = True
+        self.assertTrue(plug.hidden)
+        self.assertTrue(plug.output)
+        plug2 = copy.deepcopy(plug)
+        self.assertTrue(plug2.has_default_value)
+        self.assertTrue(plug2.output)
+        self.assertTrue(plug2.hidden)
+        # plugs are slotted: unknown attributes are errors
+        self.assertRaises(AttributeError, setattr, plug, 'unknown', True)
+
+    def test_callbacks(self):
+        plug = Plug()
+        listener = Listener()
+        plug.on_trait_change(listener.changed, 'enabled')
+        plug.on_trait_change(listener.full_changed, ['activated'])
+        plug.enabled = False
+        # no change: no notification
+        plug.enabled = False
+        plug.activated = True
+        self.assertEqual(listener.calls,
+                         ['changed', ('activated', False, True)])
+        plug.on_trait_change(listener.changed, 'enabled', remove=True)
+        plug.enabled = True
+        self.assertEqual(len(listener.calls), 2)
+        # callbacks do not keep their objects alive
+        del listener
+        gc.collect()
+        plug.activated = False
+        self.assertEqual(len(plug._callbacks), 0)
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestPlug)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
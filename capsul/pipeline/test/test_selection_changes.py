@@ -0,0 +1,91 @@
+from __future__ import print_function
+import unittest
+from traits.api import File, Float
+from capsul.api import Process
+from capsul.api import Pipeline
+
+
+class DummyProcess(Process):
+    """ Dummy Test Process
+    """
+    def __init__(self):
+        super(DummyProcess, self).__init__()
+
+        # inputs
+        self.add_trait("input_image", File(optional=False))
+        self.add_trait("other_input", Float(optional=True))
+
+        # outputs
+        self.add_trait("output_image", File(optional=False, output=True))
+        self.add_trait("other_output", Float(optional=True, output=True))
+
+    def _run_process(self):
+        pass
+
+
+class MyPipeline(Pipeline):
+    """ Pipeline with two independent ways
+    """
+    def pipeline_definition(self):
+
+        # Create processes
+        self.add_process("way11", DummyProcess())
+        self.add_process("way12", DummyProcess())
+        self.add_process("way21", DummyProcess())
+        self.add_process("way22", DummyProcess(),
+            do_not_export=['output_image'],
+            make_optional=['output_image'])
+
+        # Inputs
+        self.export_parameter("way11", "input_image")
+
+        # Links
+        self.add_link("input_image->way21.input_image")
+        self.add_link("way11.output_image->way12.input_image")
+        self.add_link("way21.output_image->way22.input_image")
+
+        # Outputs
+        self.export_parameter("way12", "output_image", is_optional=True)
+        self.export_parameter("way22", "other_output")
+
+
+class TestSelectionChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.pipeline = MyPipeline()
+        self.changes = []
+        self.pipeline.on_trait_change(
+            lambda new: self.changes.append(new), 'selection_changed')
+
+    def test_activation(self):
+        setattr(self.pipeline.nodes_activation, "way11", False)
+        activation = self.changes[-1]['activation']
+        self.assertTrue('way11' in activation)
+        self.assertTrue('input_image' in activation['way12'])
+        self.assertFalse('way21' in activation)
+        self.assertFalse('way22' in activation)
+        self.assertEqual(self.changes[-1]['links'], [])
+
+    def test_links(self):
+        self.pipeline.remove_link("way21.output_image->way22.input_image")
+        self.assertEqual(
+            self.changes[-1]['links'],
+            [(False, ('way21', 'output_image', 'way22', 'input_image',
+                      False))])
+        self.pipeline.add_link("way21.output_image->way22.input_image")
+        self.assertEqual(
+            self.changes[-1]['links'],
+            [(True, ('way21', 'output_image', 'way22', 'input_image',
+                     False))])
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSelectionChanges)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
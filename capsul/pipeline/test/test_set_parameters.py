@@ -0,0 +1,94 @@
+from __future__ import print_function
+import unittest
+from traits.api import File, Float
+from capsul.api import Process
+from capsul.api import Pipeline
+
+
+class DummyProcess(Process):
+    """ Dummy Test Process
+    """
+    def __init__(self):
+        super(DummyProcess, self).__init__()
+
+        # inputs
+        self.add_trait("input_image", File(optional=False))
+        self.add_trait("other_input", Float(optional=True))
+
+        # outputs
+        self.add_trait("output_image", File(optional=False, output=True))
+        self.add_trait("other_output", Float(optional=True, output=True))
+
+    def _run_process(self):
+        pass
+
+
+class ChainPipeline(Pipeline):
+    """ Pipeline with two linked processes
+    """
+    def pipeline_definition(self):
+        self.add_process("node1", DummyProcess())
+        self.add_process("node2", DummyProcess())
+        self.add_link("node1.output_image->node2.input_image")
+        self.add_link("node1.other_output->node2.other_input")
+        self.export_parameter("node1", "input_image")
+        self.export_parameter("node1", "other_input")
+        self.export_parameter("node2", "output_image", "output")
+
+
+class MultiSourcePipeline(Pipeline):
+    """ Pipeline with a process plug linked from two pipeline parameters
+    """
+    def pipeline_definition(self):
+        self.add_process("node", DummyProcess())
+        self.export_parameter("node", "input_image", "input1")
+        self.export_parameter("node", "input_image", "input2")
+
+
+class TestSetParameters(unittest.TestCase):
+
+    def test_same_values(self):
+        pipeline1 = ChainPipeline()
+        pipeline1.input_image = '/tmp/input.nii'
+        pipeline1.other_input = 2.5
+        pipeline1.output = '/tmp/output.nii'
+        pipeline2 = ChainPipeline()
+        pipeline2.set_parameters({'input_image': '/tmp/input.nii',
+                                  'other_input': 2.5,
+                                  'output': '/tmp/output.nii'})
+        for node_name in ('node1', 'node2'):
+            process1 = pipeline1.nodes[node_name].process
+            process2 = pipeline2.nodes[node_name].process
+            for param in process1.user_traits():
+                self.assertEqual(getattr(process2, param),
+                                 getattr(process1, param))
+        self.assertEqual(pipeline2.nodes['node1'].process.other_input, 2.5)
+
+    def test_coalesced_plug(self):
+        # a plug reached from several parameters is set once
+        pipeline = MultiSourcePipeline()
+        process = pipeline.nodes['node'].process
+        changes = []
+        process.on_trait_change(lambda value: changes.append(value),
+                                'input_image')
+        pipeline.input1 = '/tmp/input1.nii'
+        pipeline.input2 = '/tmp/input2.nii'
+        self.assertEqual(len(changes), 2)
+        del changes[:]
+        pipeline.set_parameters({'input1': '/tmp/input3.nii',
+                                 'input2': '/tmp/input4.nii'})
+        self.assertEqual(len(changes), 1)
+        self.assertTrue(process.input_image in ('/tmp/input3.nii',
+                                                '/tmp/input4.nii'))
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSetParameters)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -0,0 +1,39 @@
+from __future__ import print_function
+
+import unittest
+
+from capsul.pipeline.topological_sort import (Graph, GraphNode,
+                                              longest_remaining_paths)
+
+
+class TestTopologicalSort(unittest.TestCase):
+    def setUp(self):
+        # two independent chains: a -> b -> c (short nodes) and d -> e where
+        # d is long
+        self.graph = Graph()
+        for name in 'abcde':
+            self.graph.add_node(GraphNode(name, None))
+        for link in [('a', 'b'), ('b', 'c'), ('d', 'e')]:
+            self.graph.add_link(*link)
+        self.costs = {'a': 1, 'b': 1, 'c': 1, 'd': 10, 'e': 1}
+
+    def test_longest_remaining_paths(self):
+        successors = {'a': ['b', 'c'], 'b': ['d'], 'c': [], 'd': []}
+        self.assertEqual(
+            longest_remaining_paths(successors, lambda n: 2),
+            {'a': 6, 'b': 4, 'c': 2, 'd': 2})
+
+    def test_critical_path_first(self):
+        priorities = self.graph.remaining_path_costs(
+            lambda node: self.costs[node.name])
+        self.assertEqual(priorities['a'], 3)
+        self.assertEqual(priorities['d'], 11)
+        order = [name for name, meta
+                 in self.graph.topological_sort(priorities)]
+        self.assertEqual(order[:3], ['d', 'a', 'b'])
+        self.assertEqual(set(order), set('abcde'))
+        self.assertTrue(order.index('d') < order.index('e'))
+
+
+if __name__ == '__main__':
+    unittest.main()
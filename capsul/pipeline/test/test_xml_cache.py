@@ -0,0 +1,58 @@
+from __future__ import print_function
+
+import os
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+import capsul.process.test
+from capsul.pipeline.xml import create_xml_pipeline
+from capsul.pipeline import xml_cache
+
+
+class TestXMLPipelineCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix='capsul_xml_cache')
+        self.former_cache = os.environ.get('CAPSUL_XML_CACHE')
+        os.environ['CAPSUL_XML_CACHE'] = self.cache_dir
+        self.xml_file = osp.join(osp.dirname(capsul.process.test.__file__),
+                                 'xml_pipeline.xml')
+
+    def tearDown(self):
+        if self.former_cache is None:
+            del os.environ['CAPSUL_XML_CACHE']
+        else:
+            os.environ['CAPSUL_XML_CACHE'] = self.former_cache
+        shutil.rmtree(self.cache_dir)
+
+    def test_cached_pipeline(self):
+        module = 'capsul.process.test.xml_pipeline'
+        self.assertEqual(
+            xml_cache.load_cached_pipeline(module, None, self.xml_file),
+            None)
+        pipeline_class = create_xml_pipeline(module, None, self.xml_file)
+        self.assertEqual(len([f for f in os.listdir(self.cache_dir)
+                              if f.endswith('.py')]), 1)
+        cached_class = xml_cache.load_cached_pipeline(module, None,
+                                                      self.xml_file)
+        self.assertTrue(cached_class is not None)
+        self.assertEqual(cached_class.__name__, pipeline_class.__name__)
+        self.assertEqual(cached_class.__module__, module)
+        self.assertEqual(cached_class._pipeline_definition_calls,
+                         pipeline_class._pipeline_definition_calls)
+        self.assertEqual(cached_class.node_position,
+                         pipeline_class.node_position)
+        pipeline = create_xml_pipeline(module, None, self.xml_file)()
+        self.assertEqual(sorted(pipeline.nodes.keys()),
+                         sorted(pipeline_class().nodes.keys()))
+
+    def test_disabled_cache(self):
+        os.environ['CAPSUL_XML_CACHE'] = ''
+        create_xml_pipeline('capsul.process.test.xml_pipeline', None,
+                            self.xml_file)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,9 +5,19 @@ Classes
 =======
 :class:`GraphNode`
 ------------------
+:class:`Graph`
+--------------
+
+Functions
+=========
+:func:`longest_remaining_paths`
+-------------------------------
+:func:`flatten_workflow_graph`
+------------------------------
 '''
 
 # System import
+import heapq
 import logging
 import six
 
@@ -188,7 +198,29 @@ class Graph(object):
             self._nodes[from_node].add_link_to(self._nodes[to_node])
             self._links.append((from_node, to_node))
 
-    def topological_sort(self):
+    def remaining_path_costs(self, node_cost):
+        """ Compute, for each node, the cost of the longest path starting
+        at this node and ending at a node without successor (the cost of the
+        node is included). Ordering nodes by decreasing remaining path cost
+        gives priority to the critical path of the graph.
+
+        Parameters
+        ----------
+        node_cost: callable (mandatory)
+            function taking a GraphNode and returning its (estimated) cost
+
+        Returns
+        -------
+        costs: dict
+            {node.name: remaining path cost}
+        """
+        successors = dict((name, [n.name for n in node.links_to])
+                          for name, node in six.iteritems(self._nodes))
+        costs = dict((name, node_cost(node))
+                     for name, node in six.iteritems(self._nodes))
+        return longest_remaining_paths(successors, costs.get)
+
+    def topological_sort(self, priorities=None):
         """ Perform the topological sort: find an order in which all the
         nodes can be taken.
         Step 1: Identify nodes that have no incoming link (nnil).
@@ -199,6 +231,13 @@ class Graph(object):
         d) If the node has in-degree 0, add the node to nnil.
         Step 3: Assert that there is no loop in the graph.
 
+        Parameters
+        ----------
+        priorities: dict (optional)
+            {node.name: priority}. If given, whenever several nodes can be
+            taken, the one with the highest priority is taken first (see
+            remaining_path_costs()).
+
         Returns
         -------
         output: list of tuple
@@ -207,16 +246,34 @@ class Graph(object):
         """
         ordered_nodes = []
 
+        if priorities is None:
+            def push(node):
+                nnil.append(node)
+
+            def pop():
+                return nnil.pop()
+        else:
+            # nnil is a heap of (-priority, insertion index, node)
+            counter = [0]
+
+            def push(node):
+                counter[0] += 1
+                heapq.heappush(nnil, (-priorities.get(node.name, 0),
+                                      counter[0], node))
+
+            def pop():
+                return heapq.heappop(nnil)[2]
+
         # Step 1
         nnil = []
         for name, node in six.iteritems(self._nodes):
             if node.links_from_degree == 0:
-                nnil.append(node)
+                push(node)
 
         # Step 2
         while len(nnil):
         #-- a
-            c_nnil = nnil.pop()
+            c_nnil = pop()
         #-- b
             ordered_nodes.append(c_nnil)
         #-- c
@@ -224,7 +281,7 @@ class Graph(object):
                 node.remove_link_from(c_nnil)
         #-- d
                 if node.links_from_degree == 0:
-                    nnil.append(node)
+                    push(node)
 
         # Step 3
         if len(ordered_nodes) == len(self._nodes):
@@ -234,6 +291,84 @@ class Graph(object):
                             "Please inverstigate")
 
 
+def longest_remaining_paths(successors, cost):
+    """ Compute the longest remaining path cost of each node of a directed
+    acyclic graph: the maximum, over all paths starting at the node, of the
+    sum of node costs along the path (including the node itself).
+
+    Parameters
+    ----------
+    successors: dict (mandatory)
+        {node: list of successor nodes}. Nodes may be any hashable object,
+        all nodes must be keys of the dict.
+    cost: callable (mandatory)
+        function returning the cost of a node
+
+    Returns
+    -------
+    costs: dict
+        {node: longest remaining path cost}
+    """
+    result = {}
+    for start in successors:
+        if start in result:
+            continue
+        # iterative depth-first post-order traversal (pipelines may be too
+        # deep for recursion)
+        stack = [(start, iter(successors[start]))]
+        in_progress = set([start])
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child not in result:
+                    if child in in_progress:
+                        raise Exception("There is loop in the Graph."
+                                        "Please inverstigate")
+                    in_progress.add(child)
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                stack.pop()
+                in_progress.discard(node)
+                result[node] = cost(node) + max(
+                    [result[child] for child in successors[node]] or [0])
+    return result
+
+
+def flatten_workflow_graph(graph):
+    '''
+    Convert a workflow graph (as returned by
+    :meth:`~capsul.pipeline.pipeline.Pipeline.workflow_graph`), where
+    sub-pipelines are sub-graphs, into a flat list of process nodes and a
+    set of dependencies between them. A dependency to or from a
+    sub-pipeline is expanded to all the process nodes of the sub-pipeline.
+
+    Returns
+    -------
+    nodes: list
+        process nodes
+    dependencies: set
+        set of (node, successor_node) tuples
+    '''
+    nodes = []
+    dependencies = set()
+    # leaf process nodes of each graph node
+    leaves = {}
+    for name, gnode in six.iteritems(graph._nodes):
+        if isinstance(gnode.meta, list):
+            leaves[name] = list(gnode.meta)
+        else:
+            sub_nodes, sub_dependencies = flatten_workflow_graph(gnode.meta)
+            leaves[name] = sub_nodes
+            dependencies.update(sub_dependencies)
+        nodes += leaves[name]
+    for source, dest in graph._links:
+        for source_node in leaves[source]:
+            for dest_node in leaves[dest]:
+                dependencies.add((source_node, dest_node))
+    return nodes, dependencies
+
+
 if __name__ == '__main__':
 
     """ A toy example:
@@ -266,3 +401,4 @@ if __name__ == '__main__':
     r = g.topological_sort()
     r = [x[0] for x in r]
     print(" -> ".join(r))
+
@@ -20,6 +20,8 @@ from soma.sorted_dictionary import OrderedDict
 
 from capsul.process.xml import string_to_value
 from capsul.pipeline.pipeline_construction import PipelineConstructor
+from capsul.pipeline.xml_cache import (load_cached_pipeline,
+                                       save_cached_pipeline)
 from soma.controller import Controller
 
 from traits.api import Undefined
@@ -41,7 +43,23 @@ def create_xml_pipeline(module, name, xml_file):
         name of the new pipeline class
     xml_file: str (mandatory)
         name of file containing the XML description or XML string.
-    
+
+    When xml_file is a file, the pipeline class is stored in the XML
+    pipelines cache (see :mod:`capsul.pipeline.xml_cache`) and later
+    calls with the same file content load it from the cache instead of
+    parsing the XML again.
+    """
+    pipeline_class = load_cached_pipeline(module, name, xml_file)
+    if pipeline_class is None:
+        pipeline_class = _create_xml_pipeline(module, name, xml_file)
+        save_cached_pipeline(module, name, xml_file, pipeline_class)
+    return pipeline_class
+
+
+def _create_xml_pipeline(module, name, xml_file):
+    """
+    Parse a Capsul XML 2.0 pipeline description and build the pipeline
+    class. See :func:`create_xml_pipeline`.
     """
     if os.path.exists(xml_file):
         xml_pipeline = ET.parse(xml_file).getroot()
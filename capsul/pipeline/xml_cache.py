@@ -0,0 +1,205 @@
+'''
+Compile cache for XML pipelines.
+
+Parsing a pipeline XML file and building its class with a
+:class:`~capsul.pipeline.pipeline_construction.PipelineConstructor` is done
+each time the pipeline is loaded. To speed up the loading of toolboxes
+containing many XML pipelines, the class built from an XML file is
+converted into a Python module stored in a cache directory. Later loads of
+the same XML file (identified by a hash of its content) import this module,
+whose bytecode is itself cached by Python.
+
+The cache directory is given by the ``CAPSUL_XML_CACHE`` environment
+variable, or defaults to ``~/.cache/capsul/xml_pipelines``. Setting
+``CAPSUL_XML_CACHE`` to an empty string disables the cache.
+
+Functions
+=========
+:func:`xml_cache_directory`
+---------------------------
+:func:`load_cached_pipeline`
+----------------------------
+:func:`save_cached_pipeline`
+----------------------------
+:func:`pipeline_class_source`
+-----------------------------
+'''
+
+from __future__ import absolute_import
+
+import hashlib
+import logging
+import os
+import os.path as osp
+import uuid
+
+import six
+
+from soma.sorted_dictionary import OrderedDict
+from traits.api import Undefined
+
+from capsul.info import __version__ as capsul_version
+
+# Define the logger
+logger = logging.getLogger(__name__)
+
+# Change this value whenever the generated code changes
+cache_format_version = '1'
+
+
+def xml_cache_directory():
+    '''
+    Return the XML pipelines cache directory, or None if the cache is
+    disabled.
+    '''
+    directory = os.environ.get('CAPSUL_XML_CACHE')
+    if directory is None:
+        directory = osp.join(osp.expanduser('~'), '.cache', 'capsul',
+                             'xml_pipelines')
+    return directory or None
+
+
+def _cache_key(module, name, xml_file):
+    sha = hashlib.sha1()
+    for item in (cache_format_version, capsul_version, module, str(name)):
+        sha.update(item.encode('utf-8'))
+        sha.update(b'\0')
+    with open(xml_file, 'rb') as f:
+        sha.update(f.read())
+    return sha.hexdigest()
+
+
+def _cache_file(module, name, xml_file):
+    directory = xml_cache_directory()
+    if directory is None or not osp.isfile(xml_file):
+        return None, None
+    key = _cache_key(module, name, xml_file)
+    return key, osp.join(directory, 'capsul_xml_%s.py' % key)
+
+
+def _load_module(module_name, path):
+    if six.PY3:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    else:
+        import imp
+        return imp.load_source(module_name, path)
+
+
+def load_cached_pipeline(module, name, xml_file):
+    '''
+    Return the pipeline class previously stored in the cache for the given
+    create_xml_pipeline() arguments, or None if it is not in the cache.
+    '''
+    key, path = _cache_file(module, name, xml_file)
+    if path is None or not osp.exists(path):
+        return None
+    try:
+        cached_module = _load_module('capsul_xml_%s' % key, path)
+        return cached_module.pipeline_class
+    except Exception as e:
+        logger.warning('cannot load cached XML pipeline %s: %s'
+                       % (path, str(e)))
+        return None
+
+
+def save_cached_pipeline(module, name, xml_file, pipeline_class):
+    '''
+    Store a pipeline class built by
+    :func:`~capsul.pipeline.xml.create_xml_pipeline` in the cache. Nothing
+    is done (and False is returned) if the cache is disabled, if the
+    pipeline cannot be converted to Python code, or if the cache directory
+    cannot be written.
+    '''
+    key, path = _cache_file(module, name, xml_file)
+    if path is None:
+        return False
+    try:
+        source = pipeline_class_source(pipeline_class, xml_file)
+    except ValueError as e:
+        logger.debug('XML pipeline %s is not cached: %s'
+                     % (xml_file, str(e)))
+        return False
+    try:
+        directory = osp.dirname(path)
+        if not osp.isdir(directory):
+            os.makedirs(directory)
+        # write in a temporary file then rename it, so that concurrent
+        # loads never see a partially written module
+        tmp = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+        with open(tmp, 'w') as f:
+            f.write(source)
+        os.rename(tmp, path)
+    except (IOError, OSError) as e:
+        logger.debug('cannot write XML pipeline cache %s: %s'
+                     % (path, str(e)))
+        return False
+    return True
+
+
+def _value_source(value):
+    '''
+    Python source code of a value. Only values that can be produced by the
+    XML pipeline reader are supported, others raise a ValueError.
+    '''
+    if value is Undefined:
+        return 'Undefined'
+    if value is None or isinstance(value, (bool, float) + six.integer_types):
+        return repr(value)
+    if isinstance(value, six.string_types):
+        # unicode literals are valid in Python 2 and 3.3+
+        return 'u' + repr(six.text_type(value)).lstrip('u')
+    if isinstance(value, list):
+        return '[%s]' % ', '.join(_value_source(v) for v in value)
+    if isinstance(value, tuple):
+        return '(%s)' % ''.join('%s, ' % _value_source(v) for v in value)
+    if isinstance(value, OrderedDict) or type(value).__name__ == 'OrderedDict':
+        return 'OrderedDict([%s])' % ', '.join(
+            '(%s, %s)' % (_value_source(k), _value_source(v))
+            for k, v in six.iteritems(value))
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join(
+            '%s: %s' % (_value_source(k), _value_source(v))
+            for k, v in sorted(six.iteritems(value)))
+    raise ValueError('cannot convert value %s to Python source' % repr(value))
+
+
+def pipeline_class_source(pipeline_class, xml_file=None):
+    '''
+    Python source code of a module defining a pipeline class equivalent to
+    the given one, which must have been built by a
+    :class:`~capsul.pipeline.pipeline_construction.PipelineConstructor`. The
+    class is in the ``pipeline_class`` variable of the module.
+    '''
+    calls = ',\n'.join(
+        '        (%s, %s, %s)' % (_value_source(method),
+                                  _value_source(tuple(args)),
+                                  _value_source(kwargs))
+        for method, args, kwargs in pipeline_class._pipeline_definition_calls)
+    lines = [
+        '# Generated by capsul.pipeline.xml_cache%s. Do not edit.'
+        % (' from %s' % xml_file if xml_file else ''),
+        'from capsul.pipeline.pipeline_construction import '
+        'ConstructedPipeline',
+        'from soma.sorted_dictionary import OrderedDict',
+        'from traits.api import Undefined',
+        '',
+        'pipeline_class = type(%s, (ConstructedPipeline,), {'
+        % _value_source(str(pipeline_class.__name__)).lstrip('u'),
+        '    "__module__": %s,'
+        % _value_source(str(pipeline_class.__module__)).lstrip('u'),
+        '    "_pipeline_definition_calls": [\n%s\n    ],' % calls,
+        '    "do_autoexport_nodes_parameters": %s,'
+        % _value_source(pipeline_class.do_autoexport_nodes_parameters),
+        '    "node_position": %s,'
+        % _value_source(dict(pipeline_class.node_position)),
+        '})',
+        'pipeline_class.__doc__ = %s' % _value_source(pipeline_class.__doc__),
+    ]
+    if 'scene_scale_factor' in pipeline_class.__dict__:
+        lines.append('pipeline_class.scene_scale_factor = %s'
+                     % _value_source(pipeline_class.scene_scale_factor))
+    return '\n'.join(lines) + '\n'
@@ -35,7 +35,11 @@ import six
 import sys
 import functools
 import glob
+import re
 import tempfile
+import threading
+import multiprocessing
+import contextlib
 
 # Define the logger
 logger = logging.getLogger(__name__)
@@ -60,6 +64,82 @@ if sys.version_info[0] >= 3:
     unicode = str
     basestring = str
 
+# The current working directory is global to the interpreter: code which has
+# to change it (nipype interfaces) holds this lock while it does.
+_cwd_lock = threading.RLock()
+
+
+@contextlib.contextmanager
+def _working_directory(directory):
+    """ Context manager running its block in the given directory, and
+    restoring the initial one afterwards. The caller is expected to hold
+    _cwd_lock.
+    """
+    try:
+        cwd = os.getcwd()
+    except OSError:
+        cwd = None
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        if cwd is not None:
+            os.chdir(cwd)
+
+
+def _in_secondary_thread():
+    """ True when called from another thread than the main one """
+    main_thread = getattr(threading, 'main_thread', None)
+    if main_thread is None:
+        # python 2
+        return threading.current_thread().name != 'MainThread'
+    return threading.current_thread() is not main_thread()
+
+
+def _run_interface_in_child(interface, working_directory):
+    """ Run a nipype interface in a forked child process, working in the
+    given directory, and return its outputs dict, as given by its
+    ``_list_outputs()`` method in the child after the run.
+
+    The working directory of the calling process is left untouched, thus
+    several interfaces may run concurrently from threads. Outputs are
+    listed in the child, where the interface instance state set during the
+    run is available, but this state is not sent back to the parent.
+    """
+    if hasattr(multiprocessing, 'get_context'):
+        context = multiprocessing.get_context('fork')
+    else:
+        # python 2: fork is the only start method on posix systems
+        context = multiprocessing
+    reader, writer = context.Pipe(duplex=False)
+
+    def run_child():
+        reader.close()
+        try:
+            os.chdir(working_directory)
+            interface.run()
+            writer.send((None, interface._list_outputs()))
+        except BaseException:
+            import traceback
+            writer.send((traceback.format_exc(), None))
+        writer.close()
+
+    child = context.Process(target=run_child)
+    child.start()
+    writer.close()
+    try:
+        error, outputs = reader.recv()
+    except EOFError:
+        error, outputs = None, None
+    reader.close()
+    child.join()
+    if error is None and child.exitcode != 0:
+        error = 'child process exited with code %s' % child.exitcode
+    if error is not None:
+        raise RuntimeError('nipype interface %s failed:\n%s'
+                           % (interface.__class__.__name__, error))
+    return outputs
+
 
 class ProcessMeta(Controller.__class__):
     """ Class used to complete a process docstring
@@ -214,6 +294,9 @@ class Process(six.with_metaclass(ProcessMeta, Controller)):
     log_file: str (default None)
         if None, the log will be generated in the current directory
         otherwise it will be written in log_file path.
+    requirements: ResourceRequirements or dict (default None)
+        computing resources (CPU cores, memory, tags) needed by the process,
+        see :mod:`capsul.process.resources`.
 
     **Methods**
 
@@ -256,6 +339,8 @@ class Process(six.with_metaclass(ProcessMeta, Controller)):
         # Initialize the log file name
         self.log_file = None
         self.study_config = None
+        if not hasattr(self, 'requirements'):
+            self.requirements = None
 
         default_values = getattr(self, 'default_values', None)
         if default_values:
@@ -725,26 +810,113 @@ class Process(six.with_metaclass(ProcessMeta, Controller)):
         result = ce.study_config.run(process)
         # collect output parameers
         out_param_file = os.environ.get('SOMAWF_OUTPUT_PARAMS')
+        if out_param_file is not None:
+            output_params = Process._output_parameters(process, result)
+            with open(out_param_file, 'w') as f:
+                json.dump(json_utils.to_json(output_params), f)
+
+    @staticmethod
+    def _output_parameters(process, result):
+        '''
+        Output parameters values of an executed process which have to be
+        sent back to soma-workflow (output files are not, since they are
+        known before execution).
+        '''
+        if result is None:
+            result = {}
         output_params = {}
+        reserved_params = ("nodes_activation", "selection_changed")
+        for param, trait in six.iteritems(process.user_traits()):
+            if param in reserved_params or not trait.output:
+                continue
+            if isinstance(trait.trait_type, (File, Directory)) \
+                    and trait.input_filename is not False:
+                continue
+            elif isinstance(trait.trait_type, List) \
+                    and isinstance(trait.inner_traits[0].trait_type,
+                                   (File, Directory)) \
+                    and trait.inner_traits[0].trait_type.input_filename \
+                        is not False \
+                    and trait.input_filename is not False:
+                continue
+            output_params[param] = getattr(process, param)
+        output_params.update(result)
+        return output_params
+
+    @staticmethod
+    def run_fused_from_commandline(process_definitions, links=()):
+        '''
+        Run several processes in sequence, in the same Python interpreter.
+        This is the command of jobs built by merging several ``capsul_job``
+        jobs (see :func:`~capsul.pipeline.pipeline_workflow.workflow_from_pipeline`).
+
+        Input parameters are read from the JSON file given in the
+        ``SOMAWF_INPUT_PARAMS`` environment variable, as in
+        :meth:`run_from_commandline`, parameters of the i-th process being
+        prefixed with ``"i:"``. Output parameters are written the same way.
+
+        Parameters
+        ----------
+        process_definitions: list of str
+            the processes to run, in order
+        links: list
+            (dest_index, dest_param, source_index, source_param) tuples:
+            after process ``source_index`` has run, its ``source_param``
+            value is given to the ``dest_param`` parameter of process
+            ``dest_index``.
+
+        Values containing ``<capsul_local_temp_N...>`` are replaced with the
+        path of a file in a local temporary directory, removed at the end.
+        They are used for temporary files produced and used only by the
+        fused processes.
+        '''
+        from capsul.engine import capsul_engine
+
+        ce = capsul_engine()
+        ce.study_config.use_soma_workglow = False
+        param_file = os.environ.get('SOMAWF_INPUT_PARAMS')
+        if param_file is None:
+            params_conf = {}
+        else:
+            with open(param_file) as f:
+                params_conf = json_utils.from_json(json.load(f))
+        all_params = [{} for definition in process_definitions]
+        for key, value in six.iteritems(params_conf.get('parameters', {})):
+            index, param = key.split(':', 1)
+            all_params[int(index)][param] = value
+
+        local_dir = tempfile.mkdtemp(prefix='capsul_fused_')
+        local_temp = re.compile('<capsul_local_temp_([0-9]+)([^>]*)>')
+
+        def local_path(value):
+            if isinstance(value, six.string_types):
+                return local_temp.sub(
+                    lambda m: os.path.join(local_dir,
+                                           'tmp_%s%s' % m.groups()),
+                    value)
+            if isinstance(value, list):
+                return [local_path(item) for item in value]
+            return value
+
+        output_params = {}
+        try:
+            for index, definition in enumerate(process_definitions):
+                process = ce.get_process_instance(definition)
+                params = dict((k, local_path(v))
+                              for k, v in six.iteritems(all_params[index]))
+                process.import_from_dict(params)
+                result = ce.study_config.run(process)
+                outputs = Process._output_parameters(process, result)
+                for param, value in six.iteritems(outputs):
+                    output_params['%d:%s' % (index, param)] = value
+                for dest, dest_param, source, source_param in links:
+                    if source == index:
+                        all_params[dest][dest_param] \
+                            = getattr(process, source_param)
+        finally:
+            shutil.rmtree(local_dir, ignore_errors=True)
+        out_param_file = os.environ.get('SOMAWF_OUTPUT_PARAMS')
         if out_param_file is not None:
-            if result is None:
-                result = {}
-            reserved_params = ("nodes_activation", "selection_changed")
-            for param, trait in six.iteritems(process.user_traits()):
-                if param in reserved_params or not trait.output:
-                    continue
-                if isinstance(trait.trait_type, (File, Directory)) \
-                        and trait.input_filename is not False:
-                    continue
-                elif isinstance(trait.trait_type, List) \
-                        and isinstance(trait.inner_traits[0].trait_type,
-                                       (File, Directory)) \
-                        and trait.inner_traits[0].trait_type.input_filename \
-                            is not False \
-                        and trait.input_filename is not False:
-                    continue
-                output_params[param] = getattr(process, param)
-            output_params.update(result)
             with open(out_param_file, 'w') as f:
                 json.dump(json_utils.to_json(output_params), f)
 
@@ -1180,6 +1352,9 @@ class FileCopyProcess(Process):
                 destdir = output_directory
         else:
             destdir = self.destination
+        # work on absolute paths, so that the copies do not depend on the
+        # current directory, which may be changed by other threads
+        destdir = os.path.abspath(destdir)
         self._destination = destdir
         output_directory = self.destination
         if output_directory is None:
@@ -1504,7 +1679,27 @@ class FileCopyProcess(Process):
 
 class NipypeProcess(FileCopyProcess):
     """ Base class used to wrap nipype interfaces.
+
+    Nipype interfaces work in the current directory, which is global to the
+    interpreter. When run from a secondary thread (a thread-based scheduler
+    for instance), the interface is thus run in a forked child process
+    working in the output directory: the working directory of the other
+    threads is not changed, and several nodes may run concurrently. The
+    interface outputs are listed in the child after the run and sent back
+    to the process. The interface instance state set during the run is not
+    sent back, though.
+
+    When run from the main thread, or when the ``fork_when_threaded``
+    attribute is set to False, the interface is run in the current process,
+    in the output directory, one interface at a time. Setting
+    ``fork_when_threaded`` to False is needed when the interface instance
+    state has to be kept after the run, or when forking is not safe: a
+    forked child may deadlock on locks held by other threads of the parent
+    at the time of the fork (in libraries which do not reset them after a
+    fork).
     """
+    fork_when_threaded = True
+
     def __init__(self, nipype_instance, use_temp_output_dir=None,
                  *args, **kwargs):
         """ Initialize the NipypeProcess class.
@@ -1616,6 +1811,15 @@ class NipypeProcess(FileCopyProcess):
         from capsul.in_context import nipype as inp_npp
         inp_npp.configure_all()
     
+    def _update_interface_inputs(self):
+        # Force nipype update
+        for trait_name in self._nipype_interface.inputs.traits().keys():
+            if trait_name in self.user_traits():
+                old = getattr(self._nipype_interface.inputs, trait_name)
+                new = getattr(self, trait_name)
+                if old is Undefined and old != new:
+                    setattr(self._nipype_interface.inputs, trait_name, new)
+
     def _run_process(self):
         """ Method that do the processings when the instance is called.
 
@@ -1624,46 +1828,34 @@ class NipypeProcess(FileCopyProcess):
         runtime: InterfaceResult
             object containing the running results
         """
-        try:
-            cwd = os.getcwd()
-        except OSError:
-            cwd = None
         if self.output_directory is None or self.output_directory is Undefined:
             raise ValueError('output_directory is not set but is mandatory '
                              'to run a NipypeProcess')
-        os.chdir(self.output_directory)
-        self.synchronize += 1
-
-        # Force nipype update
-        for trait_name in self._nipype_interface.inputs.traits().keys():
-            if trait_name in self.user_traits():
-                old = getattr(self._nipype_interface.inputs, trait_name)
-                new = getattr(self, trait_name)
-                if old is Undefined and old != new:
-                    setattr(self._nipype_interface.inputs, trait_name, new)
-
-        # activate config
-        #study_config = self.get_study_config()
-        #print('SC:', study_config.export_to_dict())
-
-        results = self._nipype_interface.run()
-        self.synchronize += 1
-        
-        # For spm, need to move the batch
-        # (create in cwd: cf nipype.interfaces.matlab.matlab l.181)
-        if self._nipype_interface_name == "spm":
-            mfile = os.path.join(
-                os.getcwd(),
-                self._nipype_interface.mlab.inputs.script_file)
-            destmfile = os.path.join(
-                self.output_directory,
-                self._nipype_interface.mlab.inputs.script_file)
-            if os.path.isfile(mfile):
-                shutil.move(mfile, destmfile)
-        
-        # Restore cwd
-        if cwd is not None:
-            os.chdir(cwd)
+        output_directory = os.path.abspath(self.output_directory)
+
+        # Run the interface in output_directory. For spm, the batch is also
+        # created there (cf nipype.interfaces.matlab.matlab l.181), where
+        # _after_run_process() expects it.
+        if self.fork_when_threaded and hasattr(os, 'fork') \
+                and _in_secondary_thread():
+            # the current directory is not changed: outputs are listed in
+            # the child
+            self._update_interface_inputs()
+            outputs = _run_interface_in_child(self._nipype_interface,
+                                              output_directory)
+            for name, value in six.iteritems(outputs or {}):
+                try:
+                    self.set_parameter('_' + name, value)
+                except Exception as e:
+                    logger.debug('cannot set nipype output %s of %s: %s'
+                                 % (name, self.name, e))
+        else:
+            # nipype outputs may depend on the current directory
+            with _cwd_lock, _working_directory(output_directory):
+                self.synchronize += 1
+                self._update_interface_inputs()
+                self._nipype_interface.run()
+                self.synchronize += 1
 
         #return results.__dict__
         return None
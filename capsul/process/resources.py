@@ -0,0 +1,94 @@
+'''
+Computing resources requirements of processes and pipeline nodes.
+
+A process may declare the resources it needs to run in its ``requirements``
+attribute: number of CPU cores, memory, and optional tags naming limited
+resources (such as software licences). A pipeline node may override the
+requirements of its process with its own ``requirements`` attribute::
+
+    from capsul.process.resources import ResourceRequirements
+
+    class Registration(Process):
+        def __init__(self):
+            super(Registration, self).__init__()
+            self.requirements = ResourceRequirements(cpus=4, memory=8000,
+                                                     tags=['matlab'])
+
+    pipeline.nodes['registration'].requirements = ResourceRequirements(
+        cpus=8)
+
+Requirements are exported to soma-workflow jobs (see
+:func:`~capsul.pipeline.pipeline_workflow.workflow_from_pipeline`) and used
+by the local parallel scheduler
+(:mod:`capsul.study_config.local_scheduler`) to avoid overloading the
+machine.
+
+Classes
+=======
+:class:`ResourceRequirements`
+-----------------------------
+
+Functions
+=========
+:func:`get_requirements`
+------------------------
+'''
+
+from __future__ import print_function
+
+import six
+
+from traits.api import Int, Float, List, Str
+
+from soma.controller import Controller
+
+
+class ResourceRequirements(Controller):
+    '''
+    Resources needed by a single execution of a process.
+    '''
+
+    cpus = Int(1, desc='Number of CPU cores used by the process')
+    memory = Float(0., desc='Maximum memory used by the process in MB '
+                   '(0 means unknown)')
+    tags = List(Str(), desc='Names of limited resources needed by the '
+                'process (for instance "matlab licence"). Each tag is '
+                'an available unit of this resource.')
+
+    def __init__(self, cpus=1, memory=0., tags=None):
+        super(ResourceRequirements, self).__init__()
+        self.cpus = cpus
+        self.memory = memory
+        if tags:
+            self.tags = list(tags)
+
+    def to_dict(self):
+        return {'cpus': self.cpus,
+                'memory': self.memory,
+                'tags': list(self.tags)}
+
+
+def get_requirements(node_or_process):
+    '''
+    Return the resources requirements of a pipeline node or a process as a
+    dictionary with 'cpus', 'memory' (in MB) and 'tags' items. Requirements
+    defined on a node take precedence on the ones of its process. The
+    ``requirements`` attribute may be a :class:`ResourceRequirements`
+    instance or a dictionary. If no requirements are defined, one CPU and
+    an unknown memory are returned.
+    '''
+    requirements = None
+    for item in (node_or_process, getattr(node_or_process, 'process', None)):
+        requirements = getattr(item, 'requirements', None)
+        if requirements is not None:
+            break
+    result = {'cpus': 1, 'memory': 0., 'tags': []}
+    if requirements is None:
+        return result
+    if isinstance(requirements, ResourceRequirements):
+        requirements = requirements.to_dict()
+    for key, value in six.iteritems(requirements):
+        if value is not None:
+            result[key] = value
+    result['tags'] = list(result['tags'])
+    return result
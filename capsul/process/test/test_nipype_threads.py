@@ -0,0 +1,85 @@
+from __future__ import print_function
+
+import unittest
+import os
+import os.path as osp
+import shutil
+import sys
+import tempfile
+import threading
+from capsul.process.process import _run_interface_in_child
+
+
+class DummyInterface(object):
+    """ Minimal nipype-like interface writing a file in the current
+    directory
+    """
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.output = None
+
+    def run(self):
+        if self.fail:
+            raise ValueError('dummy failure')
+        with open('output.txt', 'w') as f:
+            f.write(os.getcwd())
+        # state set during the run, as in nipype Function interfaces
+        self.output = osp.abspath('output.txt')
+
+    def _list_outputs(self):
+        return {'output': self.output}
+
+
+@unittest.skipIf(not hasattr(os, 'fork'), 'fork is not available')
+class TestNipypeThreads(unittest.TestCase):
+
+    def setUp(self):
+        self.dirs = [tempfile.mkdtemp(prefix='capsul_test_threads')
+                     for i in range(4)]
+
+    def tearDown(self):
+        for directory in self.dirs:
+            shutil.rmtree(directory)
+
+    def test_concurrent_runs(self):
+        cwd = os.getcwd()
+        errors = []
+        outputs = {}
+
+        def run(directory, fail):
+            try:
+                outputs[directory] = _run_interface_in_child(
+                    DummyInterface(fail), directory)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=run, args=(directory, i == 0))
+                   for i, directory in enumerate(self.dirs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue('dummy failure' in errors[0])
+        for directory in self.dirs[1:]:
+            with open(osp.join(directory, 'output.txt')) as f:
+                self.assertEqual(osp.realpath(f.read()),
+                                 osp.realpath(directory))
+            # outputs are listed in the child, after the run
+            self.assertEqual(
+                osp.realpath(outputs[directory]['output']),
+                osp.realpath(osp.join(directory, 'output.txt')))
+        self.assertFalse(osp.exists(osp.join(self.dirs[0], 'output.txt')))
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestNipypeThreads)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
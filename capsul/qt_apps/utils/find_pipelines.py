@@ -11,16 +11,12 @@ Functions
 
 # System import
 import logging
-import traceback
 import os
 import json
 import sys
-from setuptools import find_packages
-from inspect import isclass
 
 # CAPSUL import
-from capsul.api import Pipeline
-from capsul.api import Process
+from capsul.utils.process_index import indexed_modules
 
 # Define the logger
 logger = logging.getLogger(__name__)
@@ -102,61 +98,37 @@ def find_pipeline_and_process(module_name):
         logger.error("Can't load module {0}".format(module_name))
         return {}, []
 
-    # Get the module path
-    module = sys.modules[module_name]
-    if hasattr(module, '__path__'):
-        module_path = module.__path__[0]
-    else:
-        module_path = os.path.dirname(module.__file__)
-
-    # Use setuptools to go through the module
-    sub_modules = find_packages(where=module_path, exclude=("doc", ))
-    sub_modules = [module_name + "." + x for x in sub_modules]
-    sub_modules.insert(0, module_name)
-    logger.debug("Modules found with setuptools: '{0}'.".format(sub_modules))
-
-    # Shift
-    shift = len(module_name.split("."))
+    # Go through the module using the process index: only modules which
+    # have changed since the last search are imported
+    indexed = indexed_modules(module_name, ignore_errors=(Exception, ))
+    logger.debug("Modules found: '{0}'.".format(
+        [name for name, entry in indexed]))
 
     # Create a set with all pipelines and process
     pip_and_proc = [set(), set()]
-    for sub_module in sub_modules:
-        # Get the sub module path
-        sub_module_path = os.path.join(
-            module_path, *sub_module.split(".")[shift:])
-
-        # List all the mdule in sub module path
-        sub_sub_module_names = [
-            sub_module + "." + x[:-3] for x in os.listdir(sub_module_path)
-            if (x.endswith(".py") and not x.startswith("_"))]
-
-        # Try to import the sub sub module
-        for sub_sub_module_name in sub_sub_module_names:
-            try:
-                __import__(sub_sub_module_name)
-            except:
-                exc_info = sys.exc_info()
-                logger.error("".join(traceback.format_exception(*exc_info)))
-                logger.error("Can't load module "
-                              "{0}".format(sub_sub_module_name))
+    parent_classes = ["capsul.pipeline.pipeline.Pipeline",
+                      "capsul.process.process.Process"]
+    for sub_module_name, entry in indexed:
+        # Only modules files not starting with "_", outside the doc package
+        sub_module_path = sub_module_name.split(".")
+        if os.path.basename(entry["file"]).startswith("_") \
+                or not os.path.isfile(entry["file"]) \
+                or ".".join(sub_module_path[:-1]) == module_name + ".doc":
+            continue
+        if entry["error"] is not None:
+            logger.error(entry["error"])
+            logger.error("Can't load module {0}".format(sub_module_name))
+            continue
+
+        # From all the tools, find Pipeline and Process classes
+        for item in entry["items"]:
+            if item["name"].startswith("_") \
+                    or item["class_path"] in parent_classes:
                 continue
-
-            # Get the module
-            sub_sub_module = sys.modules[sub_sub_module_name]
-
-            # From all the tools, find Pipeline instance
-            for tool_name in dir(sub_sub_module):
-                if tool_name.startswith("_"):
-                    continue
-                tool = getattr(sub_sub_module, tool_name)
-                # Check all the authorized derived class
-                parent_classes = [Pipeline, Process]
-                for cnt, parent_class in enumerate(parent_classes):
-                    if (isclass(tool) and issubclass(tool, parent_class)) \
-                            and tool not in parent_classes:
-                        pip_and_proc[cnt].add(
-                            sub_sub_module_name + "." + tool_name)
-                        break
+            if item["kind"] == "pipeline":
+                pip_and_proc[0].add(sub_module_name + "." + item["name"])
+            elif item["kind"] == "process":
+                pip_and_proc[1].add(sub_module_name + "." + item["name"])
     # Format output
     output = {
         "pipeline_descs": list(pip_and_proc[0]),
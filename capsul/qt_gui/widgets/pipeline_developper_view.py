@@ -38,6 +38,7 @@ import os
 from pprint import pprint
 import weakref
 import tempfile
+import threading
 import soma.subprocess
 import distutils.spawn
 import importlib
@@ -54,6 +55,7 @@ from soma.qt_gui.qt_backend.Qt import QMessageBox
 from soma.sorted_dictionary import SortedDictionary
 from capsul.api import Switch, PipelineNode, OptionalOutputSwitch
 from capsul.pipeline import pipeline_tools
+from capsul.pipeline import pipeline_layout
 from capsul.api import Pipeline
 from capsul.api import Process
 from capsul.api import get_process_instance
@@ -259,7 +261,8 @@ class NodeGWidget(QtGui.QGraphicsItem):
                  parent=None, process=None, sub_pipeline=None,
                  colored_parameters=True,
                  logical_view=False, labels=[],
-                 show_opt_inputs=True, show_opt_outputs=True):
+                 show_opt_inputs=True, show_opt_outputs=True,
+                 detailed=True):
         super(NodeGWidget, self).__init__(parent)
 
         self.infoActived = QtGui.QGraphicsTextItem('', self)
@@ -284,6 +287,10 @@ class NodeGWidget(QtGui.QGraphicsItem):
         self.colored_parameters = colored_parameters
         self.logical_view = logical_view
         self.pipeline = pipeline
+        # level of detail: see set_level_of_detail()
+        self.detailed = detailed
+        self._lod_hidden = set()
+        self._plugs_built = False
 
         # Added to choose to visualize optional parameters
         self.show_opt_inputs = show_opt_inputs
@@ -314,6 +321,8 @@ class NodeGWidget(QtGui.QGraphicsItem):
             QtCore.Qt.LeftButton | QtCore.Qt.RightButton | QtCore.Qt.MiddleButton)
 
         self._build()
+        if not detailed:
+            self._apply_level_of_detail()
         if colored_parameters:
             process.on_trait_change(self._repaint_parameter, dispatch='ui')
         process.on_trait_change(self.update_parameters, 'user_traits_changed',
@@ -350,11 +359,15 @@ class NodeGWidget(QtGui.QGraphicsItem):
         '''
         self.labels = []
         for item in self.label_items:
+            self._lod_hidden.discard(item)
             item.deleteLater()  # FIXME there should be another way !
         self.label_items = []
         for label in labels:
             self._get_label(label)
         self._create_label_marks()
+        self._cache_items()
+        if not self.detailed:
+            self._apply_level_of_detail()
 
     def _get_label(self, label, register=True):
         class Label(object):
@@ -399,7 +412,8 @@ class NodeGWidget(QtGui.QGraphicsItem):
         return code
 
     def _repaint_parameter(self, param_name, new_value):
-        if self.logical_view or param_name not in self.parameters:
+        if self.logical_view or param_name not in self.parameters \
+                or not self._plugs_built:
             return
         param_text = self._parameter_text(param_name)
         param_item = self.in_params.get(param_name)
@@ -424,10 +438,8 @@ class NodeGWidget(QtGui.QGraphicsItem):
         self.title.setDefaultTextColor(QtCore.Qt.white)
         self.title.setParentItem(self)
 
-        if self.logical_view:
-            self._build_logical_view_plugs()
-        else:
-            self._build_regular_view_plugs()
+        if self.detailed:
+            self._build_plugs()
         self._create_label_marks()
 
         ctr = self.contentsRect()
@@ -464,6 +476,7 @@ class NodeGWidget(QtGui.QGraphicsItem):
         self.box_title.setParentItem(self)
 
         self.changeSize(ctr.width(), ctr.height())
+        self._cache_items()
 
     def changeSize(self, w, h):
         limit = False
@@ -531,11 +544,12 @@ class NodeGWidget(QtGui.QGraphicsItem):
             w=self.wmin
         margin = 20
         factor_h = 35.0
-        h = factor_h * len(self.in_plugs)+margin
+        h = factor_h * len(self._plug_names(False))+margin
         self.hmin=h
 
-        if h < factor_h * len(self.out_plugs):
-            h = factor_h * len(self.out_plugs) + margin
+        n_out = len(self._plug_names(True))
+        if h < factor_h * n_out:
+            h = factor_h * n_out + margin
             self.hmin = h
         self.sizer.hmin = h
         self.changeSize(w, h + margin)
@@ -567,6 +581,56 @@ class NodeGWidget(QtGui.QGraphicsItem):
         label_item.setWidget(label_w)
         return label_item
 
+    def _build_plugs(self):
+        if self.logical_view:
+            self._build_logical_view_plugs()
+        else:
+            self._build_regular_view_plugs()
+        self._plugs_built = True
+
+    def _plug_names(self, output):
+        '''
+        Names of the input (or output) plugs of the node, whether their
+        items are created or not (see :meth:`set_level_of_detail`)
+        '''
+        if self._plugs_built:
+            return list((self.out_plugs if output else self.in_plugs).keys())
+        names = []
+        for name, pipeline_plug in six.iteritems(self.parameters):
+            plug_output = (not pipeline_plug.output if self.name in (
+                'inputs', 'outputs') else pipeline_plug.output)
+            if plug_output != output:
+                continue
+            if self.logical_view:
+                return ['outputs' if output else 'inputs']
+            if pipeline_plug.optional and not (
+                    self.show_opt_outputs if output
+                    else self.show_opt_inputs):
+                continue
+            names.append(name)
+        return names
+
+    def has_plug(self, name, output):
+        return name in self._plug_names(output)
+
+    def plug_point(self, name, output):
+        '''
+        Scene position where links to the plug are attached. When the plug
+        items are not created yet, it is on the node border, where the plug
+        will be placed.
+        '''
+        if self._plugs_built:
+            plugs = self.out_plugs if output else self.in_plugs
+            return self.mapToScene(plugs[name].get_plug_point())
+        names = self._plug_names(output)
+        rect = self.box.rect()
+        y = rect.height() * (names.index(name) + 1) / (len(names) + 1)
+        if output:
+            x = rect.width()
+        else:
+            x = 0.
+        return self.mapToScene(QtCore.QPointF(x, y))
+
     def _build_regular_view_plugs(self):
         margin = 5
         plug_width = 12
@@ -738,6 +802,54 @@ class NodeGWidget(QtGui.QGraphicsItem):
                 ypos = self.mapRectFromItem(
                     label_item, label_item.boundingRect()).bottom()
 
+    def set_level_of_detail(self, detailed):
+        '''
+        In non-detailed mode, the node is drawn collapsed: plugs, parameter
+        names and labels are hidden, the node keeps its size and links stay
+        attached to the (hidden) plugs. Huge pipelines are thus much faster
+        to draw when zoomed out.
+
+        A node created in non-detailed mode has no plug and parameter items:
+        they are created when it is first switched to detailed mode. Until
+        then, links are attached to the node border (see
+        :meth:`plug_point`).
+        '''
+        self.detailed = detailed
+        if detailed and not self._plugs_built:
+            self._build_plugs()
+            self.update_node()
+        self._apply_level_of_detail()
+
+    def _detail_items(self):
+        for items in (self.in_plugs, self.in_params, self.out_plugs,
+                      self.out_params):
+            for item in values(items):
+                yield item
+        for item in self.label_items:
+            yield item
+
+    def _apply_level_of_detail(self):
+        if self.detailed:
+            for item in self._lod_hidden:
+                item.setVisible(True)
+            self._lod_hidden = set()
+        else:
+            # also hides items created since the last call
+            for item in self._detail_items():
+                if item.isVisible():
+                    item.setVisible(False)
+                    self._lod_hidden.add(item)
+
+    def _cache_items(self):
+        # text items are costly to draw: render them once in a pixmap
+        cache_mode = QtGui.QGraphicsItem.DeviceCoordinateCache
+        self.title.setCacheMode(cache_mode)
+        for params in (self.in_params, self.out_params):
+            for item in values(params):
+                item.setCacheMode(cache_mode)
+        for item in self.label_items:
+            item.setCacheMode(cache_mode)
+
     def clear_plugs(self):
         for plugs, params in ((self.in_plugs, self.in_params),
                               (self.out_plugs, self.out_params)):
@@ -750,6 +862,15 @@ class NodeGWidget(QtGui.QGraphicsItem):
         self.out_params = {}
         self.out_plugs = {}
 
+    def update_activation(self):
+        '''
+        Update the node colors after its activation has changed, without
+        updating all its parameters as :meth:`update_node` does.
+        '''
+        self._set_brush()
+        self.box_title.setBrush(self.title_brush)
+        self.box.setBrush(self.bg_brush)
+
     def updateInfoActived(self, state):
         if state:
             self.infoActived.setPlainText('')
@@ -977,7 +1098,12 @@ class NodeGWidget(QtGui.QGraphicsItem):
         self._set_brush()
         self.box_title.setBrush(self.title_brush)
         self.box.setBrush(self.bg_brush)
-        for param, pipeline_plug in six.iteritems(self.parameters):
+        if self._plugs_built:
+            parameters = self.parameters
+        else:
+            # plug items are created when the node is first detailed
+            parameters = {}
+        for param, pipeline_plug in six.iteritems(parameters):
             output = (not pipeline_plug.output if self.name in (
                 'inputs', 'outputs') else pipeline_plug.output)
             if output:
@@ -1015,7 +1141,7 @@ class NodeGWidget(QtGui.QGraphicsItem):
                 else:
                     params[param].setHtml(self._parameter_text(param))
 
-        if not self.logical_view:
+        if self._plugs_built and not self.logical_view:
             # check removed params
             to_remove = []
 
@@ -1040,6 +1166,9 @@ class NodeGWidget(QtGui.QGraphicsItem):
                 self._remove_parameter(param)
 
         self._shift_params()
+        self._cache_items()
+        if not self.detailed:
+            self._apply_level_of_detail()
 
         #         rect = self.title.mapRectToParent(self.title.boundingRect())
         #         margin = 5
@@ -1075,7 +1204,8 @@ class NodeGWidget(QtGui.QGraphicsItem):
             if hasattr(self, name):
                 excluded.append(getattr(self, name))
         for child in self.childItems():
-            if not child.isVisible() or child in excluded:
+            if (not child.isVisible() and child not in self._lod_hidden) \
+                    or child in excluded:
                 continue
             item_rect = self.mapRectFromItem(child, child.boundingRect())
             if first:
@@ -1328,6 +1458,7 @@ class Link(QtGui.QGraphicsPathItem):
                      target.x() - 90, target.y(),
                      target.x() - 5, target.y())
         self.setPath(path)
+        self._ends = (origin.x(), origin.y(), target.x(), target.y())
         self.setZValue(0.5)
         self.active = active
         self.weak = weak
@@ -1349,6 +1480,12 @@ class Link(QtGui.QGraphicsPathItem):
         self.setPen(self.pen)
 
     def update(self, origin, target):
+        ends = (origin.x(), origin.y(), target.x(), target.y())
+        if ends == self._ends:
+            # unchanged: avoid a repaint, which would in turn trigger
+            # PipelineScene.update_paths()
+            return
+        self._ends = ends
         path = QtGui.QPainterPath()
         path.moveTo(origin.x(), origin.y())
         path.cubicTo(origin.x() + 90, origin.y(),
@@ -1438,6 +1575,7 @@ class PipelineScene(QtGui.QGraphicsScene):
         self.logical_view = False
         self._enable_edition = False
         self.labels = []
+        self.detailed = True
 
         #         pen = QtGui.QPen(QtGui.QColor(250,100,0),2)
         #         self.l = QtCore.QLineF(-10,0,10,0)
@@ -1487,6 +1625,8 @@ class PipelineScene(QtGui.QGraphicsScene):
             gnode.setPos(pos)
         
         self.gnodes[name] = gnode
+        if not self.detailed:
+            gnode.set_level_of_detail(False)
 #         gnode.update_node()
         
         
@@ -1533,7 +1673,8 @@ class PipelineScene(QtGui.QGraphicsScene):
             node_name, node.plugs, self.pipeline,
             sub_pipeline=sub_pipeline, process=process,
             colored_parameters=self.colored_parameters,
-            logical_view=self.logical_view, labels=self.labels)
+            logical_view=self.logical_view, labels=self.labels,
+            detailed=self.detailed)
         self._add_node(node_name, gnode)
         gnode.update_node()
         return gnode
@@ -1576,12 +1717,10 @@ class PipelineScene(QtGui.QGraphicsScene):
         dest_gnode = self.gnodes.get(dest_gnode_name)
 
         if dest_gnode is not None:
-            if dest_param in dest_gnode.in_plugs:
+            if dest_gnode.has_plug(dest_param, False):
                 glink = Link(
-                    source_gnode.mapToScene(
-                        source_gnode.out_plugs[source_param].get_plug_point()),
-                    dest_gnode.mapToScene(
-                        dest_gnode.in_plugs[dest_param].get_plug_point()),
+                    source_gnode.plug_point(source_param, True),
+                    dest_gnode.plug_point(dest_param, False),
                     active, weak, color)
                 self.glinks[source_dest] = glink
                 self.addItem(glink)
@@ -1607,6 +1746,19 @@ class PipelineScene(QtGui.QGraphicsScene):
             self.removeItem(glink)
             del self.glinks[new_source_dest]
 
+    def set_level_of_detail(self, detailed):
+        '''
+        Draw nodes collapsed (detailed=False) or with their plugs and
+        parameters. Nodes added in non-detailed mode create their plug and
+        parameter items when they are first detailed. See
+        :meth:`NodeGWidget.set_level_of_detail`.
+        '''
+        if detailed == self.detailed:
+            return
+        self.detailed = detailed
+        for gnode in self.gnodes.values():
+            gnode.set_level_of_detail(detailed)
+
     def update_paths(self, regions=[]):
         for name, i in six.iteritems(self.gnodes):
             self.pos[i.name] = i.pos()
@@ -1619,10 +1771,8 @@ class PipelineScene(QtGui.QGraphicsScene):
             dest_gnode_name, dest_param = dest
             source_gnode = self.gnodes[source_gnode_name]
             dest_gnode = self.gnodes[dest_gnode_name]
-            glink.update(source_gnode.mapToScene(
-                source_gnode.out_plugs[source_param].get_plug_point()),
-                dest_gnode.mapToScene(
-                    dest_gnode.in_plugs[dest_param].get_plug_point()))
+            glink.update(source_gnode.plug_point(source_param, True),
+                         dest_gnode.plug_point(dest_param, False))
 
     def set_pipeline(self, pipeline):
 
@@ -1642,7 +1792,8 @@ class PipelineScene(QtGui.QGraphicsScene):
                     'inputs', pipeline_inputs, pipeline,
                     process=pipeline,
                     colored_parameters=self.colored_parameters,
-                    logical_view=self.logical_view))
+                    logical_view=self.logical_view,
+                    detailed=self.detailed))
         for node_name, node in six.iteritems(pipeline.nodes):
             if not node_name:
                 continue
@@ -1653,7 +1804,8 @@ class PipelineScene(QtGui.QGraphicsScene):
                     'outputs', pipeline_outputs, pipeline,
                     process=pipeline,
                     colored_parameters=self.colored_parameters,
-                    logical_view=self.logical_view))
+                    logical_view=self.logical_view,
+                    detailed=self.detailed))
 
         for source_node_name, source_node in six.iteritems(pipeline.nodes):
             for source_parameter, source_plug \
@@ -1674,6 +1826,93 @@ class PipelineScene(QtGui.QGraphicsScene):
         else:
             self._update_regular_pipeline()
 
+    def apply_pipeline_changes(self, changes):
+        '''
+        Update only the graphics items affected by pipeline changes, as
+        described by the value of the pipeline ``selection_changed`` event:
+        nodes and plugs activations, added and removed links (see
+        :class:`~capsul.pipeline.pipeline.Pipeline`). In logical view, or if
+        a link involves a plug which is not displayed yet, the whole scene
+        is updated instead.
+        '''
+        if self.logical_view:
+            self.update_pipeline()
+            return
+        pipeline = self.pipeline
+        for added, link in changes.get('links', []):
+            source_node_name, source_param, dest_node_name, dest_param, \
+                weak = link
+            if not added:
+                self._remove_link(((source_node_name, source_param),
+                                   (dest_node_name, dest_param)))
+                continue
+            source_node = pipeline.nodes.get(source_node_name)
+            dest_node = pipeline.nodes.get(dest_node_name)
+            if source_node is None or dest_node is None:
+                continue
+            source_plug = source_node.plugs.get(source_param)
+            dest_plug = dest_node.plugs.get(dest_param)
+            if source_plug is None or dest_plug is None:
+                continue
+            source_gnode = self.gnodes.get(source_node_name or 'inputs')
+            dest_gnode = self.gnodes.get(dest_node_name or 'outputs')
+            if source_gnode is None or dest_gnode is None \
+                    or not source_gnode.has_plug(source_param, True) \
+                    or not dest_gnode.has_plug(dest_param, False):
+                self.update_pipeline()
+                return
+            self.add_link((source_node_name, source_param),
+                          (dest_node_name, dest_param),
+                          active=source_plug.activated
+                              and dest_plug.activated,
+                          weak=weak)
+
+        updated_links = set()
+        for node_name, plug_names \
+                in six.iteritems(changes.get('activation', {})):
+            node = pipeline.nodes.get(node_name)
+            if node is None:
+                continue
+            if node_name == '':
+                gnode_names = ('inputs', 'outputs')
+            else:
+                gnode_names = (node_name, )
+            for gnode_name in gnode_names:
+                gnode = self.gnodes.get(gnode_name)
+                if gnode is not None:
+                    gnode.active = node.activated
+                    gnode.update_activation()
+            for plug_name in plug_names:
+                plug = node.plugs.get(plug_name)
+                if plug is None:
+                    continue
+                links = [(node_name, plug_name, node, plug) + link
+                         for link in plug.links_to]
+                links += [link[:4] + (node_name, plug_name, node, plug,
+                                      link[4])
+                          for link in plug.links_from]
+                for source_node_name, source_param, source_node, \
+                        source_plug, dest_node_name, dest_param, \
+                        dest_node, dest_plug, weak in links:
+                    # links to nodes of a parent pipeline or of a
+                    # sub-pipeline are not displayed here
+                    if source_node is not pipeline.nodes.get(
+                            source_node_name) \
+                            or dest_node is not pipeline.nodes.get(
+                                dest_node_name):
+                        continue
+                    source_dest = ((source_node_name or 'inputs',
+                                    source_param),
+                                   (dest_node_name or 'outputs', dest_param))
+                    if source_dest in updated_links:
+                        continue
+                    updated_links.add(source_dest)
+                    glink = self.glinks.get(source_dest)
+                    if glink is not None:
+                        glink.update_activation(
+                            source_plug.activated and dest_plug.activated,
+                            weak, "current")
+
     def _update_regular_pipeline(self):
         # normal view
         pipeline = self.pipeline
@@ -1728,14 +1967,16 @@ class PipelineScene(QtGui.QGraphicsScene):
                             'inputs', pipeline_inputs, pipeline,
                             process=pipeline,
                             colored_parameters=self.colored_parameters,
-                            logical_view=self.logical_view))
+                            logical_view=self.logical_view,
+                            detailed=self.detailed))
                 if pipeline_outputs and 'outputs' not in self.gnodes:
                     self._add_node(
                         'outputs', NodeGWidget(
                             'outputs', pipeline_outputs, pipeline,
                             process=pipeline,
                             colored_parameters=self.colored_parameters,
-                            logical_view=self.logical_view))
+                            logical_view=self.logical_view,
+                            detailed=self.detailed))
             elif node_name not in self.gnodes:
                 process = None
                 if isinstance(node, Switch):
@@ -1859,14 +2100,16 @@ class PipelineScene(QtGui.QGraphicsScene):
                             'inputs', pipeline_inputs, pipeline,
                             process=pipeline,
                             colored_parameters=self.colored_parameters,
-                            logical_view=self.logical_view))
+                            logical_view=self.logical_view,
+                            detailed=self.detailed))
                 if pipeline_outputs and 'outputs' not in self.gnodes:
                     self._add_node(
                         'outputs', NodeGWidget(
                             'outputs', pipeline_outputs, pipeline,
                             process=pipeline,
                             colored_parameters=self.colored_parameters,
-                            logical_view=self.logical_view))
+                            logical_view=self.logical_view,
+                            detailed=self.detailed))
             elif node_name not in self.gnodes:
                 process = None
                 if isinstance(node, Switch):
@@ -2224,6 +2467,15 @@ class PipelineScene(QtGui.QGraphicsScene):
         return trait_type_str
 
 
+class LayoutNotifier(QtCore.QObject):
+    '''
+    Carries nodes layouts computed in a worker thread to the GUI thread
+    (signals emitted from another thread are queued).
+    '''
+    positions_ready = QtCore.Signal(object, object, bool)
+    ''' emitted with (layout_key, positions, final) '''
+
+
 class PipelineDevelopperView(QGraphicsView):
     '''
     Pipeline representation as a graph, using boxes and arrows.
@@ -2333,6 +2585,13 @@ class PipelineDevelopperView(QGraphicsView):
     * orange link: active
     * dotted line link: weak link
     '''
+    lod_scale_threshold = 0.4
+    '''
+    Level of detail: when the view scale is below this threshold, nodes are
+    drawn collapsed, without their plugs and parameters names (which would
+    not be readable anyway), and antialiasing is disabled. This keeps huge
+    pipelines interactive when zoomed out.
+    '''
 
     class ProcessNameEdit(Qt.QLineEdit):
         ''' A specialized QLineEdit with completion for process name
@@ -2500,6 +2759,10 @@ class PipelineDevelopperView(QGraphicsView):
         self._pipeline_filename = ""
         self._restricted_edition = False
         self.disable_overwrite = False
+        self._layout_request = None
+        self._layout_fit = False
+        self._layout_notifier = LayoutNotifier(self)
+        self._layout_notifier.positions_ready.connect(self._layout_ready)
 
         if pipeline is None:
             pipeline = Pipeline()
@@ -2537,7 +2800,7 @@ class PipelineDevelopperView(QGraphicsView):
             if hasattr(pipeline, 'pipeline_steps'):
                 pipeline.pipeline_steps.on_trait_change(
                     self._reset_pipeline, remove=True)
-            pipeline.on_trait_change(self._reset_pipeline,
+            pipeline.on_trait_change(self._pipeline_changed,
                                      'selection_changed', remove=True)
             pipeline.on_trait_change(self._reset_pipeline,
                                      'user_traits_changed', remove=True)
@@ -2587,6 +2850,10 @@ class PipelineDevelopperView(QGraphicsView):
         self.scene.node_keydelete_clicked.connect(self.node_keydelete_clicked)
         self.scene.pos = pos
         self.scene.dim = dim #add by Irmage
+        # nodes are created collapsed, their plugs and parameters items are
+        # only created if the view scale allows to display them (see
+        # _update_level_of_detail())
+        self.scene.detailed = False
         self.scene.set_pipeline(pipeline)
         self.setWindowTitle(pipeline.name)
         self.setScene(self.scene)
@@ -2600,6 +2867,10 @@ class PipelineDevelopperView(QGraphicsView):
         ################" add by Irmage #############################################
         self.fitInView(self.sceneRect(), QtCore.Qt.KeepAspectRatio)
         #############################################################################
+        self._update_level_of_detail()
+        if not pos and len(pipeline.nodes) > 1:
+            # no known positions: lay nodes out without blocking the GUI
+            self.auto_layout_node_positions(fit=True)
         
 
     def set_pipeline(self, pipeline):
@@ -2608,7 +2879,7 @@ class PipelineDevelopperView(QGraphicsView):
         '''
         self._set_pipeline(pipeline)
         # Setup callback to update view when pipeline state is modified
-        pipeline.on_trait_change(self._reset_pipeline, 'selection_changed',
+        pipeline.on_trait_change(self._pipeline_changed, 'selection_changed',
                                  dispatch='ui')
         pipeline.on_trait_change(self._reset_pipeline, 'user_traits_changed',
                                  dispatch='ui')
@@ -2641,17 +2912,32 @@ class PipelineDevelopperView(QGraphicsView):
         self.scene.logical_view = self._logical_view
         self.scene.update_pipeline()
 
+    def _pipeline_changed(self, changes):
+        # selection_changed tells what has changed, or is just True
+        if isinstance(changes, dict) \
+                and self.scene.logical_view == self._logical_view:
+            self.scene.apply_pipeline_changes(changes)
+        else:
+            self._reset_pipeline()
+
     def zoom_in(self):
         '''
         Zoom the view in, applying a 1.2 zoom factor
         '''
         self.scale(1.2, 1.2)
+        self._update_level_of_detail()
 
     def zoom_out(self):
         '''
         Zoom the view out, applying a 1/1.2 zool factor
         '''
         self.scale(1.0 / 1.2, 1.0 / 1.2)
+        self._update_level_of_detail()
+
+    def _update_level_of_detail(self):
+        detailed = self.transform().m11() >= self.lod_scale_threshold
+        self.scene.set_level_of_detail(detailed)
+        self.setRenderHint(Qt.QPainter.Antialiasing, detailed)
 
     def edition_enabled(self):
         '''
@@ -3113,6 +3399,9 @@ class PipelineDevelopperView(QGraphicsView):
             auto_node_pos.setText(
                 'Auto arrange nodes positions (needs graphviz/dot tool '
                 'installed)')
+        layout_node_pos = menu.addAction('Layered nodes positions')
+        layout_node_pos.triggered.connect(
+            SomaPartial(self.auto_layout_node_positions))
         init_node_pos = menu.addAction('Reset to initial nodes positions')
         init_node_pos.triggered.connect(self.reset_initial_nodes_positions)
         if not hasattr(self.scene.pipeline, 'node_position') \
@@ -3315,6 +3604,77 @@ class PipelineDevelopperView(QGraphicsView):
         os.unlink(tfile_name)
         os.unlink(toutfile_name)
 
+    def auto_layout_node_positions(self, background=True, fit=False):
+        '''
+        Calculate pipeline nodes positions using the layered layout of
+        :mod:`capsul.pipeline.pipeline_layout`, and place the pipeline view
+        nodes accordingly.
+
+        Unless background is False, the layout runs in a worker thread and
+        nodes are moved as intermediate layouts are available, so that the
+        GUI does not block on large pipelines. Layouts are cached per
+        pipeline structure, so that opening again a pipeline is immediate.
+        If fit is True, the view is fitted to the scene once the final layout
+        is placed.
+        '''
+        scene = self.scene
+        nodes, edges = pipeline_layout.pipeline_layout_graph(scene.pipeline)
+        nodes = [name for name in nodes if name in scene.gnodes]
+        nodes_sizes = dict([(name,
+                             (gnode.boundingRect().width(),
+                              gnode.boundingRect().height()))
+                            for name, gnode in six.iteritems(scene.gnodes)])
+        key = pipeline_layout.layout_key(nodes, edges, nodes_sizes)
+        # a new request supersedes a running layout
+        self._layout_request = key
+        self._layout_fit = fit
+        positions = pipeline_layout.cached_layout(key)
+        if positions is None and not background:
+            positions = pipeline_layout.layered_layout(nodes, edges,
+                                                       nodes_sizes)
+            pipeline_layout.cache_layout(key, positions)
+        if positions is not None:
+            self._layout_ready(key, positions, True)
+            return
+        thread = threading.Thread(
+            target=self._run_layout,
+            args=(key, nodes, edges, nodes_sizes, self._layout_notifier))
+        thread.daemon = True
+        thread.start()
+
+    def _run_layout(self, key, nodes, edges, nodes_sizes, notifier):
+        # runs in a worker thread: never touch graphics items here
+        positions = {}
+        for positions in pipeline_layout.iter_layered_layout(
+                nodes, edges, nodes_sizes):
+            if self._layout_request != key:
+                return
+            try:
+                notifier.positions_ready.emit(key, positions, False)
+            except RuntimeError:
+                # the view has been deleted
+                return
+        pipeline_layout.cache_layout(key, positions)
+        try:
+            notifier.positions_ready.emit(key, positions, True)
+        except RuntimeError:
+            pass
+
+    def _layout_ready(self, key, positions, final):
+        if key != self._layout_request or self.scene is None:
+            return
+        scene = self.scene
+        for node, position in six.iteritems(positions):
+            gnode = scene.gnodes.get(node)
+            if gnode is not None:
+                scene.pos[node] = QtCore.QPointF(*position)
+                gnode.setPos(*position)
+        if final:
+            self._layout_request = None
+            if self._layout_fit:
+                self.fitInView(self.sceneRect(), QtCore.Qt.KeepAspectRatio)
+                self._update_level_of_detail()
+
     def _read_dot_pos(self, filename):
         '''
         Read the nodes positions from a file generated by graphviz/dot, in
@@ -3979,9 +4339,7 @@ class PipelineDevelopperView(QGraphicsView):
             if plug is not None:
                 # check the plug is not too far from the drop point
                 gnode = self.scene.gnodes[plug[0]]
-                gplug = gnode.in_plugs[plug[1]]
-                plug_pos = gplug.mapToScene(
-                    gplug.mapFromParent(gplug.get_plug_point()))
+                plug_pos = gnode.plug_point(plug[1], False)
                 pdiff = plug_pos - pos
                 dist2 = pdiff.x() * pdiff.x() + pdiff.y() * pdiff.y()
                 if dist2 > max_square_dist:
@@ -4000,8 +4358,8 @@ class PipelineDevelopperView(QGraphicsView):
             #             if (src != dst) and ("inputs."+src != dst) and not self.isInputYet(dst) :
 
             if (src != dst) and ("inputs." + src != dst):
+                # the scene is updated through selection_changed
                 self.scene.pipeline.add_link('%s->%s' % (src, dst))
-                self.scene.update_pipeline()
 
             if ret:
                 self._grabbed_plug = None
@@ -4118,7 +4476,6 @@ class PipelineDevelopperView(QGraphicsView):
         link_def = self._current_link
         self.scene.pipeline.remove_link(link_def)
         self.scene.pipeline.add_link(link_def, weak_link=weak)
-        self.scene.update_pipeline()
 
     def _del_link(self):
         print('\nRemoving the link: ', self._current_link)
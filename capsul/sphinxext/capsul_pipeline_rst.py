@@ -36,6 +36,14 @@ parser.add_option("-s", "--short", action="append", dest="short_names",
                   "Several -s options may be specified.")
 parser.add_option('--schema', action='store_true', dest='schema',
                   help='also build pipelines schemas images.')
+parser.add_option("-j", "--jobs", action="store", type="int", dest="jobs",
+                  default=0,
+                  help="number of parallel processes used to instantiate "
+                  "pipelines. default: 0, the number of CPUs.")
+parser.add_option("--no-cache", action="store_false", dest="use_cache",
+                  default=True,
+                  help="generate all files again, even if the source of "
+                  "pipelines has not changed since they were generated.")
 (options, args) = parser.parse_args()
 if options.module is None:
     parser.error("Wrong number of arguments.")
@@ -56,6 +64,9 @@ else:
 base_outdir = options.outdir
 short_names = dict([x.split("=") for x in options.short_names])
 schema = options.schema
+cache_file = None
+if options.use_cache:
+    cache_file = os.path.join(base_outdir, ".capsul_rst_cache.json")
 
 # Capsul import
 from capsul.qt_apps.utils.find_pipelines import find_pipeline_and_process
@@ -72,6 +83,9 @@ if schema and distutils.spawn.find_executable('dot'):
        '-i', options.module, '-o', base_outdir]
     if options.verbose:
         cmd.append('-v')
+    cmd += ['-j', str(options.jobs)]
+    if not options.use_cache:
+        cmd.append('--no-cache')
     if options.short_names:
         for n in short_names:
             cmd += ['-s', n]
@@ -128,7 +142,8 @@ for sorted_modules, dtype in ([sorted_pipelines, "pipeline"],
         outdir = os.path.join(base_outdir, short_name, dtype)
         print('short name:', short_name, ', outdir:', outdir)
 
-        docwriter.write_api_docs(outdir)
+        docwriter.write_api_docs(outdir, nprocs=options.jobs,
+                                 cache_file=cache_file)
 
         # Create an index that will be inserted in the module main index.
         # The file format doesn't matter since we will make an include but
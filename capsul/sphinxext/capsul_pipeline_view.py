@@ -33,6 +33,14 @@ parser.add_option("-s", "--short", action="append", dest="short_names",
                   help="use short prefix names for modules names. "
                   "Ex: morphologist.capsul.morphologist=morpho. "
                   "Several -s options may be specified.")
+parser.add_option("-j", "--jobs", action="store", type="int", dest="jobs",
+                  default=0,
+                  help="number of parallel processes used to instantiate "
+                  "pipelines. default: 0, the number of CPUs.")
+parser.add_option("--no-cache", action="store_false", dest="use_cache",
+                  default=True,
+                  help="generate all files again, even if the source of "
+                  "pipelines has not changed since they were generated.")
 (options, args) = parser.parse_args()
 if options.module is None:
     parser.error("Wrong number of arguments.")
@@ -55,9 +63,10 @@ short_names = dict([x.split("=") for x in options.short_names])
 
 # Capsul import
 from capsul.qt_apps.utils.find_pipelines import find_pipeline_and_process
-from capsul.api import StudyConfig
-from capsul.pipeline import pipeline_tools
-from capsul.sphinxext.pipelinedocgen import PipelineHelpWriter
+from capsul.sphinxext.pipelinedocgen import (PipelineHelpWriter,
+                                             write_pipeline_schema)
+from capsul.sphinxext.doccache import (DocCache, process_source_hash,
+                                       parallel_map)
 
 
 # Get all caps pipelines
@@ -76,9 +85,12 @@ for pipeline in pipelines:
     module_name = pipeline.split(".")[1]
     sorted_pipelines[module_name].append(pipeline)
 
-study_config = StudyConfig(modules=StudyConfig.default_modules + ['FomConfig'])
+cache = None
+if options.use_cache:
+    cache = DocCache(os.path.join(base_outdir, ".capsul_schema_cache.json"))
 
-# Generate a png representation of each pipeline.
+# Find pipelines which png representation has to be generated
+jobs = []
 for module_name, module_pipelines in sorted_pipelines.items():
 
     # this docwriter is juste used to manage short names
@@ -94,19 +106,32 @@ for module_name, module_pipelines in sorted_pipelines.items():
     # Go through all pipeline
     for module_pipeline in module_pipelines:
 
-        # Get pipeline instance
-        pipeline_instance = study_config.get_process_instance(module_pipeline)
-
         # Get output files
         short_pipeline = docwriter.get_short_name(module_pipeline)
         image_name = os.path.join(outdir, short_pipeline + ".png")
-        pipeline_tools.save_dot_image(
-            pipeline_instance, image_name, nodesep=0.1, include_io=False,
-            rankdir='TB')
-        logger.info("Pipeline '{0}' representation has been written at "
-                    "location '{1}'.".format(module_pipeline,
-                                             os.path.abspath(image_name)))
+
+        source_hash = None
+        if cache is not None:
+            source_hash = process_source_hash(module_pipeline)
+            if cache.get(module_pipeline, source_hash) is not None \
+                    and os.path.exists(image_name):
+                logger.info("Pipeline '{0}' representation is up to "
+                            "date.".format(module_pipeline))
+                continue
+        jobs.append((module_pipeline, image_name, source_hash))
 
     # Just print a summary
-    logger.info("Summary: '{0}' files written for module '{1}'.".format(
+    logger.info("Summary: '{0}' pipelines in module '{1}'.".format(
         len(module_pipelines), module_name))
+
+# Generate a png representation of each pipeline, in parallel
+sources = parallel_map(write_pipeline_schema, [job[:2] for job in jobs],
+                       options.jobs)
+logger.info("'{0}' pipelines representations have been written.".format(
+    len(jobs)))
+
+if cache is not None:
+    for (module_pipeline, image_name, source_hash), pipeline_sources \
+            in zip(jobs, sources):
+        cache.set(module_pipeline, source_hash, sources=pipeline_sources)
+    cache.save()
@@ -0,0 +1,259 @@
+##########################################################################
+# CAPSUL - CAPS - Copyright (C) CEA, 2013
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+""" Tools to speed up documentation generation for large toolboxes:
+generated contents are cached, keyed by the source of each process, and
+processes are handled in a pool of worker processes.
+
+A cache entry records the hash of the module defining the process (see
+:func:`process_source_hash`), which is known before the process is
+instantiated, and the hashes of the source files of all the classes the
+process is made of (see :func:`process_sources`), which are known once it
+has been rendered: sub-processes, nodes and base classes.
+"""
+
+from __future__ import absolute_import
+
+# System import
+import os
+import sys
+import json
+import hashlib
+import logging
+import multiprocessing
+
+import six
+
+# Define logger
+logger = logging.getLogger(__file__)
+
+
+def _source_file(module):
+    # source file of a module, or None
+    filename = getattr(module, "__file__", None)
+    if not filename:
+        return None
+    if filename.endswith((".pyc", ".pyo")) and os.path.exists(filename[:-1]):
+        filename = filename[:-1]
+    if not os.path.isfile(filename):
+        return None
+    return os.path.abspath(filename)
+
+
+def file_hash(filename):
+    """ md5 hash of a file contents, or None if it cannot be read.
+    """
+    md5 = hashlib.md5()
+    try:
+        with open(filename, "rb") as f:
+            md5.update(f.read())
+    except (IOError, OSError):
+        return None
+    return md5.hexdigest()
+
+
+def process_sources(process):
+    """ Hashes of the source files of the modules defining the classes of a
+    process instance, of its base classes, and of its nodes and their
+    processes, recursively for pipelines.
+
+    Returns
+    -------
+    sources: dict
+        {filename: md5 hash}
+    """
+    classes = set()
+    todo = [process]
+    done = set()
+    while todo:
+        item = todo.pop()
+        if id(item) in done:
+            continue
+        done.add(id(item))
+        classes.update(type(item).__mro__)
+        nodes = getattr(item, "nodes", None)
+        if isinstance(nodes, dict):
+            for node in nodes.values():
+                todo.append(node)
+                if getattr(node, "process", None) is not None:
+                    todo.append(node.process)
+        if getattr(item, "_nipype_interface", None) is not None:
+            todo.append(item._nipype_interface)
+    sources = {}
+    for item_class in classes:
+        filename = _source_file(sys.modules.get(item_class.__module__))
+        if filename is not None and filename not in sources:
+            source_hash = file_hash(filename)
+            if source_hash is not None:
+                sources[filename] = source_hash
+    return sources
+
+
+def process_source_hash(process_id):
+    """ Hash of the source file of the module defining a process or pipeline.
+
+    Parameters
+    ----------
+    process_id: str (mandatory)
+        the process python location, e.g. 'caps.fmri.PIPELINE'
+
+    Returns
+    -------
+    source_hash: str or None
+        None if the source file cannot be found: contents should then not
+        be cached.
+    """
+    module_name = ".".join(process_id.split(".")[:-1])
+    if not module_name:
+        return None
+    try:
+        __import__(module_name)
+    except Exception:
+        return None
+    filename = _source_file(sys.modules[module_name])
+    if filename is None:
+        return None
+    md5 = hashlib.md5()
+    with open(filename, "rb") as f:
+        md5.update(f.read())
+    # the process class is part of the key since a module may define several
+    md5.update(process_id.encode("utf-8"))
+    return md5.hexdigest()
+
+
+class DocCache(object):
+    """ Record of generated documentation contents, with the source hash
+    they have been generated from, stored in a JSON file.
+
+    Contents themselves are the generated files: the cache tells if they are
+    still up to date, and stores associated data (a title for instance).
+    An entry is up to date if its process module has not changed, and if
+    none of the source files recorded with it (see :func:`process_sources`)
+    has changed.
+    """
+    def __init__(self, filename):
+        """ Initialize the cache
+
+        Parameters
+        ----------
+        filename: str (mandatory)
+            the JSON cache file, read if it exists.
+        """
+        self.filename = filename
+        self.entries = {}
+        # hashes of source files, computed once
+        self._file_hashes = {}
+        if os.path.exists(filename):
+            try:
+                with open(filename) as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                logger.warning("Ignoring corrupted documentation cache "
+                               "'{0}'.".format(filename))
+
+    def get(self, key, source_hash):
+        """ Get the data stored for a key, if it is up to date.
+
+        Returns
+        -------
+        data: dict or None
+            None if the key is not in the cache, or has been generated from
+            another source.
+        """
+        if source_hash is None:
+            return None
+        entry = self.entries.get(key)
+        if entry is None or entry.get("source_hash") != source_hash:
+            return None
+        for filename, file_source_hash in six.iteritems(
+                entry.get("sources", {})):
+            if filename not in self._file_hashes:
+                self._file_hashes[filename] = file_hash(filename)
+            if self._file_hashes[filename] != file_source_hash:
+                return None
+        return entry.get("data", {})
+
+    def set(self, key, source_hash, data=None, sources=None):
+        """ Record a generated content. Nothing is recorded if source_hash
+        is None.
+
+        Parameters
+        ----------
+        key: str (mandatory)
+            the process python location
+        source_hash: str (mandatory)
+            the process module hash (see :func:`process_source_hash`)
+        data: dict (optional)
+            data associated with the content
+        sources: dict (optional)
+            {filename: hash} source files the content has been generated
+            from (see :func:`process_sources`)
+        """
+        if source_hash is None:
+            self.entries.pop(key, None)
+            return
+        self.entries[key] = {"source_hash": source_hash, "data": data or {},
+                             "sources": sources or {}}
+
+    def save(self):
+        """ Write the cache file """
+        dirname = os.path.dirname(self.filename)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        with open(self.filename, "w") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+
+
+def write_if_changed(filename, content):
+    """ Write a text file, unless it already has this content: unchanged
+    files keep their date, and are not read again by sphinx.
+
+    Returns
+    -------
+    written: bool
+    """
+    if os.path.exists(filename):
+        with open(filename, "rt") as f:
+            if f.read() == content:
+                return False
+    with open(filename, "wt") as f:
+        f.write(content)
+    return True
+
+
+def parallel_map(function, items, nprocs=None):
+    """ Apply a function on all items using a pool of processes, and return
+    the results list, in the order of items.
+
+    Parameters
+    ----------
+    function: function (mandatory)
+        a module-level function (it is pickled to be sent to workers)
+    items: list (mandatory)
+        function arguments
+    nprocs: int (optional)
+        number of worker processes. Default (None or 0): the number of CPUs.
+        1 runs in the current process.
+    """
+    items = list(items)
+    if not nprocs:
+        nprocs = multiprocessing.cpu_count()
+    nprocs = min(nprocs, len(items))
+    if nprocs <= 1:
+        return [function(item) for item in items]
+    if hasattr(os, "fork") and hasattr(multiprocessing, "get_context"):
+        # documentation scripts are not protected by a __main__ test:
+        # forked workers do not run them again, as spawned ones would
+        pool = multiprocessing.get_context("fork").Pool(nprocs)
+    else:
+        pool = multiprocessing.Pool(nprocs)
+    try:
+        return pool.map(function, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -10,6 +10,9 @@ logger = logging.getLogger(__file__)
 
 # Capsul import
 from capsul.api import get_process_instance
+from capsul.sphinxext.doccache import (DocCache, process_source_hash,
+                                       process_sources, write_if_changed,
+                                       parallel_map)
 
 
 class PipelineHelpWriter(object):
@@ -55,7 +58,10 @@ class PipelineHelpWriter(object):
         """
         # Fiest get the pipeline instance from its string description
         pipeline_instance = get_process_instance(pipeline)
+        return self._pipeline_api_doc(pipeline, pipeline_instance, schema)
 
+    def _pipeline_api_doc(self, pipeline, pipeline_instance, schema):
+        # generate_api_doc() on a pipeline instance
         # Get the header, ie. the first line of the docstring
         # Default title is ''
         header = pipeline_instance.__doc__
@@ -101,7 +107,8 @@ class PipelineHelpWriter(object):
 
         return ad, title
 
-    def write_api_docs(self, outdir=None, returnrst=False):
+    def write_api_docs(self, outdir=None, returnrst=False, nprocs=1,
+                       cache_file=None):
         """ Generate API reST files.
 
         Parameters
@@ -112,6 +119,14 @@ class PipelineHelpWriter(object):
         returnrst: bool (optional, default False)
             if True return the rst string documentation,
             otherwise write it to disk.
+        nprocs: int (optional, default 1)
+            number of worker processes used to instantiate pipelines and
+            generate their documentation. 0 means the number of CPUs.
+        cache_file: string (optional)
+            JSON file recording the source of written files: pipelines whose
+            module source, and the sources of their nodes processes and base
+            classes, have not changed since their file has been written are
+            not instantiated again. Not used if returnrst is True.
 
         Notes
         -----
@@ -126,14 +141,15 @@ class PipelineHelpWriter(object):
                 os.makedirs(outdir)
         else:
             rstdoc = {}
+        cache = None
+        if returnrst is False and cache_file:
+            cache = DocCache(cache_file)
 
-        # Generate reST API
-        written_modules = []
+        # Find pipelines which documentation has to be generated
+        titles = {}
+        jobs = []
         for pipeline in self.pipelines:
 
-            # Information message
-            logger.info("Processing pipeline '{0}'...".format(pipeline))
-
             pipeline_short = self.get_short_name(pipeline)
             # Check if an image representation of the pipeline exists
             if returnrst is False:
@@ -141,29 +157,54 @@ class PipelineHelpWriter(object):
                                       pipeline_short + ".png")
                 if not os.path.isfile(os.path.join(outdir, schema)):
                     schema = None
+                outfile = os.path.join(outdir,
+                                       pipeline_short + self.rst_extension)
             else:
                 schema = None
+                outfile = None
+
+            source_hash = None
+            if cache is not None:
+                source_hash = process_source_hash(pipeline)
+                data = cache.get(pipeline, source_hash)
+                if data is not None and data.get("schema") == schema \
+                        and os.path.exists(outfile):
+                    logger.info("Pipeline '{0}' is up to date.".format(
+                        pipeline))
+                    titles[pipeline] = data.get("title", "")
+                    continue
+            jobs.append((pipeline, schema, outfile, source_hash))
+
+        # Generate the rst string descriptions
+        results = parallel_map(_generate_api_doc,
+                               [(self, job[0], job[1]) for job in jobs],
+                               nprocs)
 
-            # Generate the rst string description
-            api_str, title_str = self.generate_api_doc(pipeline, schema)
+        # Generate reST API
+        for (pipeline, schema, outfile, source_hash), \
+                (api_str, title_str, sources) in zip(jobs, results):
             if not api_str:
                 continue
 
             # Write to file
             if returnrst is False:
-                outfile = os.path.join(outdir,
-                                       pipeline_short + self.rst_extension)
-                fileobj = open(outfile, "wt")
-                fileobj.write(api_str)
-                fileobj.close()
+                write_if_changed(outfile, api_str)
+                if cache is not None:
+                    cache.set(pipeline, source_hash,
+                              {"title": title_str, "schema": schema},
+                              sources)
             else:
                 rstdoc[pipeline] = api_str
 
-            # Update the list of written modules
-            written_modules.append((title_str, pipeline))
+            titles[pipeline] = title_str
+
+        if cache is not None:
+            cache.save()
 
         # Update the class attribute containing the list of written modules
-        self.written_modules = written_modules
+        self.written_modules = [(titles[pipeline], pipeline)
+                                for pipeline in self.pipelines
+                                if pipeline in titles]
 
         if returnrst is True:
             return rstdoc
@@ -359,3 +400,53 @@ class PipelineHelpWriter(object):
 
         # Close file
         idx.close()
+
+
+def _generate_api_doc(args):
+    # runs in a worker process (see parallel_map)
+    # returns (api_str, title_str, sources)
+    writer, pipeline, schema = args
+    logger.info("Processing pipeline '{0}'...".format(pipeline))
+    pipeline_instance = get_process_instance(pipeline)
+    api_str, title_str = writer._pipeline_api_doc(pipeline, pipeline_instance,
+                                                  schema)
+    return api_str, title_str, process_sources(pipeline_instance)
+
+
+def write_pipeline_schema(args):
+    """ Write the png representation of a pipeline, using dot.
+
+    Parameters
+    ----------
+    args: tuple
+        (pipeline, image_name), where pipeline is the python location of
+        the pipeline (a single argument, as expected by
+        :func:`~capsul.sphinxext.doccache.parallel_map`).
+
+    Returns
+    -------
+    sources: dict
+        source files hashes of the pipeline (see
+        :func:`~capsul.sphinxext.doccache.process_sources`)
+    """
+    from capsul.api import StudyConfig
+    from capsul.pipeline import pipeline_tools
+
+    global _study_config
+
+    pipeline, image_name = args
+    if _study_config is None:
+        _study_config = StudyConfig(
+            modules=StudyConfig.default_modules + ['FomConfig'])
+    pipeline_instance = _study_config.get_process_instance(pipeline)
+    pipeline_tools.save_dot_image(
+        pipeline_instance, image_name, nodesep=0.1, include_io=False,
+        rankdir='TB')
+    logger.info("Pipeline '{0}' representation has been written at "
+                "location '{1}'.".format(pipeline,
+                                         os.path.abspath(image_name)))
+    return process_sources(pipeline_instance)
+
+
+# study config of schemas generation, created on first use in each process
+_study_config = None
@@ -7,6 +7,9 @@
 ##########################################################################
 
 # System import
+import os
+import shutil
+import tempfile
 import unittest
 
 # Capsul import
@@ -110,6 +113,34 @@ class TestSphinxExt(unittest.TestCase):
         rstdoc = docwriter.write_api_docs(returnrst=True)
         self.assertTrue(self.pipeline_id in rstdoc)
 
+    def test_cached_parallel_doc(self):
+        """ Method to test the rst documentation files generation in worker
+        processes, and the cache of generated files.
+        """
+        tmpdir = tempfile.mkdtemp(prefix="capsul_test_doc")
+        try:
+            cache_file = os.path.join(tmpdir, "cache.json")
+            docwriter = PipelineHelpWriter([self.process_id,
+                                            self.pipeline_id])
+            docwriter.write_api_docs(tmpdir, nprocs=2,
+                                     cache_file=cache_file)
+            written_modules = docwriter.written_modules
+            self.assertEqual([x[1] for x in written_modules],
+                             sorted([self.process_id, self.pipeline_id]))
+            rst_file = os.path.join(tmpdir, self.pipeline_id + ".rst")
+            mtime = os.stat(rst_file).st_mtime
+            os.utime(rst_file, (mtime - 10, mtime - 10))
+
+            # nothing is generated again
+            docwriter = PipelineHelpWriter([self.process_id,
+                                            self.pipeline_id])
+            docwriter.write_api_docs(tmpdir, nprocs=2,
+                                     cache_file=cache_file)
+            self.assertEqual(docwriter.written_modules, written_modules)
+            self.assertEqual(os.stat(rst_file).st_mtime, mtime - 10)
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 def test():
     """ Function to execute unitest
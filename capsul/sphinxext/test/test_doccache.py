@@ -0,0 +1,133 @@
+##########################################################################
+# CAPSUL - CAPS - Copyright (C) CEA, 2013
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+# System import
+from __future__ import print_function
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Capsul import
+from capsul.sphinxext.doccache import (DocCache, process_source_hash,
+                                       process_sources, write_if_changed,
+                                       parallel_map)
+
+
+pipeline_module = '''
+from capsul_doccache_base import Base
+from capsul_doccache_mod import MyProcess
+
+
+class Node(object):
+    def __init__(self, process):
+        self.process = process
+
+
+class MyPipeline(Base):
+    def __init__(self):
+        self.nodes = {'': Node(self), 'node': Node(MyProcess())}
+'''
+
+
+class TestDocCache(unittest.TestCase):
+    """ Test the documentation generation cache and process pool
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_doccache')
+        self.module_file = os.path.join(self.tmpdir,
+                                        'capsul_doccache_mod.py')
+        with open(self.module_file, 'w') as f:
+            f.write('class MyProcess(object):\n    pass\n')
+        self.base_file = os.path.join(self.tmpdir, 'capsul_doccache_base.py')
+        with open(self.base_file, 'w') as f:
+            f.write('class Base(object):\n    pass\n')
+        self.pipeline_file = os.path.join(self.tmpdir,
+                                          'capsul_doccache_pipeline.py')
+        with open(self.pipeline_file, 'w') as f:
+            f.write(pipeline_module)
+        sys.path.insert(0, self.tmpdir)
+
+    def tearDown(self):
+        sys.path.remove(self.tmpdir)
+        for module in ('capsul_doccache_mod', 'capsul_doccache_base',
+                       'capsul_doccache_pipeline'):
+            sys.modules.pop(module, None)
+        shutil.rmtree(self.tmpdir)
+
+    def test_source_hash(self):
+        hash1 = process_source_hash('capsul_doccache_mod.MyProcess')
+        self.assertTrue(hash1 is not None)
+        self.assertNotEqual(
+            process_source_hash('capsul_doccache_mod.OtherProcess'), hash1)
+        with open(self.module_file, 'a') as f:
+            f.write('# changed\n')
+        self.assertNotEqual(
+            process_source_hash('capsul_doccache_mod.MyProcess'), hash1)
+        self.assertEqual(process_source_hash('no_such_module.Process'), None)
+
+    def test_process_sources(self):
+        from capsul_doccache_pipeline import MyPipeline
+
+        sources = process_sources(MyPipeline())
+        for filename in (self.module_file, self.base_file,
+                         self.pipeline_file):
+            self.assertTrue(os.path.abspath(filename) in sources, filename)
+
+        # an entry is outdated when a node process module changes
+        cache = DocCache(os.path.join(self.tmpdir, 'cache.json'))
+        cache.set('pipeline', 'abc', {'title': 'My pipeline'}, sources)
+        cache.save()
+        cache = DocCache(os.path.join(self.tmpdir, 'cache.json'))
+        self.assertEqual(cache.get('pipeline', 'abc'),
+                         {'title': 'My pipeline'})
+        with open(self.module_file, 'a') as f:
+            f.write('# changed\n')
+        cache = DocCache(os.path.join(self.tmpdir, 'cache.json'))
+        self.assertEqual(cache.get('pipeline', 'abc'), None)
+
+    def test_cache(self):
+        cache_file = os.path.join(self.tmpdir, 'cache', 'cache.json')
+        cache = DocCache(cache_file)
+        self.assertEqual(cache.get('proc', 'abc'), None)
+        cache.set('proc', 'abc', {'title': 'My process'})
+        cache.set('other', None, {'title': 'not cached'})
+        cache.save()
+        cache = DocCache(cache_file)
+        self.assertEqual(cache.get('proc', 'abc'), {'title': 'My process'})
+        self.assertEqual(cache.get('proc', 'def'), None)
+        self.assertEqual(cache.get('proc', None), None)
+        self.assertEqual(cache.get('other', None), None)
+
+    def test_write_if_changed(self):
+        filename = os.path.join(self.tmpdir, 'doc.rst')
+        self.assertTrue(write_if_changed(filename, 'doc\n'))
+        self.assertFalse(write_if_changed(filename, 'doc\n'))
+        self.assertTrue(write_if_changed(filename, 'new doc\n'))
+        with open(filename) as f:
+            self.assertEqual(f.read(), 'new doc\n')
+
+    def test_parallel_map(self):
+        items = [-i for i in range(10)]
+        expected = list(range(10))
+        self.assertEqual(parallel_map(abs, items, 1), expected)
+        self.assertEqual(parallel_map(abs, items, 3), expected)
+        self.assertEqual(parallel_map(abs, [], 3), [])
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDocCache)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -12,6 +12,9 @@ import ast
 import os
 import logging
 
+# Capsul import
+from capsul.sphinxext.doccache import write_if_changed
+
 # Define logger
 logger = logging.getLogger(__file__)
 
@@ -170,9 +173,7 @@ class UseCasesHelperWriter(object):
             # Write to file
             if returnrst is False:
                 outfile = os.path.join(outdir, uid + self.rst_extension)
-                fileobj = open(outfile, "wt")
-                fileobj.write(use_case_str)
-                fileobj.close()
+                write_if_changed(outfile, use_case_str)
             else:
                 rstdoc[uid] = use_case_str
 
@@ -0,0 +1,183 @@
+'''
+Resource aware parallel execution of pipeline nodes on the local machine.
+
+Nodes are started as soon as their dependencies are done and enough
+resources (CPU cores, memory and tagged resources, see
+:mod:`capsul.process.resources`) are available on the machine. Among the
+nodes that can be started, the ones with the highest priority are started
+first.
+
+Classes
+=======
+:class:`LocalScheduler`
+-----------------------
+
+Functions
+=========
+:func:`machine_capacity`
+------------------------
+'''
+
+from __future__ import print_function
+
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+
+import six
+
+from capsul.process.resources import get_requirements
+
+# Define the logger
+logger = logging.getLogger(__name__)
+
+
+def machine_capacity():
+    '''
+    Return the resources of the local machine as a dictionary with 'cpus'
+    (number of cores) and 'memory' (total physical memory in MB, 0 if
+    unknown) items.
+    '''
+    try:
+        cpus = multiprocessing.cpu_count()
+    except NotImplementedError:
+        cpus = 1
+    try:
+        memory = (os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+                  / (1024. * 1024.))
+    except (AttributeError, ValueError, OSError):
+        memory = 0.
+    return {'cpus': cpus, 'memory': memory}
+
+
+class LocalScheduler(object):
+    '''
+    Run nodes in threads, respecting dependencies and the capacity of the
+    machine.
+
+    Parameters
+    ----------
+    cpus: int (optional)
+        number of available CPU cores. Default: all the machine cores.
+    memory: float (optional)
+        available memory in MB. Default: the machine physical memory. 0
+        means unlimited.
+    tags: dict (optional)
+        {tag: number of available units} for tagged resources. A tag
+        required by a node and not listed here has one available unit.
+        Running a node which requires a tag with no available units raises
+        a RuntimeError.
+    '''
+
+    def __init__(self, cpus=None, memory=None, tags=None):
+        capacity = machine_capacity()
+        self.cpus = cpus or capacity['cpus']
+        self.memory = capacity['memory'] if memory is None else memory
+        self.tags = dict(tags or {})
+
+    def _clamped_requirements(self, node):
+        # a node requiring more than the machine capacity is run alone
+        requirements = get_requirements(node)
+        cpus = max(1, min(requirements['cpus'], self.cpus))
+        memory = requirements['memory']
+        if self.memory:
+            memory = min(memory, self.memory)
+        return cpus, memory, requirements['tags']
+
+    def run(self, nodes, dependencies, run_node, priorities=None):
+        '''
+        Run all nodes and return when they are all done. If a node fails,
+        no other node is started, running nodes are waited for and the
+        exception is raised again.
+
+        Parameters
+        ----------
+        nodes: list
+            the nodes to run
+        dependencies: iterable
+            (node, successor_node) tuples
+        run_node: callable
+            function called with a node to run it
+        priorities: dict (optional)
+            {node: priority}. Nodes with higher priority are started
+            first (see :func:`~capsul.pipeline.topological_sort.longest_remaining_paths`).
+        '''
+        priorities = priorities or {}
+        successors = dict((node, []) for node in nodes)
+        waiting = dict((node, 0) for node in nodes)
+        for source, dest in dependencies:
+            if source in successors and dest in waiting:
+                successors[source].append(dest)
+                waiting[dest] += 1
+        ready = [node for node in nodes if waiting[node] == 0]
+        condition = threading.Condition()
+        state = {'cpus': self.cpus, 'memory': self.memory,
+                 'tags': dict(self.tags), 'running': 0, 'done': 0,
+                 'error': None}
+
+        def fits(cpus, memory, tags):
+            return cpus <= state['cpus'] \
+                and (not self.memory or memory <= state['memory']) \
+                and all(state['tags'].get(tag, 1) > 0 for tag in tags)
+
+        def acquire(cpus, memory, tags, sign=1):
+            state['cpus'] -= sign * cpus
+            state['memory'] -= sign * memory
+            for tag in tags:
+                state['tags'][tag] = state['tags'].get(tag, 1) - sign
+
+        def execute(node, resources):
+            error = None
+            try:
+                run_node(node)
+            except BaseException:
+                error = sys.exc_info()
+            with condition:
+                acquire(*resources, sign=-1)
+                state['running'] -= 1
+                if error is not None:
+                    if state['error'] is None:
+                        state['error'] = error
+                else:
+                    state['done'] += 1
+                    for successor in successors[node]:
+                        waiting[successor] -= 1
+                        if waiting[successor] == 0:
+                            ready.append(successor)
+                condition.notify()
+
+        with condition:
+            while True:
+                if state['error'] is None:
+                    ready.sort(key=lambda n: priorities.get(n, 0),
+                               reverse=True)
+                    for node in list(ready):
+                        resources = self._clamped_requirements(node)
+                        if fits(*resources):
+                            ready.remove(node)
+                            acquire(*resources)
+                            state['running'] += 1
+                            logger.debug('starting node %s'
+                                         % getattr(node, 'name', node))
+                            thread = threading.Thread(
+                                target=execute, args=(node, resources))
+                            thread.daemon = True
+                            thread.start()
+                if state['running'] == 0 \
+                        and (state['error'] is not None or not ready):
+                    break
+                if state['running'] == 0:
+                    # nothing will release resources: the ready nodes need
+                    # more than the machine has (a tag with no units)
+                    raise RuntimeError(
+                        'node %s requires unavailable resources'
+                        % getattr(ready[0], 'name', ready[0]))
+                condition.wait()
+
+        if state['error'] is not None:
+            six.reraise(*state['error'])
+        if state['done'] != len(nodes):
+            raise RuntimeError('Some nodes could not be run because of '
+                               'dependency loops')
@@ -0,0 +1,272 @@
+'''
+Completion journal of local pipeline executions, used to resume them.
+
+When a pipeline is run with ``resume=True`` (see
+:meth:`~capsul.study_config.study_config.StudyConfig.run`), an entry is
+appended to a journal file each time a node completes. The entry holds the
+node identifier, a fingerprint of its input parameters (values, and size and
+modification time of input files), checksums of its output files, and the
+values of its non-file outputs.
+
+When the same pipeline is run again with ``resume=True`` (after a failure,
+typically), nodes whose journal entry is still valid are skipped: their
+inputs have not changed, and their output files are still there with the
+recorded contents. Execution thus restarts exactly at the node which
+failed. Nodes which use temporary files are always run, since temporaries
+do not survive the end of a run.
+
+Journals are stored by default in the ``CAPSUL_RUN_JOURNALS`` directory, or
+in ``~/.cache/capsul/run_journals``.
+
+Classes
+=======
+:class:`RunJournal`
+-------------------
+
+Functions
+=========
+:func:`run_journal_filename`
+----------------------------
+'''
+
+from __future__ import print_function
+
+import hashlib
+import json
+import logging
+import os
+import os.path as osp
+import threading
+
+import six
+
+from traits.api import Undefined
+
+from capsul.study_config.memory import file_fingerprint
+from capsul.utils.file_utils import file_checksum
+
+# Define the logger
+logger = logging.getLogger(__name__)
+
+# Change this value whenever the journal entries change
+journal_format_version = '1'
+
+
+def run_journal_filename(process):
+    '''
+    Default journal file for the execution of a process or pipeline. It
+    depends on the process type and on its output parameters, so that
+    different runs of the same pipeline get different journals.
+    '''
+    directory = os.environ.get('CAPSUL_RUN_JOURNALS')
+    if not directory:
+        directory = osp.join(osp.expanduser('~'), '.cache', 'capsul',
+                             'run_journals')
+    outputs = [process.id]
+    for name, trait in sorted(six.iteritems(process.user_traits())):
+        if trait.output or name == 'output_directory':
+            outputs.append((name, repr(getattr(process, name, None))))
+    key = hashlib.md5(repr(outputs).encode('utf-8')).hexdigest()
+    return osp.join(directory, '%s_%s.journal' % (process.name, key))
+
+
+def _file_state(filename, checksum=True):
+    stat = os.stat(filename)
+    state = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    if checksum:
+        state['md5'] = file_checksum(filename)
+    return state
+
+
+def _file_values(value):
+    if isinstance(value, (list, tuple)):
+        return [item for sub_value in value
+                for item in _file_values(sub_value)]
+    if isinstance(value, six.string_types) and value:
+        return [value]
+    return []
+
+
+def _input_fingerprint(value):
+    if isinstance(value, dict):
+        return dict((key, _input_fingerprint(item))
+                    for key, item in six.iteritems(value))
+    if isinstance(value, (list, tuple)):
+        return [_input_fingerprint(item) for item in value]
+    if value is Undefined:
+        return '<undefined>'
+    if isinstance(value, six.string_types) and osp.isfile(value):
+        return file_fingerprint(value)
+    return value
+
+
+class RunJournal(object):
+    '''
+    Journal of the nodes completed during a local execution.
+
+    Parameters
+    ----------
+    filename: str
+        journal file. Its directory is created if needed.
+    resume: bool (optional)
+        if True, entries of an existing journal are loaded and nodes which
+        are still valid are reported done by :meth:`is_done`. Otherwise the
+        journal is started from scratch.
+    temporary_files: list (optional)
+        temporary files of the run, as allocated by
+        :meth:`~capsul.pipeline.pipeline.Pipeline._check_temporary_files_for_node`.
+        Nodes using them are neither skipped nor journaled.
+
+    Methods :meth:`is_done` and :meth:`node_done` may be called from several
+    threads.
+    '''
+
+    def __init__(self, filename, resume=False, temporary_files=None):
+        self.filename = filename
+        self.entries = {}
+        self.skipped = []
+        self._lock = threading.Lock()
+        self._temporaries = set()
+        for entry in temporary_files or []:
+            self._temporaries.update(_file_values(entry[2]))
+        directory = osp.dirname(filename)
+        if directory and not osp.isdir(directory):
+            os.makedirs(directory)
+        state = None
+        if resume and osp.exists(filename):
+            state = self._load()
+        if state in ('complete', 'incomplete'):
+            self._file = open(filename, 'a')
+            if state == 'incomplete':
+                self._file.write('\n')
+        else:
+            # new or obsolete journal
+            self._file = open(filename, 'w')
+            self._write({'format': journal_format_version})
+
+    def _load(self):
+        # returns 'obsolete' if the journal has another format,
+        # 'incomplete' if its last line is incomplete, or 'complete'
+        line = '\n'
+        with open(self.filename) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # entry incompletely written when a run died
+                    continue
+                if 'format' in entry:
+                    if entry['format'] != journal_format_version:
+                        logger.info('obsolete run journal %s ignored'
+                                    % self.filename)
+                        self.entries = {}
+                        return 'obsolete'
+                    continue
+                self.entries[entry['node']] = entry
+        return 'complete' if line.endswith('\n') else 'incomplete'
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        '''
+        Close the journal file
+        '''
+        if not self._file.closed:
+            self._file.close()
+
+    @staticmethod
+    def node_id(process):
+        '''
+        Identifier of a node in the journal: the full name of its process in
+        the pipeline hierarchy.
+        '''
+        return getattr(process, 'context_name', None) or process.name
+
+    def _parameters(self, process):
+        inputs = {}
+        outputs = {}
+        for name, trait in six.iteritems(process.user_traits()):
+            value = getattr(process, name, Undefined)
+            if trait.output:
+                outputs[name] = value
+            else:
+                inputs[name] = value
+        return inputs, outputs
+
+    def _uses_temporaries(self, inputs, outputs):
+        if not self._temporaries:
+            return False
+        for parameters in (inputs, outputs):
+            for value in six.itervalues(parameters):
+                for path in _file_values(value):
+                    if path in self._temporaries:
+                        return True
+        return False
+
+    def _fingerprint(self, process, inputs):
+        fingerprint = {'process': process.id,
+                       'inputs': _input_fingerprint(inputs)}
+        return hashlib.md5(json.dumps(
+            fingerprint, sort_keys=True, default=repr).encode(
+                'utf-8')).hexdigest()
+
+    def is_done(self, process):
+        '''
+        Tell if a process has completed in a previous run, with the same
+        inputs, and if its output files have not changed since. Its non-file
+        outputs are then restored from the journal.
+        '''
+        entry = self.entries.get(self.node_id(process))
+        if entry is None:
+            return False
+        inputs, outputs = self._parameters(process)
+        if self._uses_temporaries(inputs, outputs):
+            return False
+        if entry['fingerprint'] != self._fingerprint(process, inputs):
+            return False
+        for filename, state in six.iteritems(entry['files']):
+            if not osp.isfile(filename):
+                return False
+            current = _file_state(filename, checksum=False)
+            if current['size'] != state['size']:
+                return False
+            if current['mtime'] != state['mtime'] \
+                    and file_checksum(filename) != state['md5']:
+                return False
+        for name, value in six.iteritems(entry['values']):
+            setattr(process, name, value)
+        with self._lock:
+            self.skipped.append(entry['node'])
+        return True
+
+    def node_done(self, process):
+        '''
+        Record the completion of a process in the journal
+        '''
+        inputs, outputs = self._parameters(process)
+        if self._uses_temporaries(inputs, outputs):
+            return
+        files = {}
+        values = {}
+        for name, value in six.iteritems(outputs):
+            paths = [path for path in _file_values(value)
+                     if osp.isfile(path)]
+            if paths:
+                for path in paths:
+                    files[path] = _file_state(path)
+            elif value is not Undefined:
+                values[name] = value
+        entry = {'node': self.node_id(process),
+                 'fingerprint': self._fingerprint(process, inputs),
+                 'files': files, 'values': values}
+        try:
+            json.dumps(entry)
+        except (TypeError, ValueError):
+            # non-serializable outputs: the node will be run again
+            return
+        with self._lock:
+            self.entries[entry['node']] = entry
+            self._write(entry)
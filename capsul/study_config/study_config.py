@@ -24,6 +24,7 @@ import logging
 import json
 import sys
 import six
+import threading
 import weakref
 if sys.version_info[:2] >= (2, 7):
     from collections import OrderedDict
@@ -34,7 +35,7 @@ else:
 logger = logging.getLogger(__name__)
 
 # Trait import
-from traits.api import File, Directory, Bool, String, Undefined
+from traits.api import File, Directory, Bool, String, Float, Undefined
 
 # Soma import
 from soma.controller import Controller
@@ -45,6 +46,12 @@ from capsul.process.process import Process
 from capsul.study_config.run import run_process
 from capsul.pipeline.pipeline_nodes import Node
 from capsul.study_config.process_instance import get_process_instance
+from capsul.study_config.temporary_files import TemporaryFilesLifetime
+from capsul.study_config.run_journal import RunJournal, run_journal_filename
+from capsul.study_config.local_scheduler import LocalScheduler
+from capsul.pipeline.topological_sort import (longest_remaining_paths,
+                                              flatten_workflow_graph)
+from capsul.pipeline.pipeline_tools import stale_process_nodes
 
 if sys.version_info[0] >= 3:
     basestring = str
@@ -116,6 +123,26 @@ class StudyConfig(Controller):
         subdirectory to output_directory. This subdirectory is named 
         '<count>-<name>' where <count> if self.process_counter and <name> 
         is the name of the process.
+    history_based_scheduling : bool (default False)
+        Use the execution history stored in the engine database to estimate
+        nodes durations and memory, execute the critical path of pipelines
+        first, and pass estimates to soma-workflow jobs.
+    parallel_local_execution : bool (default False)
+        When not using soma-workflow, run independent pipeline nodes in
+        parallel threads, within the CPU, memory and tagged resources of the
+        local machine (see :mod:`capsul.process.resources`).
+    jobs_fusion_max_duration : float (default 0)
+        With history based scheduling and soma-workflow, merge linear chains
+        of Python process jobs whose estimated durations are below this
+        value (in seconds) into single jobs. 0 disables jobs fusion.
+    temporary_directory : str (default Undefined)
+        Directory where temporary files of local pipeline executions are
+        created (a fast local file system, for instance). Default: the
+        system temporary directory.
+    temporary_directory_max_size : float (default 0)
+        Size budget, in MB, of temporary files in temporary_directory. When
+        it is exceeded, temporaries of the next nodes are created in the
+        system temporary directory. 0 means unlimited.
 
     Methods
     -------
@@ -163,6 +190,39 @@ class StudyConfig(Controller):
              "'<count>-<name>' where <count> if self.process_counter and <name> "
              "is the name of the process.")
 
+    history_based_scheduling = Bool(
+        False,
+        desc="Use the execution history stored in the engine database to "
+             "estimate nodes durations and memory, execute the critical "
+             "path of pipelines first, and pass estimates to soma-workflow "
+             "jobs.")
+
+    parallel_local_execution = Bool(
+        False,
+        desc="When not using soma-workflow, run independent pipeline nodes "
+             "in parallel threads, within the CPU, memory and tagged "
+             "resources of the local machine.")
+
+    jobs_fusion_max_duration = Float(
+        0.,
+        desc="With history based scheduling and soma-workflow, merge linear "
+             "chains of Python process jobs whose estimated durations are "
+             "below this value (in seconds) into single jobs. 0 disables "
+             "jobs fusion.")
+
+    temporary_directory = Directory(
+        Undefined,
+        desc="Directory where temporary files of local pipeline executions "
+             "are created (a fast local file system, for instance). "
+             "Default: the system temporary directory.")
+
+    temporary_directory_max_size = Float(
+        0.,
+        desc="Size budget, in MB, of temporary files in "
+             "temporary_directory. When it is exceeded, temporaries of the "
+             "next nodes are created in the system temporary directory. 0 "
+             "means unlimited.")
+
     def __init__(self, study_name=None, init_config=None, modules=None,
                  engine=None, **override_config):
         """ Initilize the StudyConfig class
@@ -187,6 +247,7 @@ class StudyConfig(Controller):
         """
 
         super(StudyConfig, self).__init__()
+        self._process_counter_lock = threading.Lock()
         
         if study_name:
             self.study_name = study_name
@@ -296,7 +357,8 @@ class StudyConfig(Controller):
             return module
 
     def run(self, process_or_pipeline, output_directory= None,
-            execute_qc_nodes=True, verbose=0, **kwargs):
+            execute_qc_nodes=True, verbose=0, history=False, resume=False,
+            journal_file=None, skip_up_to_date=False, **kwargs):
         """Method to execute a process or a pipline in a study configuration
          environment.
 
@@ -322,6 +384,27 @@ class StudyConfig(Controller):
             process nodes.
         verbose: int
             if different from zero, print console messages.
+        history: bool (optional, default False)
+            if True, store the parameters and execution metrics of each
+            executed node in the engine database (see
+            :py:mod:`capsul.engine.history`). Per node metrics are only
+            available for local (non soma-workflow) executions. The history
+            is kept only if the engine database is persistent (see the
+            ``database_location`` engine setting).
+        resume: bool (optional, default False)
+            local executions only: record completed nodes in a journal file
+            (see :mod:`capsul.study_config.run_journal`), and skip nodes
+            already completed by a previous run with the same inputs and
+            unchanged outputs. Use it for long runs, to be able to restart
+            them where they stopped.
+        journal_file: str (optional)
+            journal file used with resume. Default: a file in the run
+            journals directory, depending on the process and its outputs.
+        skip_up_to_date: bool (optional, default False)
+            local executions only: run only the nodes which are out of date,
+            the way make does (see
+            :func:`~capsul.pipeline.pipeline_tools.out_of_date_nodes`), and
+            their downstream nodes.
         """
         if self.create_output_directories:
             for name, trait in process_or_pipeline.user_traits().items():
@@ -332,8 +415,11 @@ class StudyConfig(Controller):
                         if base and not os.path.exists(base):
                             os.makedirs(base)
                             
-        for k, v in six.iteritems(kwargs):
-            setattr(process_or_pipeline, k, v)
+        if isinstance(process_or_pipeline, Pipeline):
+            process_or_pipeline.set_parameters(kwargs)
+        else:
+            for k, v in six.iteritems(kwargs):
+                setattr(process_or_pipeline, k, v)
         missing = process_or_pipeline.get_missing_mandatory_parameters()
         if len(missing) != 0:
             ptype = 'process'
@@ -350,7 +436,14 @@ class StudyConfig(Controller):
             # Create soma workflow pipeline
             from capsul.pipeline.pipeline_workflow import (
                 workflow_from_pipeline, workflow_run)
-            workflow = workflow_from_pipeline(process_or_pipeline)
+            workflow = workflow_from_pipeline(
+                process_or_pipeline,
+                estimated_costs=self._estimated_costs(),
+                fuse_jobs_below=self.jobs_fusion_max_duration or None)
+            record = None
+            if history:
+                record = self.engine.execution_history.new_execution(
+                    process_or_pipeline)
             controller, wf_id = workflow_run(process_or_pipeline.id,
                                              workflow, self)
             workflow_status = controller.workflow_status(wf_id)
@@ -366,6 +459,14 @@ class StudyConfig(Controller):
                 #element for element in elements_status[0]
                 #if element[1] != swconstants.DONE
                 #or element[3][0] != swconstants.FINISHED_REGULARLY]
+            if record is not None:
+                if workflow_status == swconstants.WORKFLOW_DONE \
+                        and len(self.failed_jobs) == 0:
+                    record.finish('done')
+                else:
+                    record.finish('failed', '%d failed jobs'
+                                  % len(self.failed_jobs))
+                self._store_history(record)
             # if execution was OK, delete the workflow
             if workflow_status == swconstants.WORKFLOW_DONE \
                     and len(self.failed_jobs) == 0:
@@ -411,42 +512,139 @@ class StudyConfig(Controller):
             # Temporary files can be generated for pipelines
             temporary_files = []
             result = None
+            record = None
+            journal = None
+            if history:
+                record = self.engine.execution_history.new_execution(
+                    process_or_pipeline)
             try:
                 # Generate ordered execution list
                 execution_list = []
+                dependencies = None
+                temporaries_lifetime = None
                 if isinstance(process_or_pipeline, Pipeline):
-                    execution_list = \
-                        process_or_pipeline.workflow_ordered_nodes()
+                    if self.parallel_local_execution:
+                        execution_list, dependencies = \
+                            flatten_workflow_graph(
+                                process_or_pipeline.workflow_graph())
+                    else:
+                        execution_list = \
+                            process_or_pipeline.workflow_ordered_nodes(
+                                estimated_costs=self._estimated_costs())
                     # Filter process nodes if necessary
                     if not execute_qc_nodes:
                         execution_list = [node for node in execution_list
                                           if node.node_type
                                               == "processing_node"]
+                    temp_directory = self.temporary_directory
+                    if temp_directory in (None, Undefined, ''):
+                        temp_directory = None
+                    elif not os.path.isdir(temp_directory):
+                        os.makedirs(temp_directory)
                     for node in execution_list:
                         # check temporary outputs and allocate files
                         process_or_pipeline._check_temporary_files_for_node(
-                            node, temporary_files)
+                            node, temporary_files, temp_directory)
+                    if skip_up_to_date:
+                        if dependencies is None:
+                            graph_dependencies = flatten_workflow_graph(
+                                process_or_pipeline.workflow_graph())[1]
+                        else:
+                            graph_dependencies = dependencies
+                        temporaries = set()
+                        for entry in temporary_files:
+                            if isinstance(entry[2], list):
+                                temporaries.update(entry[2])
+                            else:
+                                temporaries.add(entry[2])
+                        stale_nodes = stale_process_nodes(
+                            execution_list, graph_dependencies,
+                            temporaries=temporaries)
+                        execution_list = [node for node in execution_list
+                                          if node in stale_nodes]
+                    # temporaries are removed after their last use
+                    temporaries_lifetime = TemporaryFilesLifetime(
+                        process_or_pipeline, temporary_files, execution_list,
+                        temp_directory, self.temporary_directory_max_size)
                 elif isinstance(process_or_pipeline, Process):
-                    execution_list.append(process_or_pipeline)
+                    if not skip_up_to_date or stale_process_nodes(
+                            [process_or_pipeline], set()):
+                        execution_list.append(process_or_pipeline)
                 else:
                     raise Exception(
                         "Unknown instance type. Got {0}and expect Process or "
                         "Pipeline instances".format(
                             process_or_pipeline.__module__.name__))
+                if resume:
+                    if journal_file is None:
+                        journal_file = run_journal_filename(
+                            process_or_pipeline)
+                    journal = RunJournal(journal_file, resume=True,
+                                         temporary_files=temporary_files)
 
-                # Execute each process node element
-                for process_node in execution_list:
+                # results holds the result of the last executed node
+                results = [None]
+
+                def run_node(process_node):
                     # Execute the process instance contained in the node
                     if isinstance(process_node, Node):
-                        result = self._run(process_node.process, 
-                                           output_directory, 
-                                           verbose)
-
+                        process = process_node.process
+                        node_name = process_node.name
                     # Execute the process instance
                     else:
-                        result = self._run(process_node, output_directory,
-                                           verbose)
+                        process = process_node
+                        node_name = process.name
+                    if journal is not None and journal.is_done(process):
+                        logger.info('%s already completed, skipped'
+                                    % node_name)
+                        if temporaries_lifetime is not None:
+                            temporaries_lifetime.after_node(process_node)
+                        return
+                    if temporaries_lifetime is not None:
+                        temporaries_lifetime.before_node(process_node)
+                    if record is not None:
+                        with record.monitor(node_name, process):
+                            results[0] = self._run(process, output_directory,
+                                                   verbose)
+                    else:
+                        results[0] = self._run(process, output_directory,
+                                               verbose)
+                    if journal is not None:
+                        journal.node_done(process)
+                    if temporaries_lifetime is not None:
+                        temporaries_lifetime.after_node(process_node)
+
+                # Execute each process node element
+                if dependencies is not None:
+                    priorities = None
+                    estimated_costs = self._estimated_costs()
+                    if estimated_costs is not None:
+                        successors = dict((node, [])
+                                          for node in execution_list)
+                        for source, dest in dependencies:
+                            if source in successors and dest in successors:
+                                successors[source].append(dest)
+                        priorities = longest_remaining_paths(
+                            successors,
+                            lambda node: estimated_costs.get(
+                                node.process.id, {}).get('duration', 1.))
+                    LocalScheduler().run(execution_list, dependencies,
+                                         run_node, priorities)
+                else:
+                    for process_node in execution_list:
+                        run_node(process_node)
+                result = results[0]
+                if record is not None:
+                    record.finish('done')
+            except Exception as e:
+                if record is not None:
+                    record.finish('failed', '%s: %s' % (type(e).__name__, e))
+                raise
             finally:
+                if journal is not None:
+                    journal.close()
+                if record is not None:
+                    self._store_history(record)
                 # Destroy temporary files
                 if temporary_files:
                     # If temporary files have been created, we are sure that
@@ -455,6 +653,22 @@ class StudyConfig(Controller):
                     process_or_pipeline._free_temporary_files(temporary_files)
             return result
 
+    def _store_history(self, record):
+        # a history storage error must not hide the execution result
+        try:
+            self.engine.execution_history.store(record)
+        except Exception as e:
+            logger.error('cannot store the execution history of %s: %s'
+                         % (record.entry['process_id'], e))
+
+    def _estimated_costs(self):
+        """ Estimated processes costs from the execution history, or None
+        if history_based_scheduling is not set.
+        """
+        if not self.history_based_scheduling:
+            return None
+        return self.engine.execution_history.estimated_costs()
+
     def _run(self, process_instance, output_directory, verbose, **kwargs):
         """ Method to execute a process in a study configuration environment.
 
@@ -478,13 +692,23 @@ class StudyConfig(Controller):
         else:
             cachedir = output_directory
 
+        # Reserve the process number (nodes may be run in parallel threads)
+        with self._process_counter_lock:
+            process_number = self.process_counter
+            self.process_counter += 1
+
         # Update the output directory folder if necessary
         if output_directory is not None and output_directory is not Undefined and output_directory:
             if self.process_output_directory:
-                output_directory = os.path.join(output_directory, '%s-%s' % (self.process_counter, process_instance.name))
+                output_directory = os.path.join(output_directory, '%s-%s' % (process_number, process_instance.name))
             # Guarantee that the output directory exists
             if not os.path.isdir(output_directory):
-                os.makedirs(output_directory)
+                try:
+                    os.makedirs(output_directory)
+                except OSError:
+                    # may have been created meanwhile by a parallel node
+                    if not os.path.isdir(output_directory):
+                        raise
             if self.process_output_directory:
                 if 'output_directory' in process_instance.user_traits():
                     if (process_instance.output_directory is Undefined or
@@ -499,8 +723,6 @@ class StudyConfig(Controller):
             verbose=verbose,
             **kwargs)
 
-        # Increment the number of executed process count
-        self.process_counter += 1
         return returncode
     
 
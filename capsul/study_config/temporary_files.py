@@ -0,0 +1,225 @@
+'''
+Lifetime management of temporary files during local pipeline executions.
+
+Temporary files of a pipeline (internal outputs which are not exported) are
+allocated before the execution by
+:meth:`~capsul.pipeline.pipeline.Pipeline._check_temporary_files_for_node`.
+:class:`TemporaryFilesLifetime` finds which nodes use each of them, and
+removes a temporary as soon as the last node using it has run, instead of
+keeping all of them until the end of the pipeline.
+
+Temporaries may be created in a fast local directory (a tmpfs for
+instance) with a size budget: when the temporaries stored in this directory
+exceed the budget, temporaries of the next nodes to run are moved to the
+system temporary directory.
+
+Classes
+=======
+:class:`TemporaryFilesLifetime`
+-------------------------------
+
+Functions
+=========
+:func:`path_size`
+-----------------
+'''
+
+from __future__ import print_function
+
+import logging
+import os
+import os.path as osp
+import tempfile
+import threading
+
+import six
+
+# Define the logger
+logger = logging.getLogger(__name__)
+
+
+def path_size(path):
+    '''
+    Disk size (in bytes) of a file or directory, including its .minf
+    companion file. Missing files count for 0.
+    '''
+    size = 0
+    for item in (path, path + '.minf'):
+        if osp.isdir(item):
+            for root, dirs, files in os.walk(item):
+                for filename in files:
+                    try:
+                        size += osp.getsize(osp.join(root, filename))
+                    except OSError:
+                        pass
+        elif osp.exists(item):
+            try:
+                size += osp.getsize(item)
+            except OSError:
+                pass
+    return size
+
+
+def _paths(tmpfiles):
+    if isinstance(tmpfiles, list):
+        return tmpfiles
+    return [tmpfiles]
+
+
+def _plug_paths(node, plug_name):
+    value = node.get_plug_value(plug_name)
+    if isinstance(value, (list, tuple)):
+        return [item for item in value
+                if isinstance(item, six.string_types)]
+    if isinstance(value, six.string_types):
+        return [value]
+    return []
+
+
+class TemporaryFilesLifetime(object):
+    '''
+    Remove temporary files after the last node using them, and keep the
+    temporaries of a local directory within a size budget.
+
+    Parameters
+    ----------
+    pipeline: Pipeline
+        the executed pipeline
+    temp_files: list
+        temporary files allocated by
+        :meth:`~capsul.pipeline.pipeline.Pipeline._check_temporary_files_for_node`
+        for the nodes to run. Entries of this list are updated when
+        temporaries are moved.
+    nodes: list
+        the nodes to run
+    local_directory: str (optional)
+        directory in which temporaries have been created, subject to the
+        size budget
+    max_size: float (optional)
+        size budget of temporaries in local_directory, in MB. 0 means
+        unlimited.
+
+    Methods :meth:`before_node` and :meth:`after_node` must be called
+    around the execution of each node. They may be called from several
+    threads.
+    '''
+
+    def __init__(self, pipeline, temp_files, nodes, local_directory=None,
+                 max_size=0):
+        self.pipeline = pipeline
+        self.temp_files = temp_files
+        self.local_directory = local_directory
+        self.max_size = max_size * 1024 * 1024
+        self._lock = threading.Lock()
+        self._freed = set()
+        # disk size of the local temporaries of each produced entry, and
+        # their total
+        self._local_sizes = {}
+        self._local_size = 0
+        # entries produced by each node
+        self._produced = {}
+        # nodes which still have to use each entry (indices in temp_files)
+        self._consumers = {}
+        # entries used by each node
+        self._used = {}
+
+        entry_of_path = {}
+        for index, entry in enumerate(temp_files):
+            for path in _paths(entry[2]):
+                entry_of_path[path] = index
+            self._produced.setdefault(entry[0], []).append(index)
+            self._consumers[index] = set([entry[0]])
+        for node in nodes:
+            for plug_name in node.plugs:
+                for path in _plug_paths(node, plug_name):
+                    index = entry_of_path.get(path)
+                    if index is not None:
+                        self._consumers[index].add(node)
+        for index, consumers in six.iteritems(self._consumers):
+            for node in consumers:
+                self._used.setdefault(node, set()).add(index)
+
+    def _is_local(self, path):
+        if not self.local_directory:
+            return False
+        # mkstemp() returns relative paths for a relative directory
+        return osp.dirname(osp.abspath(path)) \
+            == osp.abspath(self.local_directory)
+
+    def local_size(self):
+        '''
+        Disk size (in bytes) of temporaries currently stored in the local
+        directory. Temporaries are measured when their producer node has
+        run: outputs of running nodes are not counted.
+        '''
+        return self._local_size
+
+    def _move(self, index):
+        # reallocate the local temporaries of an entry in the system
+        # temporary directory. Its producer has not run yet, so the files
+        # are still empty.
+        node, plug_name, tmpfiles, value = self.temp_files[index]
+        self._local_size -= self._local_sizes.pop(index, 0)
+        moved = {}
+        for path in _paths(tmpfiles):
+            if not self._is_local(path):
+                continue
+            if osp.isdir(path):
+                new_path = tempfile.mkdtemp(suffix='capsul_run')
+            else:
+                suffix = osp.basename(path)
+                suffix = suffix[suffix.rfind('capsul'):] \
+                    if 'capsul' in suffix else ''
+                fd, new_path = tempfile.mkstemp(suffix=suffix)
+                os.close(fd)
+            self.pipeline._remove_temporary_files(path)
+            moved[path] = new_path
+        if not moved:
+            return
+        if isinstance(tmpfiles, list):
+            tmpfiles = [moved.get(path, path) for path in tmpfiles]
+            plug_value = [moved.get(item, item)
+                          for item in node.get_plug_value(plug_name)]
+        else:
+            tmpfiles = moved[tmpfiles]
+            plug_value = tmpfiles
+        node.set_plug_value(plug_name, plug_value)
+        self.temp_files[index] = (node, plug_name, tmpfiles, value)
+        logger.debug('temporary budget exceeded, moved %s'
+                     % ', '.join(moved))
+
+    def before_node(self, node):
+        '''
+        Move the temporaries produced by a node out of the local directory
+        if the size budget is exceeded.
+        '''
+        if not self.local_directory or not self.max_size:
+            return
+        with self._lock:
+            produced = self._produced.get(node)
+            if produced and self.local_size() >= self.max_size:
+                for index in produced:
+                    self._move(index)
+
+    def after_node(self, node):
+        '''
+        Remove the temporaries which are not needed any longer once a node
+        has run.
+        '''
+        with self._lock:
+            if self.local_directory and self.max_size:
+                for index in self._produced.get(node, ()):
+                    size = sum(path_size(path)
+                               for path in _paths(self.temp_files[index][2])
+                               if self._is_local(path))
+                    self._local_size += size \
+                        - self._local_sizes.get(index, 0)
+                    self._local_sizes[index] = size
+            for index in self._used.pop(node, ()):
+                consumers = self._consumers[index]
+                consumers.discard(node)
+                if not consumers:
+                    self.pipeline._remove_temporary_files(
+                        self.temp_files[index][2])
+                    self._freed.add(index)
+                    self._local_size -= self._local_sizes.pop(index, 0)
@@ -0,0 +1,86 @@
+from __future__ import print_function
+
+import threading
+import time
+import unittest
+
+from capsul.study_config.local_scheduler import LocalScheduler
+
+
+class DummyNode(object):
+    def __init__(self, name, cpus=1, memory=0., tags=()):
+        self.name = name
+        self.requirements = {'cpus': cpus, 'memory': memory,
+                             'tags': list(tags)}
+
+    def __repr__(self):
+        return self.name
+
+
+class TestLocalScheduler(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = set()
+        self.max_running = 0
+        self.order = []
+
+    def run_node(self, node):
+        with self.lock:
+            self.running.add(node.name)
+            self.max_running = max(self.max_running, len(self.running))
+            self.order.append(node.name)
+        time.sleep(0.05)
+        with self.lock:
+            self.running.remove(node.name)
+
+    def test_dependencies(self):
+        nodes = [DummyNode(name) for name in 'abcd']
+        a, b, c, d = nodes
+        LocalScheduler(cpus=4).run(nodes, [(a, b), (b, c), (a, d)],
+                                   self.run_node)
+        self.assertEqual(self.order[0], 'a')
+        self.assertTrue(self.order.index('b') < self.order.index('c'))
+        self.assertEqual(self.max_running, 2)
+
+    def test_cpus_capacity(self):
+        nodes = [DummyNode(name, cpus=2) for name in 'abcd']
+        LocalScheduler(cpus=4).run(nodes, [], self.run_node)
+        self.assertEqual(self.max_running, 2)
+        # a node requiring more than the machine is run alone
+        self.setUp()
+        nodes = [DummyNode('big', cpus=16), DummyNode('small')]
+        LocalScheduler(cpus=4).run(nodes, [], self.run_node)
+        self.assertEqual(self.max_running, 1)
+
+    def test_memory_and_tags(self):
+        nodes = [DummyNode(name, memory=600.) for name in 'abc']
+        LocalScheduler(cpus=8, memory=1000.).run(nodes, [], self.run_node)
+        self.assertEqual(self.max_running, 1)
+        self.setUp()
+        nodes = [DummyNode(name, tags=['licence']) for name in 'abc']
+        LocalScheduler(cpus=8, tags={'licence': 2}).run(nodes, [],
+                                                        self.run_node)
+        self.assertEqual(self.max_running, 2)
+
+    def test_unavailable_resources(self):
+        nodes = [DummyNode('a'), DummyNode('gpu', tags=['gpu'])]
+        self.assertRaises(RuntimeError,
+                          LocalScheduler(cpus=2, memory=0,
+                                         tags={'gpu': 0}).run,
+                          nodes, [(nodes[0], nodes[1])], self.run_node)
+        self.assertEqual(self.order, ['a'])
+
+    def test_priorities_and_errors(self):
+        nodes = [DummyNode(name, cpus=4) for name in 'abc']
+        LocalScheduler(cpus=4).run(nodes, [], self.run_node,
+                                   priorities={nodes[2]: 10, nodes[1]: 5})
+        self.assertEqual(self.order, ['c', 'b', 'a'])
+
+        def fail(node):
+            raise ValueError('failed node')
+        self.assertRaises(ValueError, LocalScheduler(cpus=1).run,
+                          nodes, [], fail)
+
+
+if __name__ == '__main__':
+    unittest.main()
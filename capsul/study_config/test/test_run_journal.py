@@ -0,0 +1,138 @@
+from __future__ import print_function
+
+import json
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+from capsul.study_config.run_journal import RunJournal
+
+
+class DummyTrait(object):
+    def __init__(self, output):
+        self.output = output
+
+
+class DummyProcess(object):
+    ''' Process-like object with an input file, an output file and a float
+    output '''
+    id = 'capsul.study_config.test.test_run_journal.DummyProcess'
+
+    def __init__(self, name, input, output):
+        self.name = name
+        self.context_name = 'pipeline.%s' % name
+        self.input = input
+        self.output = output
+        self.value = 0.
+        self.runs = 0
+
+    def user_traits(self):
+        return {'input': DummyTrait(False), 'output': DummyTrait(True),
+                'value': DummyTrait(True)}
+
+    def run(self):
+        self.runs += 1
+        with open(self.input) as f:
+            data = f.read()
+        with open(self.output, 'w') as f:
+            f.write(data + self.name)
+        self.value = float(len(data))
+
+
+class TestRunJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_journal')
+        self.journal_file = osp.join(self.tmpdir, 'journals', 'run.journal')
+        files = [osp.join(self.tmpdir, 'file%d' % i) for i in range(4)]
+        with open(files[0], 'w') as f:
+            f.write('data')
+        self.processes = [DummyProcess('node%d' % i, files[i], files[i + 1])
+                          for i in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_processes(self, fail_at=None):
+        journal = RunJournal(self.journal_file, resume=True)
+        try:
+            for process in self.processes:
+                if journal.is_done(process):
+                    continue
+                if process is fail_at:
+                    raise RuntimeError('failure')
+                process.run()
+                journal.node_done(process)
+        finally:
+            journal.close()
+        return journal
+
+    def test_resume(self):
+        self.assertRaises(RuntimeError, self.run_processes,
+                          self.processes[1])
+        self.assertEqual([p.runs for p in self.processes], [1, 0, 0])
+        self.processes[0].value = 0.
+        journal = self.run_processes()
+        # node0 is skipped, and its float output is restored
+        self.assertEqual(journal.skipped, ['pipeline.node0'])
+        self.assertEqual(self.processes[0].value, 4.)
+        self.assertEqual([p.runs for p in self.processes], [1, 1, 1])
+        # nothing to do any longer
+        journal = self.run_processes()
+        self.assertEqual(len(journal.skipped), 3)
+        self.assertEqual([p.runs for p in self.processes], [1, 1, 1])
+
+    def test_invalidation(self):
+        self.run_processes()
+        # a modified output is produced again
+        with open(self.processes[1].output, 'w') as f:
+            f.write('partial')
+        journal = self.run_processes()
+        self.assertEqual(journal.skipped, ['pipeline.node0'])
+        self.assertEqual([p.runs for p in self.processes], [1, 2, 2])
+        # without resume, the journal is restarted
+        RunJournal(self.journal_file).close()
+        journal = self.run_processes()
+        self.assertEqual(journal.skipped, [])
+
+    def test_truncated_journal(self):
+        self.run_processes()
+        with open(self.journal_file) as f:
+            lines = f.readlines()
+        with open(self.journal_file, 'w') as f:
+            f.writelines(lines[:-1])
+            f.write(lines[-1][:10])
+        journal = self.run_processes()
+        self.assertEqual(len(journal.skipped), 2)
+        self.assertEqual([p.runs for p in self.processes], [1, 1, 2])
+
+    def test_obsolete_journal(self):
+        self.journal_file = osp.join(self.tmpdir, 'run.journal')
+        with open(self.journal_file, 'w') as f:
+            f.write(json.dumps({'format': 'obsolete'}) + '\n')
+            f.write(json.dumps({'node': 'pipeline.node0'}) + '\n')
+        journal = self.run_processes()
+        self.assertEqual(journal.skipped, [])
+        # the journal has been restarted: completed nodes are recognized
+        journal = self.run_processes()
+        self.assertEqual(len(journal.skipped), 3)
+        self.assertEqual([p.runs for p in self.processes], [1, 1, 1])
+
+    def test_temporaries(self):
+        temporary_files = [(None, 'output', self.processes[0].output, '')]
+        journal = RunJournal(self.journal_file, resume=True,
+                             temporary_files=temporary_files)
+        for process in self.processes:
+            process.run()
+            journal.node_done(process)
+        journal.close()
+        journal = RunJournal(self.journal_file, resume=True,
+                             temporary_files=temporary_files)
+        self.assertEqual([journal.is_done(p) for p in self.processes],
+                         [False, False, True])
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
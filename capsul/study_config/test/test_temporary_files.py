@@ -0,0 +1,132 @@
+from __future__ import print_function
+
+import os
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+from capsul.study_config.temporary_files import (TemporaryFilesLifetime,
+                                                 path_size)
+
+
+class DummyNode(object):
+    ''' Node with plug values, and links of its plugs to plugs of other
+    nodes '''
+    def __init__(self, name, **values):
+        self.name = name
+        self.values = dict(values)
+        self.plugs = dict((plug, None) for plug in values)
+        self.links = {}
+
+    def get_plug_value(self, plug_name):
+        return self.values[plug_name]
+
+    def set_plug_value(self, plug_name, value):
+        self.values[plug_name] = value
+        for node, dest_plug in self.links.get(plug_name, []):
+            node.set_plug_value(dest_plug, value)
+
+    def __repr__(self):
+        return self.name
+
+
+class DummyPipeline(object):
+    @staticmethod
+    def _remove_temporary_files(tmpfiles):
+        if not isinstance(tmpfiles, list):
+            tmpfiles = [tmpfiles]
+        for tmpfile in tmpfiles:
+            if osp.exists(tmpfile):
+                os.unlink(tmpfile)
+
+
+class TestTemporaryFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_tmp')
+        self.local_dir = osp.join(self.tmpdir, 'local')
+        os.mkdir(self.local_dir)
+        # a -> b -> c, with temporaries t1 (a -> b) and t2 (b -> c, c)
+        self.a = DummyNode('a', output='')
+        self.b = DummyNode('b', input='', output='')
+        self.c = DummyNode('c', input='', other='', output='/data/out')
+        self.a.links['output'] = [(self.b, 'input')]
+        self.b.links['output'] = [(self.c, 'input'), (self.c, 'other')]
+        self.nodes = [self.a, self.b, self.c]
+        self.temp_files = []
+        for node in (self.a, self.b):
+            fd, path = tempfile.mkstemp(suffix='capsul.nii',
+                                        dir=self.local_dir)
+            os.close(fd)
+            node.set_plug_value('output', path)
+            self.temp_files.append((node, 'output', path, ''))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_node(self, lifetime, node, size=0):
+        lifetime.before_node(node)
+        if node in (self.a, self.b):
+            with open(node.get_plug_value('output'), 'w') as f:
+                f.write('x' * size)
+        lifetime.after_node(node)
+
+    def test_lifetime(self):
+        lifetime = TemporaryFilesLifetime(DummyPipeline(), self.temp_files,
+                                          self.nodes)
+        t1 = self.a.get_plug_value('output')
+        t2 = self.b.get_plug_value('output')
+        self.run_node(lifetime, self.a)
+        self.assertTrue(osp.exists(t1))
+        self.run_node(lifetime, self.b)
+        # b was the last user of t1
+        self.assertFalse(osp.exists(t1))
+        self.assertTrue(osp.exists(t2))
+        self.run_node(lifetime, self.c)
+        self.assertFalse(osp.exists(t2))
+
+    def test_size_budget(self):
+        lifetime = TemporaryFilesLifetime(DummyPipeline(), self.temp_files,
+                                          self.nodes, self.local_dir,
+                                          max_size=0.001)
+        self.run_node(lifetime, self.a, size=2000)
+        self.assertEqual(lifetime.local_size(), 2000)
+        self.assertEqual(path_size(self.a.get_plug_value('output')), 2000)
+        # the budget is exceeded: the output of b is moved out of the local
+        # directory, and its consumers follow
+        self.run_node(lifetime, self.b, size=10)
+        t2 = self.b.get_plug_value('output')
+        self.assertNotEqual(osp.dirname(t2), osp.abspath(self.local_dir))
+        self.assertTrue(t2.endswith('capsul.nii'))
+        self.assertEqual(self.c.get_plug_value('input'), t2)
+        self.assertEqual(self.temp_files[1][2], t2)
+        self.assertEqual(lifetime.local_size(), 0)
+        self.run_node(lifetime, self.c)
+        self.assertFalse(osp.exists(t2))
+
+    def test_relative_local_directory(self):
+        # mkstemp() returns relative paths for a relative directory
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        try:
+            for index, (node, plug, path, value) \
+                    in enumerate(self.temp_files):
+                path = osp.join('local', osp.basename(path))
+                node.set_plug_value(plug, path)
+                self.temp_files[index] = (node, plug, path, value)
+            lifetime = TemporaryFilesLifetime(
+                DummyPipeline(), self.temp_files, self.nodes, 'local',
+                max_size=0.001)
+            self.run_node(lifetime, self.a, size=2000)
+            self.assertEqual(lifetime.local_size(), 2000)
+            self.run_node(lifetime, self.b, size=10)
+            self.assertFalse(osp.dirname(osp.abspath(
+                self.b.get_plug_value('output'))) == self.local_dir)
+            self.assertEqual(lifetime.local_size(), 0)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,6 +24,8 @@ Functions
 =========
 :func:`fsl_command_with_environment`
 ------------------------------------
+:func:`fsl_command_and_environment`
+-----------------------------------
 :func:`check_fsl_configuration`
 -------------------------------
 :func:`check_configuration_values`
@@ -82,6 +84,40 @@ def fsl_command_with_environment(study_config, command):
                     ' '.join("'%s'" % i.replace("'", "\\'") for i in command[1:])]
     return cmd
 
+def fsl_command_and_environment(study_config, command):
+    '''
+    Same as :func:`fsl_command_with_environment` but, when FSL is
+    configured with fsl.sh, returns the command to call directly and the
+    environment variables to add for it, which are computed only once per
+    configuration (see :func:`capsul.in_context.fsl.fsl_environment`).
+    Returns (command, environment), environment is None when no variable
+    has to be set.
+    '''
+    from capsul.in_context.fsl import fsl_environment
+
+    fsl_config = getattr(study_config, 'fsl_config', Undefined)
+    if fsl_config is Undefined:
+        return fsl_command_with_environment(study_config, command), None
+    fsl_prefix = getattr(study_config, 'fsl_prefix', '')
+    if fsl_prefix is Undefined:
+        fsl_prefix = ''
+    fsldir = osp.dirname(osp.dirname(osp.dirname(fsl_config)))
+    cmd = ['%s/bin/%s%s' % (fsldir, fsl_prefix, command[0])] + command[1:]
+    return cmd, fsl_environment(fsl_config)
+
+def _fsl_subprocess_args(study_config, command, kwargs):
+    '''
+    Command and subprocess keyword arguments to run an FSL command
+    '''
+    from capsul.in_context.fsl import fsl_subprocess_environment
+
+    check_fsl_configuration(study_config)
+    cmd, environment = fsl_command_and_environment(study_config, command)
+    if environment:
+        kwargs = dict(kwargs, env=fsl_subprocess_environment(
+            environment, kwargs.get('env')))
+    return cmd, kwargs
+
 def check_fsl_configuration(study_config):
     '''
     Check thas study_config configuration is valid to call FSL commands.
@@ -151,24 +187,21 @@ class Popen(soma.subprocess.Popen):
     Equivalent to Python subprocess.Popen for FSL commands
     '''
     def __init__(self, study_config, command, **kwargs):
-        check_fsl_configuration(study_config)
-        cmd = fsl_command_with_environment(study_config, command)
+        cmd, kwargs = _fsl_subprocess_args(study_config, command, kwargs)
         super(Popen, self).__init__(cmd, **kwargs)
         
 def call(study_config, command, **kwargs):
     '''
     Equivalent to Python subprocess.call for FSL commands
     '''
-    check_fsl_configuration(study_config)
-    cmd = fsl_command_with_environment(study_config, command)
+    cmd, kwargs = _fsl_subprocess_args(study_config, command, kwargs)
     return soma.subprocess.call(cmd, **kwargs)
 
 def check_call(study_config, command, **kwargs):
     '''
     Equivalent to Python subprocess.check_call for FSL commands
     '''
-    check_fsl_configuration(study_config)
-    cmd = fsl_command_with_environment(study_config, command)
+    cmd, kwargs = _fsl_subprocess_args(study_config, command, kwargs)
     return soma.subprocess.check_call(cmd, **kwargs)
 
 
@@ -176,6 +209,5 @@ def check_output(study_config, command, **kwargs):
     '''
     Equivalent to Python subprocess.check_output for FSL commands
     '''
-    check_fsl_configuration(study_config)
-    cmd = fsl_command_with_environment(study_config, command)
+    cmd, kwargs = _fsl_subprocess_args(study_config, command, kwargs)
     return soma.subprocess.check_output(cmd, **kwargs)
@@ -22,6 +22,8 @@ Functions
 ------------------
 :func:`check_output`
 --------------------
+:func:`call_batches`
+--------------------
 '''
 
 from __future__ import absolute_import
@@ -231,6 +233,22 @@ def check_output(study_config, command, **kwargs):
     cmd = spm_command(study_config, batch_file)
     return soma.subprocess.check_output(cmd, **kwargs)
 
+def call_batches(study_config, batch_files, **kwargs):
+    '''
+    Run several SPM batches in a single SPM session, paying the runtime
+    startup only once. Returns a list of (returncode, message), one per
+    batch (see :func:`capsul.in_context.spm.spm_call_batches`).
+    '''
+    from capsul.in_context.spm import call_batches_script
+
+    if not batch_files:
+        return []
+    check_spm_configuration(study_config)
+    return call_batches_script(
+        batch_files,
+        lambda script_file: spm_command(study_config, script_file),
+        **kwargs)
+
 if __name__ == '__main__':
     from capsul.api import StudyConfig
     from capsul.soma.subprocess.spm import check_call as call_spm
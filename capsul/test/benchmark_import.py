@@ -0,0 +1,84 @@
+'''
+Benchmark of the startup cost of capsul: each run starts a new Python
+interpreter which imports a module (capsul.api by default), and reports the
+import time, the interpreter peak memory (RSS) and the optional heavy
+dependencies which have been imported on the way::
+
+    python -m capsul.test.benchmark_import -n 10
+    python -m capsul.test.benchmark_import --module capsul.engine
+
+Times are compared to an interpreter importing nothing.
+'''
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import timeit
+
+import soma.subprocess
+
+
+# dependencies which should only be imported when they are actually used
+heavy_modules = ['populse_db', 'nipype', 'soma_workflow', 'PyQt4', 'PyQt5',
+                 'matplotlib', 'numpy']
+
+child_script = '''
+import json, resource, sys, timeit
+tic = timeit.default_timer()
+if %(module)r:
+    __import__(%(module)r)
+import_time = timeit.default_timer() - tic
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024
+print(json.dumps([import_time, rss,
+                  [m for m in %(heavy)r if m in sys.modules]]))
+'''
+
+
+def run_import(module):
+    '''
+    Import a module in a new interpreter. Returns (total_time, import_time,
+    rss, heavy) where total_time includes the interpreter startup, rss is
+    in kilobytes, and heavy is the list of heavy modules imported.
+    '''
+    script = child_script % {'module': module, 'heavy': heavy_modules}
+    tic = timeit.default_timer()
+    output = soma.subprocess.check_output([sys.executable, '-c', script])
+    total_time = timeit.default_timer() - tic
+    import_time, rss, heavy = json.loads(
+        output.decode().strip().split('\n')[-1])
+    return total_time, import_time, rss, heavy
+
+
+def benchmark(module, nruns):
+    runs = [run_import(module) for i in range(nruns)]
+    baseline = [run_import(None) for i in range(nruns)]
+    # the best run is the least disturbed by other activity
+    total_time, import_time, rss, heavy = min(runs)
+    base_time, _, base_rss, _ = min(baseline)
+    print('import %s (best of %d runs):' % (module, nruns))
+    print('interpreter startup + import: %.0f ms (empty interpreter: '
+          '%.0f ms)' % (total_time * 1000, base_time * 1000))
+    print('import only:                  %.0f ms' % (import_time * 1000))
+    print('peak RSS:                     %.1f MB (empty interpreter: '
+          '%.1f MB)' % (rss / 1024., base_rss / 1024.))
+    print('heavy modules imported:       %s' % (', '.join(heavy) or 'none'))
+    return total_time, import_time, rss, heavy
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Measure the time and memory needed to import capsul')
+    parser.add_argument('-n', '--nruns', type=int, default=5,
+                        help='number of interpreters started')
+    parser.add_argument('-m', '--module', default='capsul.api',
+                        help='module to import (default: capsul.api)')
+    options = parser.parse_args(argv)
+    benchmark(options.module, options.nruns)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+##########################################################################
+# CAPSUL - CAPS - Copyright (C) CEA, 2013
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+# System import
+from __future__ import print_function
+import json
+import sys
+import unittest
+
+import soma.subprocess
+
+
+def imported_modules(code):
+    """ Modules loaded in a new interpreter after running code
+    """
+    script = code + '\nimport sys, json\nprint(json.dumps(list(sys.modules)))'
+    output = soma.subprocess.check_output([sys.executable, '-c', script])
+    return set(json.loads(output.decode().strip().split('\n')[-1]))
+
+
+@unittest.skipIf(sys.version_info[:2] < (3, 7),
+                 'module __getattr__ needs python >= 3.7')
+class TestLazyImport(unittest.TestCase):
+    """ Test that capsul.api only imports sub-modules when they are used
+    """
+    def test_api_import(self):
+        modules = imported_modules('import capsul.api')
+        for module in ('capsul.process.process', 'capsul.pipeline.pipeline',
+                       'capsul.study_config.study_config', 'capsul.engine',
+                       'traits', 'populse_db', 'nipype'):
+            self.assertFalse(module in modules, module)
+
+    def test_api_objects(self):
+        import capsul.api
+        from capsul.utils.finder import find_processes
+
+        self.assertTrue(capsul.api.find_processes is find_processes)
+        self.assertTrue('find_processes' in dir(capsul.api))
+        self.assertTrue('Pipeline' in capsul.api.__all__)
+        self.assertRaises(AttributeError, getattr, capsul.api, 'no_object')
+
+    def test_engine_import(self):
+        modules = imported_modules('import capsul.engine')
+        self.assertFalse('capsul.engine.database_populse' in modules)
+        self.assertFalse('populse_db' in modules)
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestLazyImport)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -0,0 +1,23 @@
+'''
+Functions
+=========
+:func:`file_checksum`
+---------------------
+'''
+
+# System import
+import hashlib
+
+
+def file_checksum(filename, block_size=1024 * 1024):
+    '''
+    MD5 checksum of a file contents
+    '''
+    hasher = hashlib.md5()
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher.hexdigest()
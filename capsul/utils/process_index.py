@@ -0,0 +1,345 @@
+'''
+On-disk index of the processes found in packages.
+
+Finding processes in a package (see :func:`~capsul.utils.finder.find_processes`
+and :func:`~capsul.qt_apps.utils.find_pipelines.find_pipeline_and_process`)
+needs to import all its modules and to look at all their items. The result
+of this scan is stored, per package, in an index file: later listings only
+import the modules whose file has changed (its modification time or size
+differs), and read again only the XML files which have changed.
+
+Note that a module is scanned again only when its own file changes, not
+when the modules it imports do. Modules which failed to import are not
+indexed, and are tried again on each listing.
+
+The index directory is given by the ``CAPSUL_PROCESS_INDEX`` environment
+variable, or defaults to ``~/.cache/capsul/process_index``. Setting
+``CAPSUL_PROCESS_INDEX`` to an empty string disables the index.
+
+Functions
+=========
+:func:`process_index_directory`
+-------------------------------
+:func:`package_modules`
+-----------------------
+:func:`indexed_modules`
+-----------------------
+'''
+
+from __future__ import absolute_import
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import os.path as osp
+import re
+import sys
+import traceback
+import types
+import uuid
+from glob import glob
+
+from capsul.info import __version__ as capsul_version
+
+# Define the logger
+logger = logging.getLogger(__name__)
+
+# Change this value whenever the index contents change
+index_format_version = '1'
+
+process_xml_re = re.compile(r'<process.*</process>', re.DOTALL)
+pipeline_xml_re = re.compile(r'<pipeline.*</pipeline>', re.DOTALL)
+_module_name_re = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def process_index_directory():
+    '''
+    Return the process index directory, or None if the index is disabled.
+    '''
+    directory = os.environ.get('CAPSUL_PROCESS_INDEX')
+    if directory is None:
+        directory = osp.join(osp.expanduser('~'), '.cache', 'capsul',
+                             'process_index')
+    return directory or None
+
+
+def _package_location(package_name):
+    # find the package directory (or module file) without importing it
+    # (parent packages are imported)
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        # python 2
+        module = importlib.import_module(package_name)
+        if hasattr(module, '__path__'):
+            return module.__path__[0], True
+        return module.__file__, False
+    spec = find_spec(package_name)
+    if spec is None:
+        raise ImportError('No module named %s' % package_name)
+    if spec.submodule_search_locations:
+        return list(spec.submodule_search_locations)[0], True
+    return spec.origin, False
+
+
+def _module_suffixes():
+    try:
+        from importlib.machinery import EXTENSION_SUFFIXES
+    except ImportError:
+        EXTENSION_SUFFIXES = []
+    return ['.py'] + list(EXTENSION_SUFFIXES)
+
+
+def package_modules(package_name):
+    '''
+    List the modules of a package, in the order of
+    :func:`pkgutil.walk_packages`, by looking at its files: modules are not
+    imported.
+
+    Returns
+    -------
+    modules: list
+        (module_name, filename) tuples. The package itself comes first.
+        filename is the ``__init__`` file for packages, or their directory
+        for namespace packages.
+    '''
+    location, is_package = _package_location(package_name)
+    if not is_package:
+        return [(package_name, location)]
+    suffixes = _module_suffixes()
+    modules = []
+
+    def walk(name, directory):
+        init = osp.join(directory, '__init__.py')
+        if osp.exists(init):
+            modules.append((name, init))
+        else:
+            modules.append((name, directory))
+        for entry in sorted(os.listdir(directory)):
+            path = osp.join(directory, entry)
+            if osp.isdir(path):
+                if _module_name_re.match(entry) \
+                        and osp.exists(osp.join(path, '__init__.py')):
+                    walk('%s.%s' % (name, entry), path)
+                continue
+            for suffix in suffixes:
+                if entry.endswith(suffix):
+                    module = entry[:-len(suffix)]
+                    if module != '__init__' and _module_name_re.match(module):
+                        modules.append(('%s.%s' % (name, module), path))
+                    break
+
+    walk(package_name, location)
+    return modules
+
+
+def _file_state(filename):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+def _docstring_summary(item):
+    doc = getattr(item, '__doc__', None)
+    if not doc:
+        return ''
+    for line in doc.strip().splitlines():
+        return line.strip()
+    return ''
+
+
+def _scan_module(module):
+    '''
+    List the process items found in a module (including imported ones), as
+    dicts with keys:
+
+    * name: name in the module
+    * kind: 'pipeline', 'process', 'nipype' (Nipype interface instance) or
+      'function' (function with a process XML description)
+    * class_path: python location of the class, or of the function
+    * doc: first line of the docstring
+    * params: class level parameters names, or function arguments
+    '''
+    from capsul.process.process import Process
+    from capsul.pipeline.pipeline import Pipeline
+
+    try:
+        from nipype.interfaces.base import Interface
+    # If nipype is not found create a dummy Interface class
+    except ImportError:
+        Interface = type("Interface", (object, ), {})
+
+    items = []
+    for name in dir(module):
+        item = getattr(module, name)
+        params = []
+        if isinstance(item, type) and issubclass(item, Process):
+            if issubclass(item, Pipeline):
+                kind = 'pipeline'
+                base_traits = Pipeline.class_traits()
+            else:
+                kind = 'process'
+                base_traits = Process.class_traits()
+            params = sorted(param for param in item.class_traits()
+                            if param not in base_traits)
+            class_path = '%s.%s' % (item.__module__, item.__name__)
+        elif isinstance(item, Interface):
+            # a Nipype interface is wrapped in a Process class
+            kind = 'nipype'
+            class_path = '%s.%s' % (item.__class__.__module__,
+                                    item.__class__.__name__)
+        elif isinstance(item, types.FunctionType):
+            if not (getattr(item, 'capsul_xml', None)
+                    or (item.__doc__ and process_xml_re.search(item.__doc__))):
+                continue
+            kind = 'function'
+            code = item.__code__
+            params = list(code.co_varnames[:code.co_argcount])
+            class_path = '%s.%s' % (item.__module__, item.__name__)
+        else:
+            continue
+        items.append({'name': name, 'kind': kind, 'class_path': class_path,
+                      'doc': _docstring_summary(item), 'params': params})
+    return items
+
+
+def _index_file(directory, package_name, location):
+    # the same package may be installed in several places
+    key = hashlib.md5(osp.abspath(location).encode('utf-8')).hexdigest()
+    return osp.join(directory, '%s-%s.json' % (package_name, key[:12]))
+
+
+def _load_index(filename):
+    if filename is None or not osp.exists(filename):
+        return None
+    try:
+        with open(filename) as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        logger.debug('cannot read process index %s: %s'
+                     % (filename, str(e)))
+        return None
+    if index.get('format') != index_format_version \
+            or index.get('capsul_version') != capsul_version \
+            or index.get('python') != list(sys.version_info[:2]):
+        return None
+    return index
+
+
+def _save_index(filename, index):
+    try:
+        directory = osp.dirname(filename)
+        if not osp.isdir(directory):
+            os.makedirs(directory)
+        # write in a temporary file then rename it, so that concurrent
+        # listings never see a partially written index
+        tmp = '%s.%s.tmp' % (filename, uuid.uuid4().hex)
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.rename(tmp, filename)
+    except (IOError, OSError) as e:
+        logger.debug('cannot write process index %s: %s'
+                     % (filename, str(e)))
+
+
+def indexed_modules(package_name, ignore_errors=(ImportError, )):
+    '''
+    Process items of all modules of a package, using the package index
+    when it is up to date.
+
+    Parameters
+    ----------
+    package_name: str
+        python package (or module) name
+    ignore_errors: tuple
+        exception classes which are caught when a module is imported: such
+        modules are reported with an error message and no items. Other
+        exceptions are raised.
+
+    Returns
+    -------
+    modules: list
+        (module_name, entry) tuples, in the order of :func:`package_modules`.
+        entry is a dict with keys:
+
+        * file: module file (see :func:`package_modules`)
+        * items: process items found in the module (see :func:`_scan_module`)
+        * xml: names of XML pipeline files found in the module directory
+          (without extension)
+        * error: traceback of the module import error, or None
+    '''
+    location = _package_location(package_name)[0]
+    directory = process_index_directory()
+    index_file = None
+    if directory is not None:
+        index_file = _index_file(directory, package_name, location)
+    index = _load_index(index_file)
+    if index is None:
+        index = {'format': index_format_version,
+                 'capsul_version': capsul_version,
+                 'python': list(sys.version_info[:2]),
+                 'modules': {}, 'xml': {}}
+    old_modules = index['modules']
+    old_xml = index['xml']
+    modules = {}
+    xml_files = {}
+    xml_dirs = {}
+    changed = False
+    result = []
+
+    for module_name, filename in package_modules(package_name):
+        state = _file_state(filename)
+        entry = old_modules.get(module_name)
+        error = None
+        if entry is None or entry['file'] != filename \
+                or entry['state'] != state:
+            changed = True
+            logger.debug('scanning module %s' % module_name)
+            try:
+                module = importlib.import_module(module_name)
+            except ignore_errors:
+                error = ''.join(traceback.format_exception(*sys.exc_info()))
+                module = None
+            if module is None:
+                entry = None
+            else:
+                entry = {'file': filename, 'state': state,
+                         'items': _scan_module(module)}
+        if entry is not None:
+            modules[module_name] = entry
+
+        # XML pipelines in the module directory
+        module_dir = osp.dirname(filename) if osp.isfile(filename) \
+            else filename
+        xml = xml_dirs.get(module_dir)
+        if xml is None:
+            xml = []
+            for xml_file in sorted(glob(osp.join(module_dir, '*.xml'))):
+                xml_state = _file_state(xml_file)
+                xml_entry = old_xml.get(xml_file)
+                if xml_entry is None or xml_entry['state'] != xml_state:
+                    changed = True
+                    with open(xml_file) as f:
+                        is_pipeline = bool(pipeline_xml_re.search(f.read()))
+                    xml_entry = {'state': xml_state, 'pipeline': is_pipeline}
+                xml_files[xml_file] = xml_entry
+                if xml_entry['pipeline']:
+                    xml.append(osp.basename(xml_file)[:-4])
+            xml_dirs[module_dir] = xml
+
+        result.append((module_name,
+                       {'file': filename,
+                        'items': entry['items'] if entry else [],
+                        'xml': xml, 'error': error}))
+
+    if set(modules) != set(old_modules) or set(xml_files) != set(old_xml):
+        changed = True
+    if changed and index_file is not None:
+        index['modules'] = modules
+        index['xml'] = xml_files
+        _save_index(index_file, index)
+    return result
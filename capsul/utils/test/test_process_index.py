@@ -0,0 +1,156 @@
+##########################################################################
+# CAPSUL - CAPS - Copyright (C) CEA, 2013
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+# System import
+from __future__ import print_function
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Capsul import
+from capsul.utils import process_index
+from capsul.utils.process_index import indexed_modules, package_modules
+
+
+process_module = '''
+from capsul.process.process import Process
+from traits.api import Float
+
+
+class MyProcess(Process):
+    """ A process
+    """
+    def __init__(self):
+        super(MyProcess, self).__init__()
+        self.add_trait("other", Float(output=True))
+
+    value = Float()
+
+
+def my_function(a, b=1):
+    """
+    <process>
+        <return name="c" type="float" />
+    </process>
+    """
+    return a + b
+
+
+def other_function(a):
+    return a
+'''
+
+pipeline_xml = '''<pipeline capsul_xml="2.0">
+    <process name="node" module="capsul_index_pkg.sub.procs.MyProcess"/>
+</pipeline>
+'''
+
+
+class TestProcessIndex(unittest.TestCase):
+    """ Test the on-disk index of processes
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_process_index')
+        self.index_dir = os.path.join(self.tmpdir, 'index')
+        package = os.path.join(self.tmpdir, 'capsul_index_pkg')
+        sub_package = os.path.join(package, 'sub')
+        os.makedirs(sub_package)
+        for init in (package, sub_package):
+            open(os.path.join(init, '__init__.py'), 'w').close()
+        self.procs_file = os.path.join(sub_package, 'procs.py')
+        with open(self.procs_file, 'w') as f:
+            f.write(process_module)
+        with open(os.path.join(sub_package, 'broken.py'), 'w') as f:
+            f.write('import capsul_no_such_module\n')
+        with open(os.path.join(sub_package, 'my_pipeline.xml'), 'w') as f:
+            f.write(pipeline_xml)
+        with open(os.path.join(sub_package, 'other.xml'), 'w') as f:
+            f.write('<other/>\n')
+        self.environ = os.environ.get('CAPSUL_PROCESS_INDEX')
+        os.environ['CAPSUL_PROCESS_INDEX'] = self.index_dir
+        sys.path.insert(0, self.tmpdir)
+
+    def tearDown(self):
+        sys.path.remove(self.tmpdir)
+        self.unload()
+        if self.environ is None:
+            del os.environ['CAPSUL_PROCESS_INDEX']
+        else:
+            os.environ['CAPSUL_PROCESS_INDEX'] = self.environ
+        shutil.rmtree(self.tmpdir)
+
+    def unload(self):
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'capsul_index_pkg':
+                del sys.modules[name]
+
+    def test_package_modules(self):
+        self.assertEqual(
+            [name for name, filename in package_modules('capsul_index_pkg')],
+            ['capsul_index_pkg', 'capsul_index_pkg.sub',
+             'capsul_index_pkg.sub.broken', 'capsul_index_pkg.sub.procs'])
+        self.assertFalse('capsul_index_pkg' in sys.modules)
+
+    def test_index(self):
+        modules = dict(indexed_modules('capsul_index_pkg'))
+        procs = modules['capsul_index_pkg.sub.procs']
+        self.assertEqual(procs['error'], None)
+        self.assertEqual(procs['xml'], ['my_pipeline'])
+        items = dict((item['name'], item) for item in procs['items'])
+        self.assertEqual(sorted(items), ['MyProcess', 'Process',
+                                         'my_function'])
+        self.assertEqual(items['MyProcess']['kind'], 'process')
+        self.assertEqual(items['MyProcess']['class_path'],
+                         'capsul_index_pkg.sub.procs.MyProcess')
+        self.assertEqual(items['MyProcess']['doc'], 'A process')
+        self.assertEqual(items['MyProcess']['params'], ['value'])
+        self.assertEqual(items['my_function']['kind'], 'function')
+        self.assertEqual(items['my_function']['params'], ['a', 'b'])
+        self.assertTrue('capsul_no_such_module'
+                        in modules['capsul_index_pkg.sub.broken']['error'])
+        self.assertEqual(len(os.listdir(self.index_dir)), 1)
+
+        # unchanged modules are not imported again
+        self.unload()
+        self.assertEqual(dict(indexed_modules('capsul_index_pkg')), modules)
+        self.assertFalse('capsul_index_pkg.sub.procs' in sys.modules)
+
+        # changed modules are
+        with open(self.procs_file, 'a') as f:
+            f.write('\nclass OtherProcess(MyProcess):\n    pass\n')
+        modules = dict(indexed_modules('capsul_index_pkg'))
+        self.assertTrue('capsul_index_pkg.sub.procs' in sys.modules)
+        self.assertTrue('OtherProcess' in
+                        [item['name'] for item
+                         in modules['capsul_index_pkg.sub.procs']['items']])
+
+        # import errors are raised if they are not ignored
+        self.assertRaises(ImportError, indexed_modules, 'capsul_index_pkg',
+                          ())
+
+    def test_disabled_index(self):
+        os.environ['CAPSUL_PROCESS_INDEX'] = ''
+        self.assertEqual(process_index.process_index_directory(), None)
+        modules = dict(indexed_modules('capsul_index_pkg'))
+        self.assertEqual(
+            len(modules['capsul_index_pkg.sub.procs']['items']), 3)
+        self.assertFalse(os.path.exists(self.index_dir))
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestProcessIndex)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())